@@ -1,5 +1,12 @@
+import importlib
+
 from . import repo_database
-from . import fillers
-from . import getters
 
-from .extras import errors
+def __getattr__(name):
+	'''
+	fillers and getters (and their dependencies: pandas, scipy, pygit2, ...) are only imported when first used,
+	so that importing the package to open a Database stays fast
+	'''
+	if name in ('fillers','getters'):
+		return importlib.import_module('.'+name,__name__)
+	raise AttributeError('module {!r} has no attribute {!r}'.format(__name__,name))
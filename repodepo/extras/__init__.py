@@ -3,5 +3,12 @@
 def check_sqlname_safe(s):
 	assert s == ''.join( c for c in s if c.isalnum() or c in ('_',) ), '{} is not passing the check against SQL injection'.format(s)
 
-from .anonymization import anonymize
-from .stats import GlobalStats
+def __getattr__(name):
+	# imported on first use, anonymization and stats depending on the fillers and getters
+	if name == 'anonymize':
+		from .anonymization import anonymize
+		return anonymize
+	elif name == 'GlobalStats':
+		from .stats import GlobalStats
+		return GlobalStats
+	raise AttributeError('module {!r} has no attribute {!r}'.format(__name__,name))
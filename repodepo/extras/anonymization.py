@@ -7,6 +7,7 @@ from .. import fillers
 import time
 import os
 import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 import psycopg2
 import psycopg2.sql
@@ -24,11 +25,82 @@ def modify(old_id,salt):
 		suffix = '@' + suffix
 	return hashlib.md5((salt+prefix).encode()).hexdigest()+suffix
 
+def modify_chunk(args):
+	values,salt = args
+	return [modify(old_id=v,salt=salt) for v in values]
+
+def hash_values(values,salt,workers=1,chunk_size=10**5):
+	'''
+	Generator of (value,hashed value) for the (distinct) values, hashed by chunks of chunk_size values in worker processes when workers>1
+	'''
+	values = list(values)
+	chunks = [(values[i:i+chunk_size],salt) for i in range(0,len(values),chunk_size)]
+	if workers > 1 and len(chunks) > 1:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			for (chunk,_),hashed in zip(chunks,executor.map(modify_chunk,chunks)):
+				yield from zip(chunk,hashed)
+	else:
+		for chunk in chunks:
+			yield from zip(chunk[0],modify_chunk(chunk))
+
+def sqlite_distinct_values(db,table,fields,where_clause='',chunk_size=10**5):
+	'''
+	Set of the distinct non NULL values of the fields of a SQLite table (restricted by where_clause), collected in one scan of the table
+	'''
+	check_sqlname_safe(table)
+	for f in fields:
+		check_sqlname_safe(f)
+	db.cursor.execute('SELECT {fields} FROM {table} {where_clause};'.format(table=table,where_clause=where_clause,
+																			fields=','.join('{}.{}'.format(table,f) for f in fields)))
+	values = set()
+	while True:
+		rows = db.cursor.fetchmany(chunk_size)
+		if not rows:
+			break
+		for r in rows:
+			values.update(r)
+	values.discard(None)
+	return values
+
+def sqlite_create_mapping(db,values,salt,workers=1,chunk_size=10**5,mapping_table='_anonymization_map'):
+	'''
+	Temporary table mapping_table(old_val,new_val) with the hashes of the values
+	'''
+	check_sqlname_safe(mapping_table)
+	db.cursor.execute('DROP TABLE IF EXISTS temp.{};'.format(mapping_table))
+	db.cursor.execute('CREATE TEMP TABLE {}(old_val TEXT PRIMARY KEY, new_val TEXT NOT NULL);'.format(mapping_table))
+	db.cursor.executemany('INSERT INTO temp.{}(old_val,new_val) VALUES(?,?);'.format(mapping_table),
+							hash_values(values=values,salt=salt,workers=workers,chunk_size=chunk_size))
+
+def sqlite_apply_mapping(db,table,fields,mapping_table='_anonymization_map'):
+	'''
+	Replaces in one UPDATE the values of all the fields of the table found in mapping_table by their hash.
+	As with the previous updates keyed by value, all rows having one of the mapped values are updated.
+	'''
+	check_sqlname_safe(table)
+	check_sqlname_safe(mapping_table)
+	for f in fields:
+		check_sqlname_safe(f)
+	set_clause = ','.join('{f}=COALESCE((SELECT m.new_val FROM temp.{m} m WHERE m.old_val={t}.{f}),{f})'.format(f=f,t=table,m=mapping_table) for f in fields)
+	where = ' OR '.join('{f} IN (SELECT old_val FROM temp.{m})'.format(f=f,m=mapping_table) for f in fields)
+	db.cursor.execute('UPDATE {table} SET {set_clause} WHERE {where};'.format(table=table,set_clause=set_clause,where=where))
+
+def sqlite_hash_fields(db,table,fields,salt,where_clause='',workers=1,chunk_size=10**5,mapping_table='_anonymization_map'):
+	'''
+	Hashes the fields of a SQLite table: distinct values are collected in one scan of the table (restricted by where_clause),
+	hashed, stored in a temporary mapping table, and all fields are updated at once by joining on it.
+	'''
+	values = sqlite_distinct_values(db=db,table=table,fields=fields,where_clause=where_clause,chunk_size=chunk_size)
+	if not values:
+		return
+	sqlite_create_mapping(db=db,values=values,salt=salt,workers=workers,chunk_size=chunk_size,mapping_table=mapping_table)
+	sqlite_apply_mapping(db=db,table=table,fields=fields,mapping_table=mapping_table)
+	db.cursor.execute('DROP TABLE temp.{};'.format(mapping_table))
 
 
-def anonymize(db,salt=None,keep_email_suffixes=True,ignore_error=False):
+def anonymize(db,salt=None,keep_email_suffixes=True,ignore_error=False,workers=1):
 	try:
-		db.add_filler(AnonymizationMetaFiller(salt=salt,keep_email_suffixes=keep_email_suffixes))
+		db.add_filler(AnonymizationMetaFiller(salt=salt,keep_email_suffixes=keep_email_suffixes,workers=workers))
 		db.fill_db()
 	except errors.RepoToolsDBStructError:
 		if ignore_error:
@@ -50,7 +122,7 @@ class AnonymizationMetaFiller(fillers.Filler):
 	'''
 	Combining all the necessary fillers for anonymization
 	'''
-	def __init__(self,salt,keep_email_suffixes=True,**kwargs):
+	def __init__(self,salt,keep_email_suffixes=True,workers=1,**kwargs):
 		if salt is None:
 			saltfile = os.path.join(os.environ['HOME'],'.repo_tools','salt.txt')
 			if os.path.exists(saltfile):
@@ -61,6 +133,7 @@ class AnonymizationMetaFiller(fillers.Filler):
 		else:
 			self.salt = salt
 		self.keep_email_suffixes = keep_email_suffixes
+		self.workers = workers
 		fillers.Filler.__init__(self,**kwargs)
 
 	def prepare(self):
@@ -69,16 +142,17 @@ class AnonymizationMetaFiller(fillers.Filler):
 
 		# Emails
 		if self.keep_email_suffixes:
-			self.db.add_filler(EmailAnonFiller(table='identities',field='identity',it_field='identity_type_id',salt=self.salt))
-			self.db.add_filler(EmailAnonFiller(table='users',field='creation_identity',it_field='creation_identity_type_id',salt=self.salt))
+			self.db.add_filler(EmailAnonFiller(table='identities',field='identity',it_field='identity_type_id',salt=self.salt,workers=self.workers))
+			self.db.add_filler(EmailAnonFiller(table='users',field='creation_identity',it_field='creation_identity_type_id',salt=self.salt,workers=self.workers))
 		else:
-			self.db.add_filler(AnonymizationFiller(table='identities',field='identity',leave_bots=True,filter_identity_type=True,salt=self.salt))
-			self.db.add_filler(AnonymizationFiller(table='users',field='creation_identity',leave_bots=True,filter_identity_type=True,salt=self.salt))
+			self.db.add_filler(AnonymizationFiller(table='identities',field='identity',leave_bots=True,filter_identity_type=True,salt=self.salt,workers=self.workers))
+			self.db.add_filler(AnonymizationFiller(table='users',field='creation_identity',leave_bots=True,filter_identity_type=True,salt=self.salt,workers=self.workers))
 
 		# Names
 		self.db.add_filler(NullifyFiller(table='identities',field='attributes',it_field='identity_type_id',salt=self.salt))
 
-		# Logins in various fields
+		# Logins in various fields, hashed with one dictionary login:hash
+		login_fields = {}
 		for table,field in [('followers','follower_login'),
 							('stars','login'),
 							('sponsors_user','sponsor_login'),
@@ -95,7 +169,8 @@ class AnonymizationMetaFiller(fillers.Filler):
 							('pullrequests','author_login'),
 							('pullrequests','merger_login'),
 							]:
-			self.db.add_filler(AnonymizationFiller(table=table,field=field,leave_bots=False,filter_identity_type=False,salt=self.salt))
+			login_fields.setdefault(table,[]).append(field)
+		self.db.add_filler(LoginAnonFiller(login_fields=login_fields,salt=self.salt,workers=self.workers))
 
 		# reason field in merged identities
 		self.db.add_filler(MergedIDAnonFiller())
@@ -108,14 +183,20 @@ class MergedIDAnonFiller(fillers.Filler):
 
 class AnonymizationFiller(fillers.Filler):
 	'''
-	Wrapping anonymization steps as fillers -- base structure hashing one field in one table
+	Wrapping anonymization steps as fillers -- base structure hashing one field (or several fields) in one table
 	'''
-	def __init__(self,table,field='login',force=False,id_field=None,salt=None,leave_bots=True,filter_identity_type=True,it_field='identity_type_id',**kwargs):
+	def __init__(self,table,field='login',fields=None,force=False,id_field=None,salt=None,leave_bots=True,filter_identity_type=True,it_field='identity_type_id',workers=1,chunk_size=10**5,**kwargs):
 		fillers.Filler.__init__(self,**kwargs)
 		self.table = table
-		self.field = field
+		if fields is None:
+			self.fields = [field]
+		else:
+			self.fields = list(fields)
+		self.field = self.fields[0]
+		self.workers = workers
+		self.chunk_size = chunk_size
 		if id_field is None:
-			self.id_field = field
+			self.id_field = self.field
 		else:
 			self.id_field = id_field
 		self.force = force
@@ -167,15 +248,17 @@ class AnonymizationFiller(fillers.Filler):
 		self.db.check_structure()
 		self.set_salt()
 		self.set_where_clause()
-		update_name = self.get_update_name()
-		if not self.force:
-			if self.db.db_type == 'postgres':
-				self.db.cursor.execute('''SELECT COUNT(*) FROM full_updates WHERE update_type=%(update_name)s;''',{'update_name':update_name})
-			else:
-				self.db.cursor.execute('''SELECT COUNT(*) FROM full_updates WHERE update_type=:update_name;''',{'update_name':update_name})
-			if self.db.cursor.fetchone()[0] > 0:
-				self.done = True
+		self.fields_todo = [f for f in self.fields if self.force or not self.is_registered(field=f)]
+		if not self.fields_todo:
+			self.done = True
 
+	def is_registered(self,table=None,field=None):
+		update_name = self.get_update_name(table=table,field=field)
+		if self.db.db_type == 'postgres':
+			self.db.cursor.execute('''SELECT COUNT(*) FROM full_updates WHERE update_type=%(update_name)s;''',{'update_name':update_name})
+		else:
+			self.db.cursor.execute('''SELECT COUNT(*) FROM full_updates WHERE update_type=:update_name;''',{'update_name':update_name})
+		return self.db.cursor.fetchone()[0] > 0
 
 	def register_update(self,table=None,field=None,autocommit=True):
 		update_name = self.get_update_name(table=table,field=field)
@@ -188,50 +271,73 @@ class AnonymizationFiller(fillers.Filler):
 
 
 	def apply(self):
-		self.hash_field()
-		self.register_update()
+		self.hash_fields(fields=self.fields_todo)
+		for field in self.fields_todo:
+			self.register_update(field=field,autocommit=False)
+		self.db.connection.commit()
 
 	def hash_field(self,id_field=None,field=None,table=None):
-		if table is None:
-			table = self.table
 		if field is None:
 			field = self.field
-		if id_field is None:
-			id_field = self.id_field
+		self.hash_fields(fields=[field],table=table)
+
+	def hash_fields(self,fields=None,table=None):
+		if table is None:
+			table = self.table
+		if fields is None:
+			fields = self.fields
 
-		update_name = self.get_update_name()
 		if self.db.db_type == 'postgres':
 			self.db.cursor.execute(psycopg2.sql.SQL('''
 				UPDATE {table}
-				SET {field} = MD5(%(salt)s||{field})
-				;''').format(field=psycopg2.sql.Identifier(field),id_field=psycopg2.sql.Identifier(id_field),table=psycopg2.sql.Identifier(table)),{'salt':self.salt})
+				SET {set_clause}
+				;''').format(table=psycopg2.sql.Identifier(table),
+							set_clause=psycopg2.sql.SQL(',').join(psycopg2.sql.SQL('{field} = MD5(%(salt)s||{field})').format(field=psycopg2.sql.Identifier(f)) for f in fields)),{'salt':self.salt})
 		else:
-			check_sqlname_safe(table)
-			check_sqlname_safe(field)
-			check_sqlname_safe(id_field)
-			query = '''
-						SELECT {id_field},{field}
-						FROM {table}
-					;'''.format(field=field,id_field=id_field,table=table)
+			self.logger.info('Hashing {} in table {}'.format(','.join(fields),table))
+			sqlite_hash_fields(db=self.db,table=table,fields=fields,salt=self.salt,workers=self.workers,chunk_size=self.chunk_size)
 
-			self.db.cursor.execute(query)
 
-			to_update = [r for r in self.db.cursor.fetchall()]
+class LoginAnonFiller(AnonymizationFiller):
+	'''
+	Hashing logins in several tables with a single dictionary login:hash, login_fields being a dict table:[fields].
+	On SQLite, each distinct login is hashed once whatever the number of fields it appears in, and the dictionary is applied to each table by a join.
+	'''
+	def __init__(self,login_fields,**kwargs):
+		self.login_fields = {table:list(fields) for table,fields in login_fields.items()}
+		table = list(self.login_fields.keys())[0]
+		AnonymizationFiller.__init__(self,table=table,fields=self.login_fields[table],leave_bots=False,filter_identity_type=False,**kwargs)
 
-			updated = [(iid,modify(old_id=old_val,salt=self.salt)) for iid,old_val in to_update]
+	def prepare(self):
+		self.db.check_structure()
+		self.set_salt()
+		self.set_where_clause()
+		self.fields_todo = {}
+		for table,fields in self.login_fields.items():
+			todo = [f for f in fields if self.force or not self.is_registered(table=table,field=f)]
+			if todo:
+				self.fields_todo[table] = todo
+		if not self.fields_todo:
+			self.done = True
 
-			query = '''
-				UPDATE {table} SET
-							{field}= :new_val
-						WHERE {id_field} = :iid
-					;
-				'''.format(field=field,id_field=id_field,table=table)
-			self.db.cursor.executemany(query,
-						({'salt':self.salt,'iid':iid,'new_val':new_val} for iid,new_val in updated))
-			self.db.cursor.execute('''
-				INSERT INTO full_updates(update_type)
-				SELECT :update_name;
-				''',{'update_name':update_name} )
+	def apply(self):
+		if self.db.db_type == 'postgres':
+			for table,fields in self.fields_todo.items():
+				self.hash_fields(table=table,fields=fields)
+		else:
+			values = set()
+			for table,fields in self.fields_todo.items():
+				values.update(sqlite_distinct_values(db=self.db,table=table,fields=fields,chunk_size=self.chunk_size))
+			self.logger.info('Hashing {} distinct logins'.format(len(values)))
+			if values:
+				sqlite_create_mapping(db=self.db,values=values,salt=self.salt,workers=self.workers,chunk_size=self.chunk_size)
+				for table,fields in self.fields_todo.items():
+					sqlite_apply_mapping(db=self.db,table=table,fields=fields)
+				self.db.cursor.execute('DROP TABLE temp._anonymization_map;')
+		for table,fields in self.fields_todo.items():
+			for field in fields:
+				self.register_update(table=table,field=field,autocommit=False)
+		self.db.connection.commit()
 
 
 class EmailAnonFiller(AnonymizationFiller):
@@ -268,26 +374,7 @@ class EmailAnonFiller(AnonymizationFiller):
 			check_sqlname_safe(field)
 			check_sqlname_safe(id_field)
 			check_sqlname_safe(it_field)
-			query = '''
-						SELECT {id_field},{field}
-						FROM {table}
-						{where_clause}
-					;'''.format(field=field,id_field=id_field,it_field=it_field,table=table,where_clause=self.where_clause.format(it_field=it_field))
-
-			self.db.cursor.execute(query)
-
-			to_update = [r for r in self.db.cursor.fetchall()]
-
-			updated = [(iid,modify(old_id=old_val,salt=self.salt)) for iid,old_val in to_update]
-
-			query = '''
-				UPDATE {table} SET
-							{field}= :new_val
-						WHERE {id_field} = :iid
-					;
-				'''.format(field=field,id_field=id_field,table=table)
-			self.db.cursor.executemany(query,
-						({'salt':self.salt,'iid':iid,'new_val':new_val} for iid,new_val in updated))
+			sqlite_hash_fields(db=self.db,table=table,fields=[field],salt=self.salt,where_clause=self.where_clause.format(it_field=it_field),workers=self.workers,chunk_size=self.chunk_size)
 
 
 class EmptyTableFiller(AnonymizationFiller):
@@ -0,0 +1,237 @@
+'''
+Benchmarks on synthetic databases (see synthetic.py): standard scenarios timed at a chosen scale, on SQLite or PostgreSQL.
+Timings are recorded in the metrics store of the benchmark DB (kind 'benchmark', see metrics.py) with the version of the package
+and the parameters of the run, so that runs of different versions sharing a metrics file can be compared (see list_runs, compare_runs).
+'''
+
+import os
+import json
+import uuid
+import datetime
+
+import numpy as np
+
+from . import exports
+from . import synthetic
+from .. import metrics
+from .. import repo_database
+from .._version import __version__
+
+
+def scenario_project_getters(db,params):
+	from ..getters import project_getters
+	nb_rows = 0
+	for getter_class in (project_getters.Commits,project_getters.Stars,project_getters.Developers):
+		nb_rows += len(getter_class(db=db).get_result(time_window='month',aggregated=False))
+	return nb_rows
+
+def scenario_repo_to_repo_deps(db,params):
+	from ..getters import edge_getters
+	return edge_getters.RepoToRepoDeps(db=db).get_result().nnz
+
+def scenario_sr_cascades(db,params):
+	from ..getters import SR_getters
+	return SR_getters.SRLinear(db=db,start_time=params['start_date'],end_time=params['end_date']).get_result().nnz
+
+def scenario_export(db,params):
+	dest_db = repo_database.Database(db_name='repodepo_benchmark_export',db_folder=params['folder'],data_folder=params['folder'],metrics_db_name=None)
+	dest_db.clean_db()
+	dest_db.init_db()
+	exports.export(orig_db=db,dest_db=dest_db,force=True)
+	dest_db.connection.close()
+	return None
+
+def synthetic_commits(repo_id,nb_commits,nb_authors,rng,start_date):
+	'''
+	Commits with the fields produced by CommitsFiller.list_commits, each commit being the parent of the next one
+	'''
+	t0 = int((start_date-datetime.datetime(1970,1,1)).total_seconds())
+	times = t0+np.cumsum(rng.integers(60,10**5,size=nb_commits))
+	authors = rng.integers(0,nb_authors,size=nb_commits)
+	ans = []
+	for k,(t,a) in enumerate(zip(times.tolist(),authors.tolist())):
+		sha = '{:040x}'.format(10**12*repo_id+k)
+		ans.append({'sha':sha,
+					'parents':[ans[-1]['sha']] if ans else [],
+					'repo_id':repo_id,
+					'author_email':'synth_author{}@example.com'.format(a),
+					'author_name':'synth_author{}'.format(a),
+					'committer_email':'synth_author{}@example.com'.format(a),
+					'committer_name':'synth_author{}'.format(a),
+					'gmt_time':t,
+					'local_time':t,
+					'time_offset':0,
+					'commit_gmt_time':t,
+					'commit_local_time':t,
+					'commit_time_offset':0,
+					'insertions':k%100,
+					'deletions':k%10,
+					'total':k%100+k%10,
+					'message':'synthetic commit {}'.format(k),
+					})
+	return ans
+
+def scenario_commit_fill(db,params):
+	'''
+	Database side of CommitsFiller (identities, commits, commit_repos, commit_parents) with synthetic commits instead of git clones
+	'''
+	from ..fillers import commit_info
+	filler = commit_info.CommitsFiller(workers=1)
+	filler.db = db
+	filler.logger = db.logger
+	rng = np.random.default_rng(params['seed'])
+	nb_repos = params['commit_fill_repos']
+	nb_commits = params['commit_fill_commits']
+	nb_rows = 0
+	for r in range(nb_repos):
+		name = 'synth_filled_repo{}'.format(r)
+		db.register_repo(source='GitHub',owner='synth_filled_owner',repo=name)
+		repo_id = db.get_repo_id(source='GitHub',owner='synth_filled_owner',name=name)
+		commits = synthetic_commits(repo_id=repo_id,nb_commits=nb_commits//nb_repos,nb_authors=max(1,nb_commits//(10*nb_repos)),rng=rng,start_date=params['start_date'])
+		filler.fill_authors(iter(commits),repo_id=repo_id)
+		filler.fill_commits(iter(commits),repo_id=repo_id)
+		filler.fill_commit_repos(iter(commits),repo_id=repo_id)
+		filler.fill_commit_parents(iter(commits),repo_id=repo_id)
+		nb_rows += len(commits)
+	db.connection.commit()
+	return nb_rows
+
+def scenario_merges(db,params):
+	'''
+	Merges of repositories sharing commits and having their own stars into the most active synthetic repositories
+	'''
+	nb_merges = params['merges']
+	db.cursor.execute('''SELECT repo_id,COUNT(*) AS cnt FROM commit_repos GROUP BY repo_id ORDER BY cnt DESC LIMIT {};'''.format(int(nb_merges)))
+	targets = [r[0] for r in db.cursor.fetchall()]
+	for k,target in enumerate(targets):
+		name = 'synth_merged_repo{}'.format(k)
+		db.register_repo(source='GitHub',owner='synth_merged_owner',repo=name)
+		obsolete_id = db.get_repo_id(source='GitHub',owner='synth_merged_owner',name=name)
+		if db.db_type == 'postgres':
+			db.cursor.execute('''INSERT INTO commit_repos(commit_id,repo_id)
+								SELECT commit_id,%(obsolete_id)s FROM commit_repos WHERE repo_id=%(target)s
+								ON CONFLICT DO NOTHING;''',{'obsolete_id':obsolete_id,'target':target})
+			db.cursor.execute('''INSERT INTO stars(repo_id,identity_type_id,login,identity_id,starred_at)
+								SELECT %(obsolete_id)s,identity_type_id,identity,id,CURRENT_TIMESTAMP FROM identities
+								ORDER BY id LIMIT 100
+								ON CONFLICT DO NOTHING;''',{'obsolete_id':obsolete_id,'target':target})
+		else:
+			db.cursor.execute('''INSERT OR IGNORE INTO commit_repos(commit_id,repo_id)
+								SELECT commit_id,:obsolete_id FROM commit_repos WHERE repo_id=:target
+								;''',{'obsolete_id':obsolete_id,'target':target})
+			db.cursor.execute('''INSERT OR IGNORE INTO stars(repo_id,identity_type_id,login,identity_id,starred_at)
+								SELECT :obsolete_id,identity_type_id,identity,id,CURRENT_TIMESTAMP FROM identities
+								ORDER BY id LIMIT 100
+								;''',{'obsolete_id':obsolete_id,'target':target})
+		db.plan_repo_merge(obsolete_id=obsolete_id,new_id=target,merging_reason_source='benchmark')
+	db.connection.commit()
+	db.batch_merge_repos()
+	return len(targets)
+
+# name:function(db,params) returning the number of rows processed (or None), run in this order.
+# Read-only scenarios come first, the ones modifying the DB last.
+SCENARIOS = {
+	'project_getters':scenario_project_getters,
+	'repo_to_repo_deps':scenario_repo_to_repo_deps,
+	'sr_cascades':scenario_sr_cascades,
+	'export':scenario_export,
+	'commit_fill':scenario_commit_fill,
+	'merges':scenario_merges,
+	}
+
+def run_benchmark(folder,db_type='sqlite',nb_repos=1000,scenarios=None,seed=0,
+					commit_fill_repos=10,commit_fill_commits=None,merges=10,
+					start_date=datetime.datetime(2012,1,1),end_date=datetime.datetime(2020,1,1),
+					metrics_db_name='repodepo_benchmark_metrics.db',db_kwargs=None,**generate_kwargs):
+	'''
+	Generates a synthetic DB of nb_repos repositories (see synthetic.generate_db for the other sizes, passed as generate_kwargs),
+	then runs the scenarios (all of SCENARIOS by default, or a list of names, run in the order of SCENARIOS) and returns their metrics (see metrics.report).
+	The generation itself is recorded as the scenario 'generate'.
+
+	folder: for the SQLite DBs and the metrics file; reuse it to compare runs of several versions
+	db_kwargs: connection parameters of a PostgreSQL DB (db_name, host, port, db_user, password, ...); the DB is cleaned first
+	'''
+	if scenarios is None:
+		scenarios = list(SCENARIOS.keys())
+	for s in scenarios:
+		if s not in SCENARIOS:
+			raise ValueError('Unknown benchmark scenario {}, available: {}'.format(s,list(SCENARIOS.keys())))
+	# scenarios modifying the DB after the read-only ones, whatever the order given
+	scenarios = sorted(set(scenarios),key=list(SCENARIOS.keys()).index)
+	if commit_fill_commits is None:
+		commit_fill_commits = 10*nb_repos
+	if db_kwargs is None:
+		db_kwargs = {}
+	else:
+		db_kwargs = dict(db_kwargs)
+	db_kwargs.setdefault('db_name','repodepo_benchmark')
+	if not os.path.exists(folder):
+		os.makedirs(folder)
+
+	db = repo_database.Database(db_type=db_type,db_folder=folder,data_folder=folder,
+						metrics_db_name=os.path.abspath(os.path.join(folder,metrics_db_name)),**db_kwargs)
+	db.clean_db()
+	db.init_db()
+	db.metrics_run_id = str(uuid.uuid1())
+	params = {'folder':folder,'seed':seed,'start_date':start_date,'end_date':end_date,
+				'commit_fill_repos':commit_fill_repos,'commit_fill_commits':commit_fill_commits,'merges':merges}
+	info = {'version':__version__,'db_type':db_type,'nb_repos':nb_repos,'seed':seed,'scenarios':scenarios,
+				'commit_fill_repos':commit_fill_repos,'commit_fill_commits':commit_fill_commits,'merges':merges}
+	info.update(generate_kwargs)
+
+	try:
+		db.logger.info('Benchmark run {}: generating synthetic DB'.format(db.metrics_run_id))
+		with metrics.measure(db=db,kind='benchmark',name='generate',phase='run') as m:
+			counts = synthetic.generate_db(db=db,nb_repos=nb_repos,seed=seed,start_date=start_date,end_date=end_date,**generate_kwargs)
+			m.nb_rows = sum(counts.values())
+			m.info = dict(info,counts=counts)
+		for s in scenarios:
+			db.logger.info('Benchmark run {}: scenario {}'.format(db.metrics_run_id,s))
+			with metrics.measure(db=db,kind='benchmark',name=s,phase='run') as m:
+				m.nb_rows = SCENARIOS[s](db,params)
+				m.info = info
+		ans = metrics.report(db=db,run_id=db.metrics_run_id,kind='benchmark')
+		db.logger.info('Benchmark run {} (version {}, {}, {} repositories):\n{}'.format(db.metrics_run_id,__version__,db_type,nb_repos,metrics.format_report(ans)))
+	finally:
+		db.connection.close()
+		db.metrics_store.close()
+	return ans
+
+def list_runs(folder,metrics_db_name='repodepo_benchmark_metrics.db'):
+	'''
+	Benchmark runs recorded in the metrics file of a benchmark folder, oldest first:
+	list of dicts with run_id, started_at and the parameters of the run (version, db_type, nb_repos, ...)
+	'''
+	store = metrics.MetricsStore(os.path.join(folder,metrics_db_name))
+	runs = {}
+	for r in store.get_rows(kind='benchmark'):
+		if r['run_id'] not in runs:
+			runs[r['run_id']] = dict(json.loads(r['info']) if r['info'] else {},run_id=r['run_id'],started_at=r['started_at'])
+	store.close()
+	return list(runs.values())
+
+def compare_runs(folder,old_run_id=None,new_run_id=None,metrics_db_name='repodepo_benchmark_metrics.db'):
+	'''
+	Duration of each scenario in two runs (by default the last two of the folder) and the ratio new/old
+	'''
+	if old_run_id is None or new_run_id is None:
+		runs = list_runs(folder=folder,metrics_db_name=metrics_db_name)
+		if len(runs) < 2:
+			raise ValueError('At least two benchmark runs are needed for a comparison, found {}'.format(len(runs)))
+		if new_run_id is None:
+			new_run_id = runs[-1]['run_id']
+		if old_run_id is None:
+			old_run_id = [r['run_id'] for r in runs if r['run_id'] != new_run_id][-1]
+	store = metrics.MetricsStore(os.path.join(folder,metrics_db_name))
+	durations = {}
+	for run_id,key in ((old_run_id,'old_duration'),(new_run_id,'new_duration')):
+		for r in store.get_rows(run_id=run_id,kind='benchmark'):
+			durations.setdefault(r['name'],{'name':r['name'],'old_duration':None,'new_duration':None})[key] = r['duration']
+	store.close()
+	ans = list(durations.values())
+	for elt in ans:
+		if elt['old_duration'] and elt['new_duration'] is not None:
+			elt['ratio'] = elt['new_duration']/elt['old_duration']
+		else:
+			elt['ratio'] = None
+	return ans
@@ -0,0 +1,163 @@
+'''
+Export of the dataset to Parquet files, for analysis without access to the database:
+one folder per table, split into files of batch_size rows (or partitioned by a column), plus the outputs of some getters.
+Strings are dictionary-encoded and the files compressed, columns and partitions can be loaded separately
+(e.g. pyarrow.parquet.read_table(folder,columns=[...]) or pandas.read_parquet).
+'''
+
+import os
+import json
+import shutil
+import logging
+import datetime
+
+from . import check_sqlname_safe
+from . import exports
+
+logger = logging.getLogger(__name__)
+
+try:
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+except ImportError:
+	pa = None
+	logger.info('pyarrow not installed, pip install pyarrow if you want to export the dataset to Parquet files')
+
+
+def get_columns_types(db,table):
+	'''
+	List of (column,declared type) of a table, in the order of the columns
+	'''
+	check_sqlname_safe(table)
+	if db.db_type == 'postgres':
+		db.cursor.execute('''SELECT c.column_name,c.data_type FROM information_schema.columns c
+							WHERE c.table_schema = (SELECT current_schema()) AND c.table_name=%(table)s
+							ORDER BY c.ordinal_position ;''',{'table':table})
+		return [(c,t) for c,t in db.cursor.fetchall()]
+	else:
+		db.cursor.execute('''PRAGMA table_info({table});'''.format(table=table))
+		return [(r[1],r[2]) for r in db.cursor.fetchall()]
+
+def arrow_type(declared_type):
+	'''
+	Arrow type for a declared SQL column type, so that all the files of a table share the same schema
+	'''
+	t = declared_type.upper()
+	if 'INT' in t or 'SERIAL' in t:
+		return pa.int64()
+	elif 'BOOL' in t:
+		return pa.bool_()
+	elif any(s in t for s in ('REAL','DOUBLE','FLOAT','NUMERIC','DECIMAL')):
+		return pa.float64()
+	elif 'TIMESTAMP' in t:
+		return pa.timestamp('us')
+	elif t == 'DATE':
+		return pa.date32()
+	elif 'BLOB' in t or 'BYTEA' in t:
+		return pa.binary()
+	else:
+		return pa.string()
+
+def arrow_value(value,a_type):
+	if value is None:
+		return None
+	elif a_type == pa.string() and not isinstance(value,str):
+		if isinstance(value,(dict,list)):
+			return json.dumps(value)
+		else:
+			return str(value)
+	elif a_type == pa.bool_():
+		return bool(value)
+	elif a_type == pa.binary():
+		return bytes(value)
+	elif a_type == pa.date32() and isinstance(value,datetime.datetime):
+		return value.date()
+	else:
+		return value
+
+def rows_to_arrow(rows,columns,schema):
+	'''
+	Arrow table from a list of rows (tuples in the order of columns)
+	'''
+	arrays = []
+	for i,(c,field) in enumerate(zip(columns,schema)):
+		arrays.append(pa.array([arrow_value(r[i],field.type) for r in rows],type=field.type))
+	return pa.Table.from_arrays(arrays,schema=schema)
+
+def write_parquet_folder(batches,schema,folder,partition_cols=None,compression='zstd',columns=None):
+	'''
+	Writes the batches (lists of rows) to a folder of Parquet files: one file per batch, or partitioned by partition_cols.
+	Written in a temporary folder first, renamed at the end: an existing folder is always complete.
+	'''
+	if columns is None:
+		columns = schema.names
+	tmp_folder = folder+'_tmp'
+	if os.path.exists(tmp_folder):
+		shutil.rmtree(tmp_folder)
+	os.makedirs(tmp_folder)
+	nb_rows = 0
+	for i,batch in enumerate(batches):
+		table = rows_to_arrow(rows=batch,columns=columns,schema=schema)
+		nb_rows += table.num_rows
+		if partition_cols:
+			pq.write_to_dataset(table,root_path=tmp_folder,partition_cols=partition_cols,compression=compression,use_dictionary=True,
+								basename_template='part-{:05d}-{{i}}.parquet'.format(i))
+		else:
+			pq.write_table(table,os.path.join(tmp_folder,'part-{:05d}.parquet'.format(i)),compression=compression,use_dictionary=True)
+	if nb_rows == 0:
+		pq.write_table(schema.empty_table(),os.path.join(tmp_folder,'part-00000.parquet'),compression=compression)
+	if os.path.exists(folder):
+		shutil.rmtree(folder)
+	os.rename(tmp_folder,folder)
+	return nb_rows
+
+def default_getters(db):
+	from ..getters import edge_getters
+	return {
+		'dev_to_repo':(edge_getters.DevToRepo(db=db),[('user_id',pa.int64()),('user_rank',pa.int64()),('repo_id',pa.int64()),('repo_rank',pa.int64()),('norm_value',pa.float64()),('abs_value',pa.float64())]),
+		'repo_to_repo_deps':(edge_getters.RepoToRepoDeps(db=db),[('repo_id',pa.int64()),('repo_rank',pa.int64()),('dep_id',pa.int64()),('dep_rank',pa.int64()),('value',pa.float64())]),
+		}
+
+def export_parquet(db,output_folder,tables=None,getters=None,partition_cols=None,batch_size=10**6,compression='zstd',force=False):
+	'''
+	Exports the tables of the DB (all by default, or the list tables) to output_folder/tables/<table>/,
+	and the raw results of getters to output_folder/getters/<name>/.
+
+	getters: dict name:(getter,[(field,arrow type),...]) of getters with a get_result(raw_result=True) output (rows as dicts),
+	by default DevToRepo and RepoToRepoDeps edges.
+	partition_cols: dict table:[columns] for tables partitioned by columns (hive-style folders) instead of files of batch_size rows.
+	Existing folders are skipped unless force=True.
+	'''
+	if pa is None:
+		raise ImportError('pyarrow is needed to export the dataset to Parquet files: pip install pyarrow')
+	if partition_cols is None:
+		partition_cols = {}
+	tables_info = exports.get_tables_info(db=db)
+	if tables is None:
+		tables = list(tables_info.keys())
+
+	for t in tables:
+		folder = os.path.join(output_folder,'tables',t)
+		if os.path.exists(folder) and not force:
+			db.logger.info('Skipping table {}, already exported to Parquet'.format(t))
+			continue
+		columns_types = get_columns_types(db=db,table=t)
+		columns = [c for c,_ in columns_types]
+		schema = pa.schema([(c,arrow_type(ct)) for c,ct in columns_types])
+		db.logger.info('Exporting table {} to Parquet'.format(t))
+		table_data = exports.get_table_data(table=t,columns=columns,db=db,batch_size=batch_size,use_multiqueries=True)
+		nb_rows = write_parquet_folder(batches=exports.iter_batches(table_data,batch_size),schema=schema,folder=folder,
+										partition_cols=partition_cols.get(t),compression=compression)
+		db.logger.info('Exported {} rows of table {} to Parquet'.format(nb_rows,t))
+
+	if getters is None:
+		getters = default_getters(db=db)
+	for name,(getter,fields) in getters.items():
+		folder = os.path.join(output_folder,'getters',name)
+		if os.path.exists(folder) and not force:
+			db.logger.info('Skipping getter {}, already exported to Parquet'.format(name))
+			continue
+		db.logger.info('Exporting getter {} to Parquet'.format(name))
+		schema = pa.schema(fields)
+		rows = (tuple(r[f] for f,_ in fields) for r in getter.get_result(db=db,raw_result=True))
+		write_parquet_folder(batches=exports.iter_batches(rows,batch_size),schema=schema,folder=folder,compression=compression)
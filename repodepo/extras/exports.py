@@ -4,9 +4,12 @@ import sqlite3
 import copy
 import csv
 import os
+import itertools
+import json
+import datetime
+from concurrent.futures import ThreadPoolExecutor,as_completed
 from collections import OrderedDict
 import oyaml as yaml
-from sh import pg_dump,psql
 import psycopg2
 import psycopg2.extras
 from . import errors
@@ -83,9 +86,78 @@ def get_tables_info(db,as_yml=False,keep_dbinfo=False):
 		return ans
 
 
-def get_table_data(table,columns,db,batch_size=None,use_multiqueries=False,page_size=None):
+def get_table_key(table,columns,db):
+	'''
+	Columns along which a table can be read in order: id if present, rowid for SQLite, the primary key columns for PostgreSQL.
+	Empty list if no such key exists.
+	'''
+	check_sqlname_safe(table)
+	if 'id' in columns:
+		return ['id']
+	elif db.db_type == 'sqlite':
+		return ['rowid']
+	else:
+		db.cursor.execute('''SELECT a.attname FROM pg_index i
+							INNER JOIN pg_attribute a
+							ON a.attrelid=i.indrelid AND a.attnum = ANY(i.indkey)
+							WHERE i.indrelid = %(table)s::regclass AND i.indisprimary
+							ORDER BY array_position(i.indkey::int2[],a.attnum)
+							;''',{'table':table})
+		return [r[0] for r in db.cursor.fetchall()]
+
+def key_condition(db,key,after=None,key_range=None):
+	'''
+	SQL condition and parameters selecting the rows with key > after (row value comparison for composite keys),
+	and with key_range[0] < key[0] <= key_range[1] for the bounds of key_range that are not None.
+	'''
+	if db.db_type == 'postgres':
+		placeholder = '%({})s'
+	else:
+		placeholder = ':{}'
+	conditions = []
+	params = {}
+	if after is not None:
+		params.update({'after_{}'.format(i):v for i,v in enumerate(after)})
+		conditions.append('({}) > ({})'.format(','.join(key),','.join([placeholder.format('after_{}'.format(i)) for i in range(len(key))])))
+	if key_range is not None:
+		if key_range[0] is not None:
+			params['range_lower'] = key_range[0]
+			conditions.append('{} > {}'.format(key[0],placeholder.format('range_lower')))
+		if key_range[1] is not None:
+			params['range_upper'] = key_range[1]
+			conditions.append('{} <= {}'.format(key[0],placeholder.format('range_upper')))
+	return ' AND '.join(conditions),params
+
+def get_key_ranges(table,db,key,nb_ranges,min_range_size=1):
+	'''
+	Splits a table into at most nb_ranges independent ranges (lower,upper] of equal width on the first column of its key,
+	each covering at least min_range_size values. [(None,None)] if the first key column is not an integer or the table is empty.
+	'''
+	check_sqlname_safe(table)
+	for k in key:
+		check_sqlname_safe(k)
+	if not key:
+		return [(None,None)]
+	db.cursor.execute('SELECT MIN({key}),MAX({key}) FROM {table};'.format(key=key[0],table=table))
+	key_min,key_max = db.cursor.fetchone()
+	if not isinstance(key_min,int) or not isinstance(key_max,int):
+		return [(None,None)]
+	nb_ranges = max(1,min(nb_ranges,(key_max-key_min+1)//max(1,min_range_size)))
+	bounds = [key_min-1+((key_max-key_min+1)*i)//nb_ranges for i in range(nb_ranges+1)]
+	ranges = list(zip(bounds[:-1],bounds[1:]))
+	# first and last ranges open, rows inserted in the origin meanwhile are not missed
+	ranges[0] = (None,ranges[0][1])
+	ranges[-1] = (ranges[-1][0],None)
+	return ranges
+
+def get_table_data(table,columns,db,batch_size=None,use_multiqueries=False,page_size=None,key=None,after=None,key_range=None):
 	'''
 	gets a generator outputing the rows of the table
+
+	key: list of columns (see get_table_key) along which rows are ordered, starting after the values after if not None,
+	and restricted to key_range (see key_condition) if not None.
+	With use_multiqueries, pages of batch_size rows are read by successive queries, each one starting after the key of the last row read:
+	the cost of a page does not depend on its position in the table. If no key is given, the one of get_table_key is used.
 	'''
 	check_sqlname_safe(table)
 
@@ -103,25 +175,62 @@ def get_table_data(table,columns,db,batch_size=None,use_multiqueries=False,page_
 	for c in columns:
 		check_sqlname_safe(c)
 
+	if isinstance(key,str):
+		key = [key]
+	if use_multiqueries and batch_size is not None and not key:
+		key = get_table_key(table=table,columns=columns,db=db)
+	if key:
+		for k in key:
+			check_sqlname_safe(k)
+		# key columns missing from the output are queried, and removed from the rows
+		query_columns = list(columns)+[k for k in key if k not in columns]
+		key_idx = [query_columns.index(k) for k in key]
+		nb_columns = len(columns)
+		order_clause = 'ORDER BY {}'.format(','.join(key))
+		if after is not None and not isinstance(after,(list,tuple)):
+			after = [after]
+	else:
+		query_columns = list(columns)
+		order_clause = ''
+
+	def query(after,limit=None,offset=None):
+		if key:
+			condition,params = key_condition(db=db,key=key,after=after,key_range=key_range)
+		else:
+			condition,params = '',{}
+		return '''
+			SELECT {columns} FROM {table} {where} {condition} {order_clause} {limit} {offset}
+			;'''.format(columns=','.join(query_columns),table=table,
+						where='WHERE' if condition else '',condition=condition,order_clause=order_clause,
+						limit='' if limit is None else 'LIMIT {}'.format(int(limit)),
+						offset='' if offset is None else 'OFFSET {}'.format(int(offset))),params
+
+	def strip(rows):
+		if len(query_columns) == len(columns):
+			return rows
+		else:
+			return [r[:nb_columns] for r in rows]
+
 	if batch_size is None:
-		cursor.execute('''
-			SELECT {columns} FROM {table}
-			;'''.format(columns=','.join(columns),table=table))
-		return cursor.fetchall()
+		cursor.execute(*query(after=after))
+		return strip(cursor.fetchall())
 	else:
 		def ans_gen():
 			counter = 0
+			last = after
 			if not use_multiqueries:
-				cursor.execute('''
-						SELECT {columns} FROM {table}
-					;'''.format(columns=','.join(columns),table=table))
+				cursor.execute(*query(after=after))
+			elif not key:
+				db.logger.warning('No key to paginate table {}, using LIMIT/OFFSET'.format(table))
 			while True:
 				if use_multiqueries:
-					cursor.execute('''
-							SELECT {columns} FROM {table}
-							LIMIT {limit} OFFSET {offset}
-						;'''.format(columns=','.join(columns),table=table,limit=batch_size,offset=counter))
+					if key:
+						cursor.execute(*query(after=last,limit=batch_size))
+					else:
+						cursor.execute(*query(after=None,limit=batch_size,offset=counter))
 					rows = list(cursor.fetchall())
+					if key and rows:
+						last = [rows[-1][i] for i in key_idx]
 				else:
 					rows = cursor.fetchmany(batch_size)
 				if not rows:
@@ -129,8 +238,8 @@ def get_table_data(table,columns,db,batch_size=None,use_multiqueries=False,page_
 				else:
 					if counter != 0 or len(rows) == batch_size:
 						db.logger.info('Fetched {} rows of table {}'.format(counter+len(rows),table))
-						counter += len(rows)
-					for r in rows:
+					counter += len(rows)
+					for r in strip(rows):
 						yield r
 					if len(rows) < batch_size:
 						break
@@ -138,11 +247,82 @@ def get_table_data(table,columns,db,batch_size=None,use_multiqueries=False,page_
 				cursor.itersize = orig_itersize
 		return ans_gen()
 
-def insert_table_data(table,columns,db,table_data,page_size=10**5):
+def copy_text_value(value):
+	'''
+	Value in the text format of PostgreSQL COPY.
+	Timestamps and booleans arrive already converted by the connections (see repo_database.convert_timestamp for SQLite),
+	binary values (BLOBs, bytea) are written as hex bytea, dicts as JSON.
+	'''
+	if value is None:
+		return '\\N'
+	elif isinstance(value,bool):
+		return 't' if value else 'f'
+	elif isinstance(value,(bytes,bytearray,memoryview)):
+		return '\\\\x'+bytes(value).hex()
+	elif isinstance(value,datetime.datetime):
+		value = value.isoformat(sep=' ')
+	elif isinstance(value,datetime.date):
+		value = value.isoformat()
+	elif isinstance(value,(dict,list)):
+		value = json.dumps(value)
+	else:
+		value = str(value)
+	return value.replace('\\','\\\\').replace('\n','\\n').replace('\r','\\r').replace('\t','\\t')
+
+class CopyStream(object):
+	'''
+	File-like object giving the rows in the text format of PostgreSQL COPY, generated lazily while being read by copy_expert
+	'''
+	def __init__(self,rows):
+		self.lines = ('\t'.join([copy_text_value(v) for v in r])+'\n' for r in rows)
+		self.buffer = ''
+
+	def read(self,size=-1):
+		chunks = [self.buffer]
+		length = len(self.buffer)
+		while size < 0 or length < size:
+			try:
+				line = next(self.lines)
+			except StopIteration:
+				break
+			chunks.append(line)
+			length += len(line)
+		data = ''.join(chunks)
+		if size < 0:
+			self.buffer = ''
+			return data
+		else:
+			self.buffer = data[size:]
+			return data[:size]
+
+def copy_table_data(table,columns,db,table_data,conflicts=True,size=2**20):
+	'''
+	Inserts rows in a PostgreSQL table with COPY FROM STDIN, streamed from table_data.
+	With conflicts, rows are copied into a temporary table first, and inserted from it with ON CONFLICT DO NOTHING.
+	'''
+	check_sqlname_safe(table)
+	for c in columns:
+		check_sqlname_safe(c)
+	stream = CopyStream(table_data)
+	if not conflicts:
+		db.cursor.copy_expert('COPY {table}({columns}) FROM STDIN;'.format(table=table,columns=','.join(columns)),stream,size=size)
+	else:
+		db.cursor.execute('CREATE TEMPORARY TABLE _copy_{table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP;'.format(table=table))
+		db.cursor.copy_expert('COPY _copy_{table}({columns}) FROM STDIN;'.format(table=table,columns=','.join(columns)),stream,size=size)
+		db.cursor.execute('''INSERT INTO {table}({columns}) SELECT {columns} FROM _copy_{table} ON CONFLICT DO NOTHING;
+							DROP TABLE _copy_{table};'''.format(table=table,columns=','.join(columns)))
+
+def insert_table_data(table,columns,db,table_data,page_size=10**5,use_copy=False,conflicts=True):
+	'''
+	Inserts rows, ignoring the ones conflicting with existing ones.
+	use_copy: for PostgreSQL, streaming the rows with COPY (see copy_table_data); conflicts=False if the rows cannot conflict with existing ones
+	'''
 	check_sqlname_safe(table)
 	for c in columns:
 		check_sqlname_safe(c)
-	if db.db_type == 'postgres':
+	if db.db_type == 'postgres' and use_copy:
+		copy_table_data(table=table,columns=columns,db=db,table_data=table_data,conflicts=conflicts)
+	elif db.db_type == 'postgres':
 		psycopg2.extras.execute_batch(db.cursor,'''
 			INSERT INTO {table}({columns}) VALUES ({separators}) ON CONFLICT DO NOTHING
 			;'''.format(columns=','.join(columns),table=table,separators=','.join(['%s' for _ in columns]))
@@ -153,6 +333,154 @@ def insert_table_data(table,columns,db,table_data,page_size=10**5):
 			;'''.format(columns=','.join(columns),table=table,separators=','.join(['?' for _ in columns]))
 			,(td for td in table_data))
 
+def iter_batches(rows,batch_size):
+	'''
+	Lists of at most batch_size consecutive elements of rows
+	'''
+	rows = iter(rows)
+	while True:
+		batch = list(itertools.islice(rows,batch_size))
+		if not batch:
+			break
+		yield batch
+
+def export_progress_name(table,key_range=None):
+	if key_range is None:
+		return 'export_progress_{}'.format(table)
+	else:
+		return 'export_progress_{}_{}_{}'.format(table,*['' if b is None else b for b in key_range])
+
+def get_export_progress(db,table,key_range=None):
+	'''
+	Progress of the export of a table (or of a range of it, see get_key_ranges) in the destination DB:
+	None if not started, 'started', 'done', or the list of the key values of the last row exported
+	'''
+	if db.db_type == 'postgres':
+		db.cursor.execute('''SELECT info_content FROM _dbinfo WHERE info_type=%(info_type)s;''',{'info_type':export_progress_name(table=table,key_range=key_range)})
+	else:
+		db.cursor.execute('''SELECT info_content FROM _dbinfo WHERE info_type=:info_type;''',{'info_type':export_progress_name(table=table,key_range=key_range)})
+	ans = db.cursor.fetchone()
+	if ans is None or ans[0] in ('started','done'):
+		return None if ans is None else ans[0]
+	else:
+		ans = json.loads(ans[0])
+		return ans if isinstance(ans,list) else [ans]
+
+def set_export_progress(db,table,progress,key_range=None):
+	'''
+	Records the progress of the export of a table, in the current transaction of the destination DB (committed with the inserted rows)
+	'''
+	if progress not in ('started','done'):
+		progress = json.dumps(progress,default=str)
+	if db.db_type == 'postgres':
+		db.cursor.execute('''INSERT INTO _dbinfo(info_type,info_content) VALUES(%(info_type)s,%(progress)s)
+							ON CONFLICT(info_type) DO UPDATE SET info_content=EXCLUDED.info_content;''',{'info_type':export_progress_name(table=table,key_range=key_range),'progress':progress})
+	else:
+		db.cursor.execute('''INSERT OR REPLACE INTO _dbinfo(info_type,info_content) VALUES(:info_type,:progress);''',{'info_type':export_progress_name(table=table,key_range=key_range),'progress':progress})
+
+def is_table_exported(dest_db,table,force=False):
+	'''
+	True if the export of the table is recorded as finished, or if the table is not empty without any record of progress (exported by a previous version)
+	'''
+	if force:
+		return False
+	progress = get_export_progress(db=dest_db,table=table)
+	if progress == 'done':
+		return True
+	elif progress is None:
+		return not is_table_empty(db=dest_db,table=table)
+	else:
+		return False
+
+def is_table_empty(db,table):
+	check_sqlname_safe(table)
+	db.cursor.execute('SELECT 1 FROM {} LIMIT 1;'.format(table))
+	return db.cursor.fetchone() is None
+
+def export_table(orig_db,dest_db,table,columns,page_size=10**5,batch_size=10**6,force=False,key_range=None,use_copy=True,dest_empty=None):
+	'''
+	Exports one table (or the range key_range of it, see get_key_ranges) by batches of batch_size rows, read in the order of the key of the table.
+	Each batch is committed together with the key of its last row, so that an interrupted export resumes after it.
+	Tables without key are exported again from the start when resuming.
+
+	use_copy: for a PostgreSQL destination, rows are streamed with COPY.
+	Rows are copied directly into the table only if it was empty when the export started (dest_empty, checked here if None),
+	otherwise through a temporary table and inserted with ON CONFLICT DO NOTHING (see copy_table_data).
+	'''
+	check_sqlname_safe(table)
+	if key_range is None and is_table_exported(dest_db=dest_db,table=table,force=force):
+		dest_db.logger.info('Skipping table {}, already exported'.format(table))
+		return
+	progress = None if force else get_export_progress(db=dest_db,table=table,key_range=key_range)
+	if progress == 'done':
+		return
+	if dest_empty is None:
+		dest_empty = is_table_empty(db=dest_db,table=table)
+	if progress is None:
+		# marking the table as started, the rows inserted before an interruption are not mistaken for a finished export
+		set_export_progress(db=dest_db,table=table,key_range=key_range,progress='started')
+		dest_db.connection.commit()
+	key = get_table_key(table=table,columns=columns,db=orig_db)
+	query_columns = list(columns)+[k for k in key if k not in columns]
+	key_idx = [query_columns.index(k) for k in key]
+	conflicts = not dest_empty
+	range_str = '' if key_range is None else ' ({} in {})'.format(key[0],key_range)
+	if progress in (None,'started') or not key:
+		after = None
+		dest_db.logger.info('Exporting table {}{}'.format(table,range_str))
+	else:
+		after = progress
+		dest_db.logger.info('Resuming export of table {}{} after {}={}'.format(table,range_str,key,after))
+	table_data = get_table_data(table=table,columns=query_columns,db=orig_db,batch_size=batch_size,page_size=page_size,key=key,after=after,key_range=key_range) # as a generator
+	for batch in iter_batches(table_data,batch_size):
+		if len(query_columns) == len(columns):
+			rows = batch
+		else:
+			rows = [r[:len(columns)] for r in batch]
+		insert_table_data(table=table,columns=columns,db=dest_db,table_data=rows,page_size=page_size,use_copy=use_copy,conflicts=conflicts)
+		if key:
+			set_export_progress(db=dest_db,table=table,key_range=key_range,progress=[batch[-1][i] for i in key_idx])
+		dest_db.connection.commit()
+	set_export_progress(db=dest_db,table=table,key_range=key_range,progress='done')
+	dest_db.connection.commit()
+
+def plan_table_export(orig_db,dest_db,table,columns,nb_ranges,min_range_size,force=False):
+	'''
+	Ranges of the table to be exported independently (see get_key_ranges), [None] for the whole table, [] if already exported
+	'''
+	if is_table_exported(dest_db=dest_db,table=table,force=force):
+		dest_db.logger.info('Skipping table {}, already exported'.format(table))
+		return []
+	key = get_table_key(table=table,columns=columns,db=orig_db)
+	ranges = get_key_ranges(table=table,db=orig_db,key=key,nb_ranges=nb_ranges,min_range_size=min_range_size)
+	if len(ranges) == 1:
+		return [None]
+	else:
+		set_export_progress(db=dest_db,table=table,progress='started')
+		dest_db.connection.commit()
+		dest_db.logger.info('Exporting table {} in {} ranges of {}'.format(table,len(ranges),key[0]))
+		return ranges
+
+def export_table_worker(orig_db,dest_db,table,columns,**kwargs):
+	'''
+	export_table with connections of its own, for the export of several tables or ranges at once
+	'''
+	orig_db = orig_db.copy()
+	dest_db = dest_db.copy()
+	try:
+		set_session_timeout(db=dest_db)
+		export_table(orig_db=orig_db,dest_db=dest_db,table=table,columns=columns,**kwargs)
+	finally:
+		orig_db.connection.close()
+		dest_db.connection.close()
+
+def set_session_timeout(db):
+	if db.db_type == 'postgres':
+		if db.connection.server_version >= 90600:
+			db.cursor.execute('''SET SESSION idle_in_transaction_session_timeout = 0;''')
+		else:
+			db.logger.warning('You may experience failure of export due to parameter idle_in_transaction_session_timeout not existing in PostgreSQL<9.6')
+
 def fix_sequences(db):
 	if db.db_type == 'postgres':
 		db.logger.info('Fixing sequences')
@@ -184,9 +512,14 @@ def fix_sequences(db):
 			db.cursor.execute(c)
 		db.connection.commit()
 
-def export(orig_db,dest_db,page_size=10**5,ignore_error=False,force=False,batch_size=10**6):
+def export(orig_db,dest_db,page_size=10**5,ignore_error=False,force=False,batch_size=10**6,workers=1,use_copy=True):
 	'''
 	Exporting data from one database to another, being SQLite or PostgreSQL for both
+	Tables are exported by batches, and the progress is recorded per table in _dbinfo: an interrupted export resumes where it stopped.
+	With workers>1, several tables are exported at once, each with its own connections (not for SQLite in-memory DBs or a SQLite destination);
+	large tables are split into ranges of their key exported concurrently.
+	force: exporting all tables again, ignoring recorded progress
+	use_copy: for a PostgreSQL destination, streaming rows with COPY instead of INSERT, handling conflicts with existing rows unless the destination table is empty (see export_table)
 	'''
 	if check_db_equal(orig_db,dest_db):
 		# orig_db.logger.info('Cannot export to self, skipping')
@@ -245,24 +578,42 @@ origin has no _dbinfo table'''.format(orig_db=orig_db.db_name,
 			tables_info_dest = get_tables_info(db=dest_db)
 			if dest_db.db_type == 'postgres':
 				dest_db.cursor.execute(disable_triggers_cmd(db=dest_db,tables_info=tables_info_dest))
-				if dest_db.connection.server_version >= 90600:
-					dest_db.cursor.execute('''SET SESSION idle_in_transaction_session_timeout = 0;''')
-				else:
-					dest_db.logger.warning('You may experience failure of export due to parameter idle_in_transaction_session_timeout not existing in PostgreSQL<9.6')
+				set_session_timeout(db=dest_db)
+			dest_db.connection.commit()
+			if workers > 1 and (dest_db.db_type == 'sqlite' or getattr(orig_db,'in_ram',False)):
+				dest_db.logger.info('Exporting tables one at a time: concurrent export needs a PostgreSQL destination and an origin DB on disk')
+				workers = 1
 			try:
+				tables = []
 				for t,columns in tables_info.items():
 					check_sqlname_safe(t)
 					if t in tables_info_dest.keys():
-						dest_db.cursor.execute('SELECT 1 FROM {} LIMIT 1;'.format(t))
-						if dest_db.cursor.fetchone() == (1,) and not force:
-							dest_db.logger.info('Skipping table {}, already exported'.format(t))
-							continue
-						dest_db.logger.info('Exporting table {}'.format(t))
-						table_data = get_table_data(table=t,columns=columns,db=orig_db,batch_size=batch_size,page_size=page_size) # as a generator
-						insert_table_data(table=t,columns=columns,db=dest_db,table_data=table_data,page_size=page_size)
-						dest_db.connection.commit()
+						tables.append((t,columns))
 					else:
 						dest_db.logger.info('Skipping table {}, not in schema of destination DB'.format(t))
+				if workers == 1:
+					for t,columns in tables:
+						export_table(orig_db=orig_db,dest_db=dest_db,table=t,columns=columns,page_size=page_size,batch_size=batch_size,force=force,use_copy=use_copy)
+				else:
+					# large tables are split in ranges, exported concurrently
+					# emptiness checked before any range is exported, the ranges being inserted in the same table
+					dest_empty = {t:is_table_empty(db=dest_db,table=t) for t,columns in tables}
+					tasks = {t:plan_table_export(orig_db=orig_db,dest_db=dest_db,table=t,columns=columns,nb_ranges=workers,min_range_size=batch_size,force=force) for t,columns in tables}
+					remaining = {t:len(ranges) for t,ranges in tasks.items()}
+					with ThreadPoolExecutor(max_workers=workers) as executor:
+						futures = {executor.submit(export_table_worker,orig_db=orig_db,dest_db=dest_db,table=t,columns=columns,page_size=page_size,batch_size=batch_size,force=force,key_range=key_range,use_copy=use_copy,dest_empty=dest_empty[t]):t
+										for t,columns in tables for key_range in tasks[t]}
+						try:
+							for future in as_completed(futures):
+								future.result()
+								t = futures[future]
+								remaining[t] -= 1
+								if remaining[t] == 0 and tasks[t] != [None]:
+									set_export_progress(db=dest_db,table=t,progress='done')
+									dest_db.connection.commit()
+						except BaseException:
+							executor.shutdown(wait=True,cancel_futures=True)
+							raise
 				if dest_db.db_type == 'postgres':
 					dest_db.cursor.execute(enable_triggers_cmd(db=dest_db,tables_info=tables_info_dest))
 					fix_sequences(db=dest_db)
@@ -272,7 +623,9 @@ origin has no _dbinfo table'''.format(orig_db=orig_db.db_name,
 					dest_db.cursor.execute('''INSERT INTO _dbinfo(info_type,info_content) VALUES ('finished_exported_from',:orig_uuid);''',{'orig_uuid':orig_uuid})
 			except:
 				# closing connection manually because idle_in_transaction_session_timeout is infinite
+				# (cursor first: with SQLite, a connection closed with a live cursor keeps its lock until the cursor is deleted)
 				try:
+					dest_db.cursor.close()
 					dest_db.connection.close()
 				except:
 					pass
@@ -421,6 +774,8 @@ def dump_pg_csv(db,output_folder,import_dump=True,schema_dump=True,csv_dump=True
 
 	if not db.db_type == 'postgres':
 		raise errors.RepoToolsDumpSQLiteError('Trying to dump to schema and CSV from a SQLite DB, should be PostgreSQL')
+	# imported here: sh looks for the pg_dump and psql executables, which are only needed for this dump
+	from sh import pg_dump,psql
 
 	if not os.path.exists(os.path.join(output_folder,'data')):
 		os.makedirs(os.path.join(output_folder,'data'))
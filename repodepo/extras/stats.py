@@ -1,11 +1,23 @@
 import psycopg2
 from collections import OrderedDict
 import oyaml as yaml
-import networkx as nx
 import datetime
 import os
+import numpy as np
+from scipy import sparse
+
+from ..getters import generic_getters,edge_getters,rank_getters,graph_analytics
+
+def pairs_isin(a,b,pairs):
+	'''
+	Bool array, True where (a[k],b[k]) is one of the rows of pairs (array of shape (n,2)).
+	Values are ids, -1 standing for a missing one (never matching).
+	'''
+	if not pairs.shape[0]:
+		return np.zeros(np.shape(a),dtype=np.bool_)
+	base = int(max(np.max(a,initial=0),np.max(b,initial=0),pairs.max()))+2
+	return np.isin((np.asarray(a)+1)*base+np.asarray(b)+1,(pairs[:,0]+1)*base+pairs[:,1]+1)
 
-from ..getters import generic_getters,edge_getters,rank_getters
 
 class Stats(generic_getters.Getter):
 	'''
@@ -778,10 +790,11 @@ class DepsStats(DBStats):
 	'''
 	dependencies stats
 	'''
-	def __init__(self,detailed=False,limit=10**4,only_filtered=False,timestamp=datetime.datetime.now(),**kwargs):
+	def __init__(self,detailed=False,limit=None,only_filtered=False,timestamp=datetime.datetime.now(),**kwargs):
 		DBStats.__init__(self,**kwargs)
+		if limit is not None:
+			self.logger.warning('limit is deprecated and ignored: cycles are no longer enumerated')
 		self.timestamp = timestamp
-		self.limit = limit
 		self.detailed = detailed
 		self.only_filtered = only_filtered
 
@@ -797,348 +810,241 @@ class DepsStats(DBStats):
 		if not self.only_filtered:
 		
 			results['packagespace'] = OrderedDict()
-			results['packagespace']['nb_links'] = len(self.network_p.edges)
+			results['packagespace']['nb_links'] = self.network_p.shape[0]
 			results['packagespace']['cycles'] = self.get_cycles(space='p',filtered=False,detailed=self.detailed,network=self.network_p)
 
 		results['packagespace_filtered'] = OrderedDict()
-		results['packagespace_filtered']['nb_links'] = len(self.network_p_filtered.edges)
+		results['packagespace_filtered']['nb_links'] = self.network_p_filtered.shape[0]
 		if not self.only_filtered:
-			results['packagespace_filtered']['nb_links_filtered'] = len(self.network_p.edges)-len(self.network_p_filtered.edges)
+			results['packagespace_filtered']['nb_links_filtered'] = self.network_p.shape[0]-self.network_p_filtered.shape[0]
 		results['packagespace_filtered']['cycles'] = self.get_cycles(space='p',filtered=True,detailed=self.detailed,network=self.network_p_filtered)
 
 		if not self.only_filtered:
 
 			results['packagespace_timestamp'] = OrderedDict()
-			results['packagespace_timestamp']['nb_links'] = len(self.network_p_timestamp.edges)
+			results['packagespace_timestamp']['nb_links'] = self.network_p_timestamp.shape[0]
 			results['packagespace_timestamp']['cycles'] = self.get_cycles(space='p',filtered=False,detailed=self.detailed,network=self.network_p_timestamp)
 
 		results['packagespace_timestamp_filtered'] = OrderedDict()
-		results['packagespace_timestamp_filtered']['nb_links'] = len(self.network_p_filtered_timestamp.edges)
+		results['packagespace_timestamp_filtered']['nb_links'] = self.network_p_filtered_timestamp.shape[0]
 		if not self.only_filtered:
-			results['packagespace_timestamp_filtered']['nb_links_filtered'] = len(self.network_p_timestamp.edges) - len(self.network_p_filtered_timestamp.edges)
+			results['packagespace_timestamp_filtered']['nb_links_filtered'] = self.network_p_timestamp.shape[0] - self.network_p_filtered_timestamp.shape[0]
 		results['packagespace_timestamp_filtered']['cycles'] = self.get_cycles(space='p',filtered=True,detailed=self.detailed,network=self.network_p_filtered_timestamp)
 
 		if not self.only_filtered:
 
 			results['repospace'] = OrderedDict()
-			results['repospace']['nb_links'] = len(self.network_r.edges)
+			results['repospace']['nb_links'] = self.network_r.shape[0]
 			results['repospace']['cycles'] = self.get_cycles(space='r',filtered=False,detailed=self.detailed,network=self.network_r)
 
 		results['repospace_filtered'] = OrderedDict()
-		results['repospace_filtered']['nb_links'] = len(self.network_r_filtered.edges)
+		results['repospace_filtered']['nb_links'] = self.network_r_filtered.shape[0]
 		if not self.only_filtered:
-			results['repospace_filtered']['nb_links_filtered'] = len(self.network_r.edges) - len(self.network_r_filtered.edges)
+			results['repospace_filtered']['nb_links_filtered'] = self.network_r.shape[0] - self.network_r_filtered.shape[0]
 		results['repospace_filtered']['cycles'] = self.get_cycles(space='r',filtered=True,detailed=self.detailed,network=self.network_r_filtered)
 
 		if not self.only_filtered:
 
 			results['repospace_timestamp'] = OrderedDict()
-			results['repospace_timestamp']['nb_links'] = len(self.network_r_timestamp.edges)
+			results['repospace_timestamp']['nb_links'] = self.network_r_timestamp.shape[0]
 			results['repospace_timestamp']['cycles'] = self.get_cycles(space='r',filtered=False,detailed=self.detailed,network=self.network_r_timestamp)
 
 		results['repospace_timestamp_filtered'] = OrderedDict()
-		results['repospace_timestamp_filtered']['nb_links'] = len(self.network_r_filtered_timestamp.edges)
+		results['repospace_timestamp_filtered']['nb_links'] = self.network_r_filtered_timestamp.shape[0]
 		if not self.only_filtered:
-			results['repospace_timestamp_filtered']['nb_links_filtered'] = len(self.network_r_timestamp.edges) - len(self.network_r_filtered_timestamp.edges)
+			results['repospace_timestamp_filtered']['nb_links_filtered'] = self.network_r_timestamp.shape[0] - self.network_r_filtered_timestamp.shape[0]
 		results['repospace_timestamp_filtered']['cycles'] = self.get_cycles(space='r',filtered=True,detailed=self.detailed,network=self.network_r_filtered_timestamp)
 
 
 		return results
 
+	def get_dependency_edges(self):
+		'''
+		All package dependencies, loaded once in a single scan of the dependency tables and kept as columnar arrays,
+		with the attributes needed to derive every variant of the networks (see get_network).
+		One row per distinct (package,depending_on_package), with:
+		 - repo_id,package_id,do_repo_id,do_package_id (-1 for packages without repository)
+		 - in_last: the dependency belongs to the last version of the package
+		 - in_last_ref: the dependency belongs to the last version of the package created before self.timestamp
+		'''
+		if not hasattr(self,'dependency_edges'):
+			ref_time = self.timestamp if self.timestamp is not None else datetime.datetime.now()
+			if self.db.db_type == 'postgres':
+				self.db.cursor.execute('''
+				SELECT COALESCE(p.repo_id,-1),p.id,COALESCE(p_do.repo_id,-1),p_do.id,
+					MAX(CASE WHEN lastv_q.last_v_id IS NULL THEN 0 ELSE 1 END),
+					MAX(CASE WHEN lastv_ref_q.last_v_id IS NULL THEN 0 ELSE 1 END)
+				FROM package_dependencies pd
+				INNER JOIN package_versions pv
+				ON pd.depending_version=pv.id
+				INNER JOIN packages p
+				ON pv.package_id=p.id
+				INNER JOIN packages p_do
+				ON pd.depending_on_package=p_do.id
+				AND p_do.id!=p.id
+				LEFT OUTER JOIN (
+					SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
+					FROM package_versions
+					) AS lastv_q
+				ON lastv_q.last_v_id=pv.id
+				LEFT OUTER JOIN (
+					SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
+					FROM package_versions
+					WHERE created_at <= %(ref_time)s
+					) AS lastv_ref_q
+				ON lastv_ref_q.last_v_id=pv.id
+				GROUP BY p.id,p.repo_id,p_do.id,p_do.repo_id
+				;''',{'ref_time':ref_time})
+			else:
+				self.db.cursor.execute('''
+				SELECT COALESCE(p.repo_id,-1),p.id,COALESCE(p_do.repo_id,-1),p_do.id,
+					MAX(CASE WHEN lastv_q.last_v_id IS NULL THEN 0 ELSE 1 END),
+					MAX(CASE WHEN lastv_ref_q.last_v_id IS NULL THEN 0 ELSE 1 END)
+				FROM package_dependencies pd
+				INNER JOIN package_versions pv
+				ON pd.depending_version=pv.id
+				INNER JOIN packages p
+				ON pv.package_id=p.id
+				INNER JOIN packages p_do
+				ON pd.depending_on_package=p_do.id
+				AND p_do.id!=p.id
+				LEFT OUTER JOIN (
+					SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
+					FROM package_versions
+					) AS lastv_q
+				ON lastv_q.last_v_id=pv.id
+				LEFT OUTER JOIN (
+					SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
+					FROM package_versions
+					WHERE created_at <= :ref_time
+					) AS lastv_ref_q
+				ON lastv_ref_q.last_v_id=pv.id
+				GROUP BY p.id,p.repo_id,p_do.id,p_do.repo_id
+				;''',{'ref_time':ref_time})
+			rows = np.asarray(self.db.cursor.fetchall(),dtype=np.int64).reshape((-1,6))
+			self.dependency_edges = {'repo_id':rows[:,0],
+								'package_id':rows[:,1],
+								'do_repo_id':rows[:,2],
+								'do_package_id':rows[:,3],
+								'in_last':rows[:,4].astype(np.bool_),
+								'in_last_ref':rows[:,5].astype(np.bool_),
+								}
+		return self.dependency_edges
+
+	def get_deps_filters(self):
+		'''
+		Contents of the filtered_deps_* tables, as arrays
+		'''
+		if not hasattr(self,'deps_filters'):
+			self.deps_filters = {}
+			for name,query,nb_cols in (
+					('packages','SELECT package_id FROM filtered_deps_package WHERE package_id IS NOT NULL;',1),
+					('repos','SELECT repo_id FROM filtered_deps_repo WHERE repo_id IS NOT NULL;',1),
+					('package_edges','SELECT package_source_id,package_dest_id FROM filtered_deps_packageedges;',2),
+					('repo_edges','SELECT repo_source_id,repo_dest_id FROM filtered_deps_repoedges;',2),
+					):
+				self.db.cursor.execute(query)
+				self.deps_filters[name] = np.asarray(self.db.cursor.fetchall(),dtype=np.int64).reshape((-1,nb_cols))
+		return self.deps_filters
+
+	def get_network(self,space='p',filtered=False,timestamp=False):
+		'''
+		Edge list (source depends on dest) of a variant of the dependency network, as an array of shape (nb_links,2),
+		derived by masking the dependency edges:
+		 - space: 'p' for packages, 'r' for repositories (links between distinct repositories only)
+		 - timestamp: only dependencies of the last versions (in repository space, last versions created before self.timestamp, as in edge_getters.RepoToRepoDeps)
+		 - filtered: without the packages, repositories and links of the filtered_deps_* tables
+		'''
+		e = self.get_dependency_edges()
+		if space == 'p':
+			src,dst = e['package_id'],e['do_package_id']
+			mask = np.ones(src.shape,dtype=np.bool_)
+			if timestamp:
+				mask &= e['in_last']
+		else:
+			src,dst = e['repo_id'],e['do_repo_id']
+			mask = (src != -1) & (dst != -1) & (src != dst)
+			if timestamp:
+				mask &= e['in_last_ref']
+		if filtered:
+			f = self.get_deps_filters()
+			mask &= ~np.isin(e['package_id'],f['packages'])
+			if f['repos'].size:
+				# as with NOT IN in SQL, a missing destination repository is filtered out as soon as some repositories are
+				mask &= ~np.isin(e['do_repo_id'],f['repos']) & (e['do_repo_id'] != -1)
+			mask &= ~pairs_isin(e['package_id'],e['do_package_id'],f['package_edges'])
+			mask &= ~pairs_isin(e['repo_id'],e['do_repo_id'],f['repo_edges'])
+		return np.unique(np.stack([src[mask],dst[mask]],axis=1),axis=0)
+
 	def set_network(self):
 		if not hasattr(self,'network_p'):
-			# self.db.cursor.execute('''
-			# 	SELECT DISTINCT pd.depending_on_package,pv.package_id
-			# 			FROM package_dependencies pd
-			# 			INNER JOIN package_versions pv
-			# 			ON pv.id=pd.depending_version
-			# 			AND pd.depending_on_package != pv.package_id
-			# 	;''')
-			self.db.cursor.execute('''
-				SELECT DISTINCT p.id AS package_id,p_do.id AS do_package_id
-						FROM package_dependencies pd
-						INNER JOIN package_versions pv
-						ON pd.depending_version =pv.id
-						-- AND pv.created_at <= ref_time
-						INNER JOIN packages p
-						ON pv.package_id=p.id --AND p.repo_id IS NOT NULL
-						INNER JOIN packages p_do
-						ON pd.depending_on_package=p_do.id --AND p_do.repo_id IS NOT NULL
-						AND p_do.id!=p.id
-						--AND p_do.repo_id != p.repo_id
-						--AND (pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package))
-						--AND (p_do.repo_id NOT IN (SELECT repo_id FROM filtered_deps_repo))
-			
-				;''')
-
-			# self.db.cursor.execute('''
-			# 	SELECT DISTINCT
-			# 		do_package_id,package_id
-			# 	FROM
-			# 		(SELECT p.id AS package_id,p_do.id AS do_package_id,pv.id AS version_id
-			# 			FROM package_dependencies pd
-			# 			INNER JOIN package_versions pv
-			# 			ON pd.depending_version =pv.id
-			# 			-- AND pv.created_at <= ref_time
-			# 			INNER JOIN packages p
-			# 			ON pv.package_id=p.id AND p.repo_id IS NOT NULL
-			# 			INNER JOIN packages p_do
-			# 			ON pd.depending_on_package=p_do.id AND p_do.repo_id IS NOT NULL
-			# 			AND p_do.repo_id != p.repo_id
-			# 			--AND (pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package))
-			# 			--AND (p_do.repo_id NOT IN (SELECT repo_id FROM filtered_deps_repo))
-			# 		) AS dep_q
-			# 	INNER JOIN (
-			# 		SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
-			# 		FROM package_versions pv
-			# 		-- WHERE pv.created_at <= :ref_time
-			# 		) AS lastv_q
-			# 	ON dep_q.version_id=lastv_q.last_v_id
-			# 	;''')
-
-			self.network_p = nx.DiGraph()
-			self.network_p.add_edges_from(self.db.cursor.fetchall())
-
+			self.network_p = self.get_network(space='p')
 		if not hasattr(self,'network_r'):
-			self.db.cursor.execute('''
-					SELECT DISTINCT p2.repo_id,p1.repo_id
-						FROM package_dependencies pd
-						INNER JOIN package_versions pv
-						ON pv.id=pd.depending_version
-						INNER JOIN packages p1
-						ON pd.depending_on_package=p1.id
-						INNER JOIN packages p2
-						ON pv.package_id=p2.id
-					AND p1.repo_id!=p2.repo_id
-				;''')
-
-			self.network_r = nx.DiGraph()
-			self.network_r.add_edges_from(self.db.cursor.fetchall())
+			self.network_r = self.get_network(space='r')
 
 	def set_network_filtered(self):
 		if not hasattr(self,'network_p_filtered'):
-			# self.db.cursor.execute('''
-			# 	SELECT DISTINCT pd.depending_on_package,pv.package_id
-			# 			FROM package_dependencies pd
-			# 			INNER JOIN package_versions pv
-			# 			ON pv.id=pd.depending_version
-			# 			AND pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package)
-			# 			AND pd.depending_on_package != pv.package_id
-			# 	;''')
-
-			self.db.cursor.execute('''
-				SELECT DISTINCT p.id AS package_id,p_do.id AS do_package_id
-						FROM package_dependencies pd
-						INNER JOIN package_versions pv
-						ON pd.depending_version =pv.id
-						-- AND pv.created_at <= ref_time
-						INNER JOIN packages p
-						ON pv.package_id=p.id --AND p.repo_id IS NOT NULL
-						INNER JOIN packages p_do
-						ON pd.depending_on_package=p_do.id --AND p_do.repo_id IS NOT NULL
-						AND p_do.id != p.id
-						AND (pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package))
-						AND (p_do.repo_id NOT IN (SELECT repo_id FROM filtered_deps_repo))
-						LEFT OUTER JOIN filtered_deps_packageedges fdpe
-						ON (pv.package_id=fdpe.package_source_id AND p_do.id=fdpe.package_dest_id)
-						LEFT OUTER JOIN filtered_deps_repoedges fdre
-						ON (p.repo_id=fdre.repo_source_id AND p_do.repo_id=fdre.repo_dest_id)
-						WHERE fdpe.package_dest_id IS NULL AND fdre.repo_dest_id IS NULL
-				;''')
-		# self.db.cursor.execute('''
-		# 		SELECT DISTINCT
-		# 			do_package_id,package_id
-		# 		FROM
-		# 			(SELECT p.id AS package_id,p_do.id AS do_package_id,pv.id AS version_id
-		# 				FROM package_dependencies pd
-		# 				INNER JOIN package_versions pv
-		# 				ON pd.depending_version =pv.id
-		# 				-- AND pv.created_at <= ref_time
-		# 				INNER JOIN packages p
-		# 				ON pv.package_id=p.id AND p.repo_id IS NOT NULL
-		# 				INNER JOIN packages p_do
-		# 				ON pd.depending_on_package=p_do.id AND p_do.repo_id IS NOT NULL
-		# 				AND p_do.repo_id != p.repo_id
-		# 				AND (pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package))
-		# 				AND (p_do.repo_id NOT IN (SELECT repo_id FROM filtered_deps_repo))
-		# 				LEFT OUTER JOIN filtered_deps_packageedges fdpe
-		# 				ON (pv.package_id=fdpe.package_source_id AND p_do.id=fdpe.package_dest_id)
-		# 				LEFT OUTER JOIN filtered_deps_repoedges fdre
-		# 				ON (p.repo_id=fdre.repo_source_id AND p_do.repo_id=fdre.repo_dest_id)
-		# 				WHERE fdpe.package_dest_id IS NULL AND fdre.repo_dest_id IS NULL
-		# 			) AS dep_q
-		# 		INNER JOIN (
-		# 			SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
-		# 			FROM package_versions pv
-		# 			-- WHERE pv.created_at <= :ref_time
-		# 			) AS lastv_q
-		# 		ON dep_q.version_id=lastv_q.last_v_id
-		# 		;''')
-
-			self.network_p_filtered = nx.DiGraph()
-			self.network_p_filtered.add_edges_from(self.db.cursor.fetchall())
-
+			self.network_p_filtered = self.get_network(space='p',filtered=True)
 		if not hasattr(self,'network_r_filtered'):
-			self.db.cursor.execute('''
-					SELECT DISTINCT p2.repo_id AS repo_source_id,p_do.repo_id AS repo_dest_id
-						FROM package_dependencies pd
-						INNER JOIN package_versions pv
-						ON pv.id=pd.depending_version
-						INNER JOIN packages p_do
-						ON pd.depending_on_package=p_do.id
-						INNER JOIN packages p2
-						ON pv.package_id=p2.id
-						AND pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package)
-						AND p_do.repo_id NOT IN (SELECT repo_id FROM filtered_deps_repo)
-						LEFT OUTER JOIN filtered_deps_packageedges fdpe
-						ON (pv.package_id=fdpe.package_source_id AND p_do.id=fdpe.package_dest_id)
-						WHERE fdpe.package_dest_id IS NULL
-					AND p_do.repo_id!=p2.repo_id
-					EXCEPT
-						SELECT repo_source_id,repo_dest_id FROM filtered_deps_repoedges
-
-				;''')
+			self.network_r_filtered = self.get_network(space='r',filtered=True)
 
-			self.network_r_filtered = nx.DiGraph()
-			self.network_r_filtered.add_edges_from(self.db.cursor.fetchall())
-
-	def set_network_timestamp(self,timestamp=None):
-		if timestamp is None:
-			timestamp = self.timestamp
+	def set_network_timestamp(self):
 		if not hasattr(self,'network_r_timestamp'):
-			mat = edge_getters.RepoToRepoDeps(db=self.db,ref_time=timestamp,filter_deps=False).get_result(raw_result=True)
-			# self.network_r_timestamp = nx.convert_matrix.from_scipy_sparse_matrix(mat,create_using=nx.DiGraph)
-			self.network_r_timestamp = nx.DiGraph()
-			self.network_r_timestamp.add_edges_from( ((r['repo_id'],r['dep_id']) for r in mat) )
+			self.network_r_timestamp = self.get_network(space='r',timestamp=True)
 		if not hasattr(self,'network_p_timestamp'):
+			self.network_p_timestamp = self.get_network(space='p',timestamp=True)
 
-			self.db.cursor.execute('''
-				SELECT DISTINCT
-					package_id,do_package_id
-				FROM
-					(SELECT p.id AS package_id,p_do.id AS do_package_id,pv.id AS version_id
-						FROM package_dependencies pd
-						INNER JOIN package_versions pv
-						ON pd.depending_version =pv.id
-						-- AND pv.created_at <= ref_time
-						INNER JOIN packages p
-						ON pv.package_id=p.id --AND p.repo_id IS NOT NULL
-						INNER JOIN packages p_do
-						ON pd.depending_on_package=p_do.id --AND p_do.repo_id IS NOT NULL
-						AND p_do.id != p.id
-						--AND (pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package))
-						--AND (p_do.repo_id NOT IN (SELECT repo_id FROM filtered_deps_repo))
-					) AS dep_q
-				INNER JOIN (
-					SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
-					FROM package_versions pv
-					-- WHERE pv.created_at <= :ref_time
-					) AS lastv_q
-				ON dep_q.version_id=lastv_q.last_v_id
-				;''')
-
-			self.network_p_timestamp = nx.DiGraph()
-			self.network_p_timestamp.add_edges_from(self.db.cursor.fetchall())
-
-	def set_network_filtered_timestamp(self,timestamp=None):
-		if timestamp is None:
-			timestamp = self.timestamp
+	def set_network_filtered_timestamp(self):
 		if not hasattr(self,'network_r_filtered_timestamp'):
-			mat = edge_getters.RepoToRepoDeps(db=self.db,ref_time=timestamp,filter_deps=True).get_result(raw_result=True)
-			# self.network_r_filtered_timestamp = nx.convert_matrix.from_scipy_sparse_matrix(mat,create_using=nx.DiGraph)
-			self.network_r_filtered_timestamp = nx.DiGraph()
-			self.network_r_filtered_timestamp.add_edges_from( ((r['repo_id'],r['dep_id']) for r in mat) )
-		
+			self.network_r_filtered_timestamp = self.get_network(space='r',filtered=True,timestamp=True)
 		if not hasattr(self,'network_p_filtered_timestamp'):
-			self.db.cursor.execute('''
-					SELECT DISTINCT
-						package_id,do_package_id
-					FROM
-						(SELECT p.id AS package_id,p_do.id AS do_package_id,pv.id AS version_id
-							FROM package_dependencies pd
-							INNER JOIN package_versions pv
-							ON pd.depending_version =pv.id
-							-- AND pv.created_at <= ref_time
-							INNER JOIN packages p
-							ON pv.package_id=p.id --AND p.repo_id IS NOT NULL
-							INNER JOIN packages p_do
-							ON pd.depending_on_package=p_do.id --AND p_do.repo_id IS NOT NULL
-							AND p_do.id != p.id
-							AND (pv.package_id NOT IN (SELECT package_id FROM filtered_deps_package))
-							AND (p_do.repo_id NOT IN (SELECT repo_id FROM filtered_deps_repo))
-							LEFT OUTER JOIN filtered_deps_packageedges fdpe
-							ON (pv.package_id=fdpe.package_source_id AND p_do.id=fdpe.package_dest_id)
-							LEFT OUTER JOIN filtered_deps_repoedges fdre
-							ON (p.repo_id=fdre.repo_source_id AND p_do.repo_id=fdre.repo_dest_id)
-							WHERE fdpe.package_dest_id IS NULL AND fdre.repo_dest_id IS NULL
-						) AS dep_q
-					INNER JOIN (
-						SELECT DISTINCT FIRST_VALUE(id) OVER (PARTITION BY package_id ORDER BY created_at DESC,version_str DESC) AS last_v_id
-						FROM package_versions pv
-						-- WHERE pv.created_at <= :ref_time
-						) AS lastv_q
-					ON dep_q.version_id=lastv_q.last_v_id
-			 		;''')
-	
-			self.network_p_filtered_timestamp = nx.DiGraph()
-			self.network_p_filtered_timestamp.add_edges_from(self.db.cursor.fetchall())
-
-
+			self.network_p_filtered_timestamp = self.get_network(space='p',filtered=True,timestamp=True)
 
 	def get_cycles(self,network,filtered=True,space='r',detailed=None):
-		G = network
+		'''
+		network: edge list as returned by get_network.
+		Cycle statistics from the strongly connected components and exact counts of short cycles (see graph_analytics.cycle_analytics),
+		polynomial in the size of the network instead of enumerating all cycles.
+		Elements and links involved in cycles are ranked by the number of cycles of length 2 and 3 they belong to.
+		'''
+		nodes,edges = np.unique(network,return_inverse=True)
+		edges = edges.reshape((-1,2))
+		adj = sparse.csr_matrix((np.ones(edges.shape[0],dtype=np.bool_),(edges[:,0],edges[:,1])),shape=(nodes.size,nodes.size))
+		ca = graph_analytics.cycle_analytics(adj)
 
-		scyc = nx.simple_cycles(G)
 		ans = OrderedDict()
+		cyclic_sizes = ca['sizes'][ca['cyclic']]
+		ans['nb_cyclic_components'] = int(cyclic_sizes.size)
+		ans['max_component_size'] = int(cyclic_sizes.max()) if cyclic_sizes.size else 0
+		ans['nb_self_loops'] = ca['nb_self_loops']
+		ans['nb_2cycles'] = ca['nb_2cycles']
+		ans['nb_3cycles'] = ca['nb_3cycles']
+		ans['total_elements_involved'] = int(ca['node_in_cycle'].sum())
+		ans['total_links_involved'] = int(ca['edge_rows'].size)
+		# keys of the previous enumeration of cycles: nb_cycles now counts only the cycles of length up to 3,
+		# and maxlen_cycle is the size of the largest cyclic component, an upper bound of the length of the longest cycle
 		ans['cycle_detection_stopped'] = False
-		ans['nb_cycles'] = 0
-		ans['nb_2cycles'] = 0
-		ans['maxlen_cycle'] = 0
-		elts = dict()
-		links = dict()
-		rk_direct,rk_indirect,rk_names = rank_getters.RepoRankNameGetter(db=self.db).get_result()
-
-		self.db.cursor.execute('SELECT p.id,s.name,p.name FROM packages p INNER JOIN sources s ON s.id=p.source_id;')
-
-		package_names = {int(p_id):'/'.join([s,pname]) for p_id,s,pname in self.db.cursor.fetchall()}
-
-		def get_name(rk):
-			# return rk_names[rk_indirect[int(rk)]]
+		ans['nb_cycles'] = ca['nb_self_loops']+ca['nb_2cycles']+ca['nb_3cycles']
+		ans['maxlen_cycle'] = ans['max_component_size']
+		if detailed:
+			comp_sizes = ca['sizes'][ca['labels']]
+			elts_idx = np.flatnonzero(ca['node_in_cycle'])
+			elts_count = ca['node_2cycles'][elts_idx]+ca['node_3cycles'][elts_idx]
+			elts_idx = elts_idx[np.lexsort((-comp_sizes[elts_idx],-elts_count))][:10]
+			links_count = ca['edge_2cycles']+ca['edge_3cycles']
+			links_order = np.lexsort((-comp_sizes[ca['edge_rows']],-links_count))[:10]
+			links_rows = ca['edge_rows'][links_order]
+			links_cols = ca['edge_cols'][links_order]
 			if space == 'r':
-				# return str(rk_names[int(rk)])
-				return str(rk_names[rk_indirect[int(rk)]])
+				repo_names = self.get_repo_names(ids=nodes[np.unique(np.concatenate([elts_idx,links_rows,links_cols]))].tolist())
+				def get_name(i):
+					return repo_names[int(nodes[i])]
 			else:
-				return str(package_names[int(rk)]) # rk=p_id
-
-		for i,c in enumerate(scyc):
-			if self.limit is not None and i >= self.limit:
-				self.logger.warning('Stopping cycle detection after {} cycles'.format(i))
-				ans['cycle_detection_stopped'] = True
-				break
-			ans['nb_cycles'] += 1 
-			if len(c)==2:
-				ans['nb_2cycles'] += 1 
-
-			ans['maxlen_cycle'] = max([len(c),ans['maxlen_cycle']])
-			for cc in c:
-				if cc in elts.keys():
-					elts[cc] += 1
-				else:
-					elts[cc] = 1
-			previous = c[-1]
-			for cc in c:
-				lk = (previous,cc)
-				if lk in links.keys():
-					links[lk] += 1
-				else:
-					links[lk] = 1
-				previous = cc
-		ans['total_elements_involved'] = len(elts)
-		ans['total_links_involved'] = len(links)
-		if detailed:
-			# ans['elts_involved'] = sorted([{int(e):v} for e,v in elts.items()],key=lambda x: -list(x.values())[0])[:10]
-			ans['elements_involved'] = sorted([{get_name(e):v} for e,v in elts.items()],key=lambda x: -list(x.values())[0])[:10]
-			links_involved = sorted([{(get_name(e[0]),get_name(e[1])):v} for e,v in links.items()],key=lambda x: -list(x.values())[0])[:10]
+				package_names = self.get_package_names()
+				def get_name(i):
+					return str(package_names[int(nodes[i])])
+			ans['elements_involved'] = [{get_name(e):int(ca['node_2cycles'][e]+ca['node_3cycles'][e])} for e in elts_idx]
+			links_involved = [{(get_name(r),get_name(c)):int(v)} for r,c,v in zip(links_rows,links_cols,links_count[links_order])]
 			ans['links_involved'] =  [{str(dk):dv for dk,dv in d.items()} for d in links_involved]
 			if space == 'r':
 				ans['packagespace_links'] = OrderedDict()
@@ -1152,6 +1058,22 @@ class DepsStats(DBStats):
 		return ans
 
 
+	def get_repo_names(self,ids):
+		'''
+		Names (source/owner/name) of a list of repository ids, translated in one lookup on the cached name ranking
+		'''
+		if not hasattr(self,'repo_names_rank'):
+			self.repo_names_rank = rank_getters.RepoRankNameGetter(db=self.db).get_result()
+		rk_direct,rk_indirect,rk_names = self.repo_names_rank
+		names = rk_names[rk_indirect.lookup(ids)]
+		return {int(r_id):str(name) for r_id,name in zip(ids,names)}
+
+	def get_package_names(self):
+		if not hasattr(self,'package_names'):
+			self.db.cursor.execute('SELECT p.id,s.name,p.name FROM packages p INNER JOIN sources s ON s.id=p.source_id;')
+			self.package_names = {int(p_id):'/'.join([s,pname]) for p_id,s,pname in self.db.cursor.fetchall()}
+		return self.package_names
+
 	def get_packagespace_edges(self,source_s,repo_s,source_d,repo_d):
 		'''
 		Translating a dependency repo_source->repo_dest to the list of underlying package deps 
@@ -0,0 +1,166 @@
+'''
+Synthetic databases with the structure of real ones, to measure performance at a chosen scale (see benchmark.py).
+Activity follows power laws: a few repositories get most commits, stars and dependents, a few users most commits.
+'''
+
+import datetime
+
+import numpy as np
+
+from . import check_sqlname_safe
+from . import exports
+
+
+def power_law_weights(n,alpha):
+	'''
+	Probabilities proportional to rank**-alpha, for ranks 1..n
+	'''
+	w = np.arange(1,n+1,dtype=np.float64)**(-alpha)
+	return w/w.sum()
+
+def max_id(db,table):
+	check_sqlname_safe(table)
+	db.cursor.execute('SELECT MAX(id) FROM {};'.format(table))
+	ans = db.cursor.fetchone()[0]
+	return 0 if ans is None else ans
+
+def timestamps(start_date,end_date,offsets):
+	'''
+	Datetimes from fractions of the [start_date,end_date) interval
+	'''
+	span = (end_date-start_date).total_seconds()
+	return [start_date+datetime.timedelta(seconds=int(o*span)) for o in offsets]
+
+def month_starts(start_date,end_date):
+	ans = []
+	d = datetime.date(start_date.year,start_date.month,1)
+	while d < end_date.date():
+		ans.append(d)
+		d = datetime.date(d.year+d.month//12,d.month%12+1,1)
+	return ans
+
+def generate_db(db,nb_repos=1000,nb_users=None,nb_commits=None,nb_packages=None,nb_versions=3,deps_per_version=3.,stars_per_repo=10.,
+					alpha=1.2,acyclic=True,bot_fraction=0.01,
+					start_date=datetime.datetime(2012,1,1),end_date=datetime.datetime(2020,1,1),seed=0,page_size=10**5):
+	'''
+	Fills an initialized DB with synthetic repositories, users (one GitHub identity each), commits (with commit_repos and commit_parents),
+	packages with versions, dependencies and monthly downloads, and stars.
+	Defaults: nb_users = nb_repos, nb_commits = 100*nb_repos, nb_packages = nb_repos (package i belonging to repository i).
+	Repositories and users are drawn with probabilities proportional to rank**-alpha; dependencies also point preferentially to low ranks,
+	and with acyclic=True only to packages of lower rank, so that the dependency graph is a DAG.
+	Rows are added after the existing ones: the DB does not need to be empty. Same seed, same content.
+	Returns a dict with the number of rows inserted per table.
+	'''
+	if nb_users is None:
+		nb_users = nb_repos
+	if nb_commits is None:
+		nb_commits = 100*nb_repos
+	if nb_packages is None:
+		nb_packages = nb_repos
+	nb_packages = min(nb_packages,nb_repos)
+	rng = np.random.default_rng(seed)
+	use_copy = (db.db_type == 'postgres')
+	counts = {}
+
+	def insert(table,columns,rows):
+		rows = list(rows)
+		exports.insert_table_data(table=table,columns=columns,db=db,table_data=rows,page_size=page_size,use_copy=use_copy)
+		counts[table] = counts.get(table,0)+len(rows)
+
+	db.register_source(source='GitHub',source_urlroot='github.com')
+	if db.db_type == 'postgres':
+		db.cursor.execute('''INSERT INTO identity_types(name) VALUES('github_login') ON CONFLICT DO NOTHING;''')
+		db.cursor.execute('''SELECT id FROM sources WHERE name='GitHub';''')
+		source_id = db.cursor.fetchone()[0]
+		db.cursor.execute('''SELECT id FROM identity_types WHERE name='github_login';''')
+		id_type = db.cursor.fetchone()[0]
+	else:
+		db.cursor.execute('''INSERT OR IGNORE INTO identity_types(name) VALUES('github_login');''')
+		db.cursor.execute('''SELECT id FROM sources WHERE name='GitHub';''')
+		source_id = db.cursor.fetchone()[0]
+		db.cursor.execute('''SELECT id FROM identity_types WHERE name='github_login';''')
+		id_type = db.cursor.fetchone()[0]
+
+	repo_ids = np.arange(nb_repos)+max_id(db,'repositories')+1
+	user_ids = np.arange(nb_users)+max_id(db,'users')+1
+	identity_ids = np.arange(nb_users)+max_id(db,'identities')+1
+	commit_ids = np.arange(nb_commits)+max_id(db,'commits')+1
+	package_ids = np.arange(nb_packages)+max_id(db,'packages')+1
+	version_ids = np.arange(nb_packages*nb_versions)+max_id(db,'package_versions')+1
+
+	repo_created = timestamps(start_date,end_date,np.sort(rng.random(nb_repos))*0.5)
+	insert('repositories',['id','source','owner','name','created_at','cloned'],
+		((int(r),source_id,'synth_owner{}'.format(r%(nb_repos//10+1)),'synth_repo{}'.format(r),c,True) for r,c in zip(repo_ids,repo_created)))
+
+	is_bot = (rng.random(nb_users) < bot_fraction).tolist()
+	logins = ['synth_user{}'.format(u) for u in user_ids]
+	insert('users',['id','creation_identity_type_id','creation_identity','is_bot'],
+		((int(u),id_type,l,b) for u,l,b in zip(user_ids,logins,is_bot)))
+	insert('identities',['id','identity_type_id','user_id','identity','is_bot'],
+		((int(i),id_type,int(u),l,b) for i,u,l,b in zip(identity_ids,user_ids,logins,is_bot)))
+
+	db.logger.info('Generating {} synthetic commits'.format(nb_commits))
+	commit_repos = rng.choice(nb_repos,size=nb_commits,p=power_law_weights(nb_repos,alpha))
+	commit_authors = rng.choice(nb_users,size=nb_commits,p=power_law_weights(nb_users,alpha))
+	commit_offsets = rng.random(nb_commits)
+	# ordering by repository and time, parents being the previous commit of the same repository
+	order = np.lexsort((commit_offsets,commit_repos))
+	commit_repos = commit_repos[order]
+	commit_authors = commit_authors[order]
+	commit_offsets = commit_offsets[order]
+	commit_times = timestamps(start_date,end_date,commit_offsets)
+	insertions = rng.geometric(0.02,size=nb_commits).tolist()
+	deletions = rng.geometric(0.05,size=nb_commits).tolist()
+	insert('commits',['id','sha','author_id','committer_id','repo_id','created_at','committed_at','insertions','deletions'],
+		((int(c),'{:040x}'.format(int(c)),int(identity_ids[a]),int(identity_ids[a]),int(repo_ids[r]),t,t,i,d)
+			for c,a,r,t,i,d in zip(commit_ids,commit_authors,commit_repos,commit_times,insertions,deletions)))
+	insert('commit_repos',['commit_id','repo_id','is_orig_repo'],
+		((int(c),int(repo_ids[r]),True) for c,r in zip(commit_ids,commit_repos)))
+	has_parent = np.flatnonzero(commit_repos[1:] == commit_repos[:-1])+1
+	insert('commit_parents',['child_id','parent_id','rank'],
+		((int(commit_ids[k]),int(commit_ids[k-1]),0) for k in has_parent))
+
+	db.logger.info('Generating {} synthetic packages'.format(nb_packages))
+	package_created = repo_created[:nb_packages]
+	insert('packages',['id','source_id','insource_id','name','repo_id','created_at'],
+		((int(p),source_id,'synth_package{}'.format(p),'synth_package{}'.format(p),int(repo_ids[k]),package_created[k]) for k,p in enumerate(package_ids)))
+	version_packages = np.repeat(np.arange(nb_packages),nb_versions)
+	version_ranks = np.tile(np.arange(nb_versions),nb_packages)
+	# versions spread between the creation of the package and end_date
+	package_offsets = np.array([(c-start_date).total_seconds()/(end_date-start_date).total_seconds() for c in package_created])
+	version_offsets = package_offsets[version_packages] + (1.-package_offsets[version_packages])*version_ranks/nb_versions
+	version_times = timestamps(start_date,end_date,version_offsets)
+	insert('package_versions',['id','package_id','version_str','created_at'],
+		((int(v),int(package_ids[p]),'0.{}.0'.format(k),t) for v,p,k,t in zip(version_ids,version_packages,version_ranks,version_times)))
+
+	package_weights = power_law_weights(nb_packages,alpha)
+	nb_deps = rng.poisson(deps_per_version,size=version_ids.size)
+	dep_targets = rng.choice(nb_packages,size=int(nb_deps.sum()),p=package_weights)
+	dep_sources = np.repeat(np.arange(version_ids.size),nb_deps)
+	mask = (dep_targets != version_packages[dep_sources])
+	if acyclic:
+		mask &= (dep_targets < version_packages[dep_sources])
+	deps = set(zip(version_ids[dep_sources[mask]].tolist(),package_ids[dep_targets[mask]].tolist()))
+	insert('package_dependencies',['depending_version','depending_on_package'],sorted(deps))
+
+	months = month_starts(start_date,end_date)
+	base_downloads = (10**6*package_weights*nb_packages/nb_versions).astype(np.int64)+1
+	def download_rows():
+		for v,p,t in zip(version_ids,version_packages,version_times):
+			for m in months:
+				if m >= t.date():
+					yield (int(v),m,int(base_downloads[p]))
+	insert('package_version_downloads',['package_version','downloaded_at','downloads'],download_rows())
+
+	nb_stars = int(stars_per_repo*nb_repos)
+	star_repos = rng.choice(nb_repos,size=nb_stars,p=power_law_weights(nb_repos,alpha))
+	star_users = rng.integers(0,nb_users,size=nb_stars)
+	stars = sorted(set(zip(star_repos.tolist(),star_users.tolist())))
+	star_times = timestamps(start_date,end_date,0.5+0.5*rng.random(len(stars)))
+	insert('stars',['repo_id','identity_type_id','login','identity_id','starred_at'],
+		((int(repo_ids[r]),id_type,logins[u],int(identity_ids[u]),t) for (r,u),t in zip(stars,star_times)))
+
+	db.connection.commit()
+	exports.fix_sequences(db)
+	db.logger.info('Generated synthetic DB: {}'.format(counts))
+	return counts
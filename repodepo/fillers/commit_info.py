@@ -18,6 +18,9 @@ class CommitsFiller(fillers.Filler):
 	"""
 	global commit parser
 	"""
+	resource = 'disk'
+	reads = ('forks',)
+	writes = ('commits','commit_repos','commit_parents','identities','users','repositories')
 
 
 	def __init__(self,
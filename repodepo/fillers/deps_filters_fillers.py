@@ -373,16 +373,17 @@ class FiltersLibFolderFiller(FiltersFolderFiller):
 
 
 class DepsManualChecksFiller(fillers.Filler):
-	def __init__(self,filename='deps_manualchecks.yml',timestamp=None,cycle_limit=100,only_timestamp=True,**kwargs):
+	def __init__(self,filename='deps_manualchecks.yml',timestamp=None,cycle_limit=None,only_timestamp=True,**kwargs):
 		fillers.Filler.__init__(self,**kwargs)
+		if cycle_limit is not None:
+			self.logger.warning('cycle_limit is deprecated and ignored: cycles are no longer enumerated')
 		self.filename = filename
-		self.cycle_limit = cycle_limit
 		self.only_timestamp = only_timestamp
 		self.timestamp = timestamp
 
 	def apply(self):
 		filepath = os.path.join(self.data_folder,self.filename)
-		s_obj = stats.DepsStats(db=self.db,timestamp=self.timestamp,only_filtered=True,limit=self.cycle_limit,detailed=True)
+		s_obj = stats.DepsStats(db=self.db,timestamp=self.timestamp,only_filtered=True,detailed=True)
 		s_obj.get_result()
 		s = s_obj.results 
 		
@@ -393,7 +394,7 @@ class DepsManualChecksFiller(fillers.Filler):
 			net_list = [s+'_timestamp' for s in spaces_list] + spaces_list
 
 		for n in net_list:
-			if s[n+'_filtered']['cycles']['nb_cycles']>0:
+			if s[n+'_filtered']['cycles']['total_elements_involved']>0:
 				s_obj.save(filepath=filepath)
 				raise ValueError(f'''Pending manual checks for dependencies for network {s[n+'_filtered']}, see output file: {filepath}''')
 			else:
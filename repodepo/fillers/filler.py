@@ -1,15 +1,11 @@
 import os
-import requests
 import zipfile
-import pandas as pd
 import logging
 import csv
-from psycopg2 import extras
 import json
 import subprocess
 import gzip
 import shutil
-import pygit2
 import tarfile
 
 logger = logging.getLogger(__name__)
@@ -20,6 +16,10 @@ ch.setFormatter(formatter)
 logger.addHandler(ch)
 logger.setLevel(logging.INFO)
 
+# Bookkeeping and registry tables, that fillers only append to (rows keyed by the filler or its table) or fill with idempotent inserts:
+# not taken into account for conflicts between fillers
+SHARED_TABLES = ('_dbinfo','full_updates','table_updates','merged_repositories','sources','identity_types')
+
 class Filler(object):
 	"""
 	The Filler class and its children provide methods to fill the database, potentially from different sources.
@@ -28,10 +28,24 @@ class Filler(object):
 
 	For writing children, just change the 'apply' method, and do not forget the commit at the end.
 	This class is just an abstract 'mother' class
+
+	reads and writes are the tables used by the filler, to run independent fillers concurrently (see Database.fill_db).
+	None means unknown: the filler then runs alone, after all the fillers queued before it.
+	resource (e.g. 'network' or 'disk') can be used to limit the number of fillers of a kind running at once.
 	"""
 
-	def __init__(self,db=None,name=None,data_folder=None,unique_name=False,max_reexec=0):#,file_info=None):
+	reads = None
+	writes = None
+	resource = None
+
+	def __init__(self,db=None,name=None,data_folder=None,unique_name=False,max_reexec=0,reads=None,writes=None,resource=None):#,file_info=None):
 		self.done = False
+		if reads is not None:
+			self.reads = reads
+		if writes is not None:
+			self.writes = writes
+		if resource is not None:
+			self.resource = resource
 		if name is None:
 			name = self.__class__.__name__
 		self.name = name
@@ -76,6 +90,24 @@ class Filler(object):
 	def check_requirements(self):
 		return True
 
+	def conflicts_with(self,other):
+		'''
+		True if the two fillers cannot run concurrently: one of them writes a table that the other one reads or writes,
+		or one of them does not declare its tables
+		'''
+		if None in (self.reads,self.writes,other.reads,other.writes):
+			return True
+		writes = set(self.writes).difference(SHARED_TABLES)
+		other_writes = set(other.writes).difference(SHARED_TABLES)
+		return len(writes & (set(other.reads) | other_writes)) > 0 or len(other_writes & set(self.reads)) > 0
+
+	def get_api_usage(self):
+		'''
+		Dict with the cumulated api_queries and api_cost spent by the filler, recorded in the metrics around apply.
+		None for fillers not using an API with query costs.
+		'''
+		return None
+
 	def after_insert(self):
 		pass
 
@@ -88,6 +120,7 @@ class Filler(object):
 			if not os.path.exists(os.path.dirname(destination)):
 				os.makedirs(os.path.dirname(destination))
 			if not wget:
+				import requests
 				r = requests.get(url, allow_redirects=True)
 				with open(destination, 'wb') as f:
 					f.write(r.content)
@@ -103,6 +136,7 @@ class Filler(object):
 
 	def convert_xlsx(self,orig_file,destination,clean_xlsx=False):
 		self.logger.info('Converting {} to CSV'.format(orig_file))
+		import pandas as pd
 		data_xls = pd.read_excel(orig_file, index_col=None, engine='openpyxl')
 		data_xls.to_csv(destination,index=False,header=None ,encoding='utf-8')
 		if clean_xlsx:
@@ -161,4 +195,5 @@ class Filler(object):
 			os.makedirs(os.path.dirname(repo_folder))
 		if not os.path.exists(repo_folder):
 			self.logger.info(f'Cloning {repo_url} into {repo_folder}')
+			import pygit2
 			pygit2.clone_repository(url=repo_url,path=repo_folder)
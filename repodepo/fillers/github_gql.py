@@ -15,6 +15,7 @@ from dateutil.relativedelta import relativedelta
 import asyncio
 import time
 import random
+import threading
 
 from .. import fillers
 from ..fillers import generic
@@ -48,6 +49,8 @@ class Requester(object):
 		self.refresh_time = refresh_time
 		self.secondary_limit_wait = secondary_limit_wait
 		self.refreshed_at = None
+		self.usage = {'api_queries':0,'api_cost':0} # shared with clones, see get_api_usage
+		self.usage_lock = threading.Lock()
 		self.url = url
 		self.auth_header_prefix = auth_header_prefix
 		self.transport = AIOHTTPTransport(url=self.url,headers={'Accept-Encoding':'gzip','Authorization':'{}{}'.format(self.auth_header_prefix,self.api_key)})
@@ -72,8 +75,17 @@ class Requester(object):
 		out_obj.refreshed_at = self.refreshed_at
 		out_obj.reset_at = self.reset_at
 		out_obj.remaining = self.remaining
+		out_obj.usage = self.usage
+		out_obj.usage_lock = self.usage_lock
 		return out_obj
 
+	def get_api_usage(self):
+		'''
+		Number of queries and total cost reported by the API since the creation of the requester, including its clones
+		'''
+		with self.usage_lock:
+			return dict(self.usage)
+
 
 	def get_rate_limit(self,refresh=False):
 		if refresh or self.refreshed_at is None or self.refreshed_at + datetime.timedelta(seconds=self.refresh_time)<= datetime.datetime.now():
@@ -169,6 +181,9 @@ Original error message: {}'''.format(retries,e))
 					self.logger.info('Exception catched, {} :{}, result: {}'.format(e.__class__,e,result))
 			else:
 				raise
+		with self.usage_lock:
+			self.usage['api_queries'] += 1
+			self.usage['api_cost'] += result['rateLimit'].get('cost') or 0
 		self.remaining = result['rateLimit']['remaining']
 		self.reset_at = datetime.datetime.strptime(result['rateLimit']['resetAt'], '%Y-%m-%dT%H:%M:%SZ')
 		self.reset_at = time.mktime(self.reset_at.timetuple()) # converting to seconds to epoch; to have same format as REST API
@@ -221,6 +236,7 @@ Original error message: {}'''.format(retries,e))
 class GHGQLFiller(github_rest.GithubFiller):
 	"""
 	class to be inherited from, contains github credentials management
+	Children filling a single kind of items declare the tables they write (see Filler.conflicts_with)
 	"""
 	scopes = ('read:user',)
 
@@ -344,6 +360,16 @@ class GHGQLFiller(github_rest.GithubFiller):
 			requesters = [rq.clone() for rq in requesters]
 		return github_rest.GithubFiller.get_requester(self,random_pick=random_pick,requesters=requesters)
 
+	def get_api_usage(self):
+		'''
+		API queries and cost spent through the requesters of the filler, see metrics.measure
+		'''
+		ans = {'api_queries':0,'api_cost':0}
+		for rq in getattr(self,'requesters',[]):
+			for k,v in rq.get_api_usage().items():
+				ans[k] += v
+		return ans
+
 	def query_string(self,**kwargs):
 		'''
 		In subclasses this has to be implemented
@@ -1065,6 +1091,8 @@ class StarsGQLFiller(GHGQLFiller):
 	'''
 	Querying stars through the GraphQL API
 	'''
+	writes = ('stars',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'stars'
 		self.queried_obj = 'repo'
@@ -1158,6 +1186,8 @@ class WatchersGQLFiller(GHGQLFiller):
 	'''
 	Querying watchers through the GraphQL API
 	'''
+	writes = ('watchers','stars')
+
 	def __init__(self,**kwargs):
 		self.items_name = 'watchers'
 		self.queried_obj = 'repo'
@@ -1246,6 +1276,8 @@ class ForksGQLFiller(GHGQLFiller):
 	'''
 	Querying forks through the GraphQL API
 	'''
+	writes = ('forks',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'forks'
 		self.queried_obj = 'repo'
@@ -1353,6 +1385,8 @@ class SponsorsUserFiller(GHGQLFiller):
 	'''
 	Querying sponsors of users through the GraphQL API
 	'''
+	writes = ('sponsors_user','sponsors_listings')
+
 	def __init__(self,**kwargs):
 		self.items_name = 'sponsors_user'
 		self.queried_obj = 'user'
@@ -1495,6 +1529,8 @@ class FollowersGQLFiller(GHGQLFiller):
 	'''
 	Querying followers through the GraphQL API
 	'''
+	writes = ('followers',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'followers'
 		self.queried_obj = 'user'
@@ -1586,6 +1622,8 @@ class BackwardsSponsorsUserFiller(SponsorsUserFiller):
 	Querying sponsored users by users in the DB through the GraphQL API
 	!!! This fills in the users and identities table, not the sponsors_user table. The SponsorsUserFiller has to be called afterwards
 	'''
+	writes = ('users','identities')
+
 	def __init__(self,**kwargs):
 		self.items_name = 'sponsors_user_backwards'
 		self.queried_obj = 'user'
@@ -1716,6 +1754,8 @@ class ReleasesGQLFiller(GHGQLFiller):
 	'''
 	Querying releases through the GraphQL API
 	'''
+	writes = ('releases',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'releases'
 		self.queried_obj = 'repo'
@@ -2607,6 +2647,8 @@ class IssuesGQLFiller(GHGQLFiller):
 	'''
 	Querying issues through the GraphQL API
 	'''
+	writes = ('issues',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'issues'
 		self.queried_obj = 'repo'
@@ -2724,6 +2766,8 @@ class PullRequestsGQLFiller(GHGQLFiller):
 	'''
 	Querying issues through the GraphQL API
 	'''
+	writes = ('pullrequests',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'pullrequests'
 		self.queried_obj = 'repo'
@@ -2853,6 +2897,9 @@ class CompleteIssuesGQLFiller(IssuesGQLFiller):
 	Querying issues through the GraphQL API
 	Adding comments, labels and reactions (first 100 per issue), and first 40 reactions to comments.
 	'''
+	# also writes comments, labels and reactions, and queues sub-fillers
+	writes = None
+
 
 	def __init__(self,init_page_size=6,secondary_page_size=6,complete_info=True,**kwargs):
 		IssuesGQLFiller.__init__(self,init_page_size=init_page_size,secondary_page_size=secondary_page_size,other_update_names=['issues'],**kwargs)
@@ -3832,6 +3879,9 @@ class CompletePullRequestsGQLFiller(PullRequestsGQLFiller):
 	Querying issues through the GraphQL API
 	Adding comments, labels and reactions (first 100 per issue), and first 40 reactions to comments.
 	'''
+	# also writes comments, labels and reactions, and queues sub-fillers
+	writes = None
+
 
 	def __init__(self,init_page_size=6,secondary_page_size=6,complete_info=True,**kwargs):
 		PullRequestsGQLFiller.__init__(self,init_page_size=init_page_size,secondary_page_size=secondary_page_size,other_update_names=['pullrequests'],**kwargs)
@@ -5116,6 +5166,8 @@ class RepoLanguagesGQLFiller(GHGQLFiller):
 	'''
 	Querying repository languages through the GraphQL API
 	'''
+	writes = ('repo_languages',)
+
 	def __init__(self,reset_shares=False,**kwargs):
 		self.items_name = 'repo_languages'
 		self.queried_obj = 'repo'
@@ -5246,6 +5298,8 @@ class RepoCreatedAtGQLFiller(GHGQLFiller):
 	'''
 	Querying creation dates through the GraphQL API
 	'''
+	writes = ('repositories',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'repo_createdat'
 		self.queried_obj = 'repo'
@@ -5316,6 +5370,8 @@ class UserCreatedAtGQLFiller(GHGQLFiller):
 	'''
 	Querying creation dates through the GraphQL API
 	'''
+	writes = ('identities',)
+
 	def __init__(self,**kwargs):
 		self.items_name = 'user_createdat'
 		self.queried_obj = 'user'
@@ -5386,6 +5442,8 @@ class UserOrgsGQLFiller(GHGQLFiller):
 	'''
 	Querying organizations through the GraphQL API
 	'''
+	writes = ('organizations','org_memberships')
+
 
 	scopes = ('read:user','read:org',)
 
@@ -5484,6 +5542,8 @@ class SingleQueryUserLanguagesGQLFiller(GHGQLFiller):
 	'''
 	Querying languages of repositories of users through the GraphQL API
 	'''
+	writes = ('user_languages',)
+
 	def __init__(self,reset_shares=False,**kwargs):
 		self.items_name = 'user_languages'
 		self.queried_obj = 'user'
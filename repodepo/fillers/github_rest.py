@@ -29,6 +29,9 @@ class GithubFiller(fillers.Filler):
 	"""
 	class to be inherited from, contains github credentials management
 	"""
+	resource = 'network'
+	reads = ('repositories','identities','users')
+
 	def __init__(self,querymin_threshold=50,per_page=100,env_apikey='GITHUB_API_KEY',workers=1,identity_type='github_login',no_unauth=False,api_keys_file='github_api_keys.txt',api_keys=None,fail_on_wait=False,start_offset=None,retry=False,force=False,incremental_update=True,**kwargs):
 		fillers.Filler.__init__(self,**kwargs)
 		self.querymin_threshold = querymin_threshold
@@ -182,6 +185,8 @@ class StarsFiller(GithubFiller):
 	"""
 	Fills in star information
 	"""
+	writes = ('stars',)
+
 	def __init__(self,repo_list=None,**kwargs):
 		self.repo_list = repo_list
 		GithubFiller.__init__(self,**kwargs)
@@ -648,6 +653,8 @@ class ForksFiller(GithubFiller):
 	"""
 	Fills in forks info for github repositories
 	"""
+	writes = ('forks',)
+
 	def __init__(self,repo_list=None,**kwargs):
 		self.repo_list = repo_list
 		GithubFiller.__init__(self,**kwargs)
@@ -865,6 +872,7 @@ class FollowersFiller(GithubFiller):
 	"""
 	Fills in follower information
 	"""
+	writes = ('followers',)
 
 	def __init__(self,login_list=None,**kwargs):
 		self.login_list = login_list
@@ -1,8 +1,10 @@
 from . import Getter
 from . import edge_getters
 from . import rank_getters
+from . import graph_analytics
 
 from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
 import datetime
 import copy
 import scipy
@@ -11,10 +13,34 @@ import pandas as pd
 
 scenario_space_list = ('repos','devs','orgs')
 
+def repeat_csr(mat,factor,block_diag=False):
+	'''
+	factor copies of mat stacked vertically (or on the diagonal), built directly from the csr arrays:
+	same result as sparse.vstack or sparse.block_diag, without intermediate matrices.
+	'''
+	mat = sparse.csr_matrix(mat)
+	n_rows,n_cols = mat.shape
+	nnz = mat.indptr[-1]
+	data = np.tile(mat.data[:nnz],factor)
+	indices = np.tile(mat.indices[:nnz].astype(np.int64),factor)
+	if block_diag:
+		indices += np.repeat(np.arange(factor,dtype=np.int64)*n_cols,nnz)
+		shape = (n_rows*factor,n_cols*factor)
+	else:
+		shape = (n_rows*factor,n_cols)
+	indptr = np.concatenate([(mat.indptr[:-1].astype(np.int64)[np.newaxis,:] + nnz*np.arange(factor,dtype=np.int64)[:,np.newaxis]).flatten(),[nnz*factor]])
+	return sparse.csr_matrix((data,indices,indptr),shape=shape)
+
+
 class SRGetter(Getter):
 	'''
 	output of get_result: sparse matrix dev to repo, with impact value
 	dev_mode by default (cascades in developer space; if set to False in repo_space)
+
+	The cascade is solved directly when possible (see solve_direct, direct_solve=False to disable it),
+	otherwise by fixed point iteration updating only the repositories affected by the previous step,
+	until no status changes by more than tol (see solve_iterative).
+	After a change restricted to a few repositories, get_delta only recomputes their dependents, starting from the unperturbed cascade.
 	'''
 	def __init__(self,start_time=datetime.datetime(2010,1,1),
 				end_time=datetime.datetime.now(),
@@ -22,6 +48,8 @@ class SRGetter(Getter):
 				norm_dl=False,
 				dl_correction=False,
 				iter_max=10**4,
+				tol=10**-12,
+				direct_solve=True,
 				stationary_devcontrib=True,
 				dev_cd_power=0.5,
 				deps_cd_power=0.5,
@@ -35,6 +63,8 @@ class SRGetter(Getter):
 		self.dev_cd_power = dev_cd_power
 		self.deps_cd_power = deps_cd_power
 		self.iter_max = iter_max
+		self.tol = tol
+		self.direct_solve = direct_solve
 		self.norm_dl = norm_dl
 		# self.dev_mode = dev_mode
 		if scenario_space in scenario_space_list:
@@ -50,6 +80,27 @@ class SRGetter(Getter):
 		self.devs_getter = edge_getters.DevToRepo(db=self.db,start_time=self.start_time,end_time=self.end_time)
 		self.vaccinated_repo_ranks = None
 		self.vaccinate_matrix = None
+		# batches of scenarios (see batch_copy)
+		self.scenario_blocks = 1
+		self.vaccinated_blocks = None
+
+	# matrices and vectors placed in shared memory when computing in several processes, see detached_copy
+	shared_attributes = ('devs_mat','deps_mat','dl_vec','repo_commits','init_vaccmat','dev_contrib','baseline_status')
+
+	def detached_copy(self):
+		'''
+		Shallow copy without database connection nor the attributes listed in shared_attributes, cheap to send to worker processes
+		'''
+		ans = copy.copy(self)
+		ans.db = None
+		for getter_attr in ('dl_getter','deps_getter','devs_getter'):
+			getter = copy.copy(getattr(self,getter_attr))
+			getter.db = None
+			setattr(ans,getter_attr,getter)
+		for attr in self.shared_attributes:
+			if attr in ans.__dict__:
+				delattr(ans,attr)
+		return ans
 
 	def get_all(self):
 		self.get_repo_ranks()
@@ -67,8 +118,8 @@ class SRGetter(Getter):
 	def get_init_vaccmat(self):
 		if not hasattr(self,'init_vaccmat'):
 			repo_ranks = self.get_repo_ranks()
-			self.init_vaccmat = sparse.eye(len(repo_ranks)).tolil()
-		return self.init_vaccmat.tolil()
+			self.init_vaccmat = sparse.eye(len(repo_ranks),format='csr')
+		return self.init_vaccmat
 
 	def set_vaccinated_repos(self,vaccinated_repos=None,vaccinated_repo_ranks=None):
 		if vaccinated_repo_ranks is not None:
@@ -80,10 +131,9 @@ class SRGetter(Getter):
 		else:
 			raise SyntaxError('Either vaccinated_repos or vaccinated_repo_ranks should be provided')
 		
-		vaccinate_matrix = self.get_init_vaccmat().copy()
-		for v_nb in self.vaccinated_repo_ranks:
-			vaccinate_matrix[v_nb,v_nb] = 0
-		self.vaccinate_matrix = vaccinate_matrix.todia()
+		vaccinate_diag = self.get_init_vaccmat().diagonal()
+		vaccinate_diag[np.asarray(self.vaccinated_repo_ranks,dtype=np.int64)] = 0
+		self.vaccinate_matrix = sparse.diags(vaccinate_diag,format='dia')
 
 	def get_devs_mat(self,**kwargs):
 		if not hasattr(self,'devs_mat'):
@@ -104,63 +154,261 @@ class SRGetter(Getter):
 				dl_direct,dl_indirect,dl_values = self.dl_getter.get_result(deps_mat=self.get_deps_mat(),orig_id_rank=True)
 				self.dl_vec = dl_values
 
-	def vaccinate(self,repo_status):
+	def get_deps_mat_t(self):
+		if not hasattr(self,'deps_mat_t'):
+			self.deps_mat_t = self.deps_mat.transpose().tocsr()
+		return self.deps_mat_t
+
+	def get_deps_structure(self):
+		if not hasattr(self,'deps_structure'):
+			self.deps_structure = graph_analytics.topological_structure(self.deps_mat)
+		return self.deps_structure
+
+	def vaccinate(self,repo_status,rows=None):
 		if self.vaccinate_matrix is not None:
-			repo_status = self.vaccinate_matrix * repo_status
+			if rows is None:
+				repo_status = self.vaccinate_matrix * repo_status
+			else:
+				repo_status = sparse.diags(self.vaccinate_matrix.diagonal()[rows]) * repo_status
+		if self.vaccinated_blocks is not None:
+			# zeroing vaccinated repos only in the column block of their scenario
+			repo_status = sparse.coo_matrix(repo_status)
+			if rows is None:
+				rows = np.arange(repo_status.shape[0])
+			block_width = repo_status.shape[1]//self.scenario_blocks
+			keys = rows[repo_status.row]*self.scenario_blocks + repo_status.col//block_width
+			keep = ~np.isin(keys,self.vaccinated_blocks)
+			repo_status = sparse.csr_matrix((repo_status.data[keep],(repo_status.row[keep],repo_status.col[keep])),shape=repo_status.shape)
 		return repo_status
 
-	def get(self,db,**kwargs):
+	def prepare(self):
 		self.get_devs_mat()
 		self.get_deps_mat()
+		if self.deps_mat.format != 'csr':
+			self.deps_mat = self.deps_mat.tocsr()
 
 		self.get_dl_vec()
 
 		self.set_init_conditions()
 
-		dev_status = self.init_dev_status
-		repo_status = self.init_repo_status#.copy()
+	def get(self,db,**kwargs):
+		self.prepare()
 
-		repo_status_cond = self.init_repo_status#.copy()
-		dev_status_cond = self.init_dev_status#.copy()
+		repo_status = None
+		if self.direct_solve:
+			repo_status = self.solve_direct()
+		if repo_status is None:
+			repo_status = self.solve_iterative()
 
-		count = 0
-		while repo_status_cond.nnz or (count == 0):
-		# while repo_status_cond.nnz or dev_status_cond.nnz:
-		# while count<5:
-			repo_status = self.propagate(dev_status=dev_status,
-								repo_status=repo_status,
-								) + self.init_repo_status
-			repo_status_cond = self.propagate(dev_status=dev_status_cond,
-									repo_status = repo_status_cond,force_dev_mat=True,info='cond')
-
-			repo_status = self.vaccinate(repo_status)
-			repo_status_cond = self.vaccinate(repo_status_cond)
-
-			dev_status_cond = sparse.csc_matrix(dev_status_cond.shape)
-			count += 1
-			self.logger.debug('iteration {}'.format(count))
-			if count >= self.iter_max:
-				self.logger.info('Reached {} iterations, returning with current state'.format(self.iter_max))
-				break
+		self.result = self.weight_result(repo_status)
+		return self.result
 
-		self.logger.info('Ended after {} iterations'.format(count))
+	def get_baseline_status(self):
+		'''
+		Unweighted repo_status of the cascade without vaccination, starting point of get_delta
+		'''
+		if not hasattr(self,'baseline_status'):
+			vaccinate_matrix = self.vaccinate_matrix
+			self.vaccinate_matrix = None
+			self.prepare()
+			repo_status = None
+			if self.direct_solve:
+				repo_status = self.solve_direct()
+			if repo_status is None:
+				repo_status = self.solve_iterative()
+			self.baseline_status = repo_status
+			self.vaccinate_matrix = vaccinate_matrix
+		return self.baseline_status
+
+	def get_delta(self,rows):
+		'''
+		Same result as get(), when the current state of the getter (vaccination, or devs_mat) only differs
+		from the one of get_baseline_status for the given rows (repo ranks).
+		Only these rows and their direct and indirect dependents are reset and recomputed, other statuses are unchanged.
+		'''
+		baseline_status = self.get_baseline_status()
+		self.prepare()
+		affected = graph_analytics.dependents(adj_t=self.get_deps_mat_t(),nodes=rows)
+		repo_status = self.replace_rows(repo_status=baseline_status,rows=affected,new_status=sparse.csr_matrix(self.vaccinate(self.init_repo_status[affected],rows=affected)))
+		self.logger.info('Recomputing {} affected repositories out of {}'.format(affected.size,repo_status.shape[0]))
+		ans = None
+		if self.direct_solve:
+			ans = self.solve_direct(repo_status=repo_status,rows=affected)
+		if ans is None:
+			ans = self.solve_iterative(repo_status=repo_status,rows=affected)
+		self.result = self.weight_result(ans)
+		return self.result
+
+	def weight_result(self,repo_status):
 		if self.dl_weights:
 			ans = (repo_status.transpose().multiply(self.dl_vec)).transpose()
 			if self.norm_dl:
 				ans = ans/self.dl_vec.sum()
 		else:
 			ans = repo_status
+		return ans
 
-		self.result = ans
+	def get_batch(self,vaccinated_repo_ranks_list,compact_ratio=0.25):
+		'''
+		Results of several vaccination scenarios (each a list of repo ranks), as get() would return them after set_vaccinated_repos.
+		The statuses of all scenarios are column blocks of a single state matrix, propagated through the shared deps_mat/devs_mat.
+		When iterating, scenarios that converged are removed from the state once they represent compact_ratio of the active ones.
+		'''
+		self.prepare()
+		scenarios = [list(v) for v in vaccinated_repo_ranks_list]
+		width = self.init_repo_status.shape[1]
+		if not len(scenarios):
+			return []
+		# cached before copying, so that all the batch copies share them
+		self.get_deps_mat_t()
+		if self.direct_solve:
+			self.get_deps_structure()
+		batch = self.batch_copy(scenarios)
+		repo_status = None
+		if self.direct_solve:
+			repo_status = batch.solve_direct()
+		if repo_status is not None:
+			return [self.weight_result(repo_status[:,k*width:(k+1)*width]) for k in range(len(scenarios))]
+
+		results = [None]*len(scenarios)
+		active = np.arange(len(scenarios)) # scenarios in the state, in block order
+		finished = np.zeros(len(scenarios),dtype=np.bool_)
+		deps_mat_t = self.get_deps_mat_t()
+		repo_status = batch.init_repo_status
+		rows = np.arange(repo_status.shape[0])
+		count = 0
+		while active.size:
+			repo_status,changed = batch.update_rows(repo_status=repo_status,rows=rows)
+			count += 1
+			# a scenario without any change will not change anymore
+			finished[~changed.any(axis=0)] = True
+			if count >= self.iter_max:
+				self.logger.info('Reached {} iterations, returning with current state'.format(self.iter_max))
+				finished[:] = True
+			if finished.sum() >= max(1,compact_ratio*active.size):
+				for b in np.flatnonzero(finished):
+					results[active[b]] = self.weight_result(repo_status[:,b*width:(b+1)*width])
+				remaining = np.flatnonzero(~finished)
+				if not remaining.size:
+					break
+				repo_status = repo_status[:,(remaining[:,np.newaxis]*width + np.arange(width)).flatten()]
+				changed = changed[:,remaining]
+				active = active[remaining]
+				finished = finished[remaining]
+				batch = self.batch_copy([scenarios[a] for a in active])
+			rows = np.unique(deps_mat_t[rows[changed.any(axis=1)]].indices)
+			self.logger.debug('iteration {}, {} scenarios and {} repositories updated'.format(count,active.size,rows.size))
+
+		self.logger.info('Ended after {} iterations for a batch of {} scenarios'.format(count,len(scenarios)))
+		return results
+
+	def batch_copy(self,vaccinated_repo_ranks_list):
+		'''
+		Shallow copy propagating the given vaccination scenarios at once, as consecutive column blocks of its statuses.
+		Vaccinations already set on the getter are ignored, as set_vaccinated_repos would replace them.
+		'''
+		nb = len(vaccinated_repo_ranks_list)
+		ans = copy.copy(self)
+		ans.scenario_blocks = nb
+		ans.init_repo_status = sparse.hstack([self.init_repo_status]*nb,format='csr')
+		ans.init_dev_status = sparse.hstack([self.init_dev_status]*nb,format='csr')
+		if self.stationary_devcontrib:
+			ans.dev_contrib = sparse.hstack([self.get_dev_contrib(dev_status=self.init_dev_status)]*nb,format='csr')
+		ans.vaccinate_matrix = None
+		ans.vaccinated_blocks = np.unique(np.asarray([v_rk*nb + k for k,v_rks in enumerate(vaccinated_repo_ranks_list) for v_rk in v_rks],dtype=np.int64))
 		return ans
 
-	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None):
+	def solve_direct(self,repo_status=None,rows=None):
 		'''
-		returns repo_status_new. Cobb Douglas with given exponents.
+		Exact solution in a single sweep when the dependency graph is acyclic: repositories are updated level by level,
+		dependencies before their dependents, so that each level only uses final statuses.
+		Returns None when the graph has cycles, falling back to solve_iterative.
+		With rows, only these repositories are computed, starting from repo_status, and only their components have to be acyclic.
+		'''
+		structure = self.get_deps_structure()
+		if repo_status is None:
+			repo_status = self.init_repo_status
+		if rows is None:
+			rows = np.arange(repo_status.shape[0])
+		labels = structure['labels'][rows]
+		if structure['cyclic'][labels].any():
+			return None
+		levels = np.searchsorted(structure['level_bounds'],labels,side='right') - 1
+		order = np.argsort(-levels,kind='stable')
+		rows = rows[order]
+		cuts = np.flatnonzero(np.diff(levels[order])) + 1
+		for level_rows in np.split(rows,cuts):
+			if level_rows.size:
+				repo_status,changed = self.update_rows(repo_status=repo_status,rows=level_rows)
+		self.logger.info('Solved directly in {} levels'.format(cuts.size+1))
+		return repo_status
+
+	def solve_iterative(self,repo_status=None,rows=None):
+		'''
+		Fixed point iteration of the cascade. After the first step, only the repositories depending on a repository
+		whose status changed by more than tol in the previous step are recomputed.
+		With rows, starting from repo_status and only updating these repositories in the first step.
+		'''
+		deps_mat_t = self.get_deps_mat_t()
+		if repo_status is None:
+			repo_status = self.init_repo_status
+		if rows is None:
+			rows = np.arange(repo_status.shape[0])
+		count = 0
+		while rows.size:
+			repo_status,changed = self.update_rows(repo_status=repo_status,rows=rows)
+			count += 1
+			self.logger.debug('iteration {}, {} repositories updated'.format(count,rows.size))
+			if count >= self.iter_max:
+				self.logger.info('Reached {} iterations, returning with current state'.format(self.iter_max))
+				break
+			rows = np.unique(deps_mat_t[rows[changed.any(axis=1)]].indices)
+
+		self.logger.info('Ended after {} iterations'.format(count))
+		return repo_status
+
+	def update_rows(self,repo_status,rows):
+		'''
+		One propagation step restricted to the given rows (repositories).
+		Returns the new repo_status and a boolean array (rows,scenario_blocks): where the status changed by more than tol.
+		'''
+		new_status = self.propagate(dev_status=self.init_dev_status,repo_status=repo_status,rows=rows) + self.init_repo_status[rows]
+		new_status = sparse.csr_matrix(self.vaccinate(new_status,rows=rows))
+		diff = sparse.coo_matrix(new_status - repo_status[rows])
+		diff_mask = (np.abs(diff.data) > self.tol)
+		changed = np.zeros((rows.size,self.scenario_blocks),dtype=np.bool_)
+		changed[diff.row[diff_mask],diff.col[diff_mask]//(repo_status.shape[1]//self.scenario_blocks)] = True
+		return self.replace_rows(repo_status=repo_status,rows=rows,new_status=new_status),changed
+
+	def replace_rows(self,repo_status,rows,new_status):
+		'''
+		repo_status with the given rows replaced by the rows of new_status
+		'''
+		if rows.size == repo_status.shape[0] and (np.diff(rows) > 0).all():
+			return new_status
+		keep = np.ones(repo_status.shape[0])
+		keep[rows] = 0.
+		select = sparse.csr_matrix((np.ones(rows.size),(rows,np.arange(rows.size))),shape=(repo_status.shape[0],rows.size))
+		repo_status = (sparse.diags(keep) * repo_status + select * new_status).tocsr()
+		repo_status.eliminate_zeros()
+		return repo_status
+
+	def get_contribs(self,dev_status,repo_status,force_dev_mat=False,rows=None):
+		'''
+		Contributions of developers and of dependencies to the status of each repository, or only of the given rows
 		'''
 		# dev_contrib = self.devs_mat * dev_status
 		dev_contrib = self.get_dev_contrib(dev_status=dev_status,force=force_dev_mat)
-		deps_contrib = self.deps_mat * repo_status
+		if rows is None:
+			return dev_contrib,self.deps_mat * repo_status
+		else:
+			return dev_contrib[rows],self.deps_mat[rows] * repo_status
+
+	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None,rows=None):
+		'''
+		returns repo_status_new. Cobb Douglas with given exponents.
+		'''
+		dev_contrib,deps_contrib = self.get_contribs(dev_status=dev_status,repo_status=repo_status,force_dev_mat=force_dev_mat,rows=rows)
 		# repo_status_new = dev_contrib + deps_contrib - dev_contrib.multiply(deps_contrib) # = 1- (1-dev_c)(1-deps_c); Cobb Douglas with both exponents equal to 1 but adapted to sparse mat
 
 		# change values of 1 to NaN
@@ -186,27 +434,30 @@ class SRGetter(Getter):
 		# multiply point wise
 		repo_status_new = dev_contrib + deps_contrib - dev_contrib.multiply(deps_contrib)
 
-		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info)
+		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info,rows=rows)
 
 		# repo_status_new.data = 1.-repo_status_new.data
 		# repo_status_new.data[np.isnan(repo_status_new.data)] = 1.
 		return repo_status_new
 
-	def postprocess_repostatus(self,repo_status,info=None):
+	def postprocess_repostatus(self,repo_status,info=None,rows=None):
 		if self.scenario_space != 'repos' or info == 'cond':
 			return repo_status
 		else:
-			repo_status += self.init_repo_status
+			if rows is None:
+				repo_status += self.init_repo_status
+			else:
+				repo_status += self.init_repo_status[rows]
 			repo_status.data[repo_status.data>1] = 1.
 			return repo_status
 
 	def get_dev_contrib(self,dev_status,force=False):
 		if not force and self.stationary_devcontrib:
 			if not hasattr(self,'dev_contrib'):
-				self.dev_contrib = self.devs_mat * dev_status
+				self.dev_contrib = sparse.csr_matrix(self.devs_mat * dev_status)
 			return self.dev_contrib
 		else:
-			return self.devs_mat * dev_status
+			return sparse.csr_matrix(self.devs_mat * dev_status)
 
 	def set_init_conditions(self):
 		u_max = self.devs_mat.shape[1]
@@ -214,14 +465,14 @@ class SRGetter(Getter):
 		
 		
 		if self.scenario_space == 'devs':
-			self.init_repo_status = sparse.csc_matrix((r_max,u_max))
-			self.init_dev_status = sparse.eye(u_max)
+			self.init_repo_status = sparse.csr_matrix((r_max,u_max))
+			self.init_dev_status = sparse.eye(u_max,format='csr')
 		elif self.scenario_space == 'orgs':
-			self.init_repo_status = sparse.csc_matrix((r_max,u_max))
-			self.init_dev_status = sparse.eye(u_max)
+			self.init_repo_status = sparse.csr_matrix((r_max,u_max))
+			self.init_dev_status = sparse.eye(u_max,format='csr')
 		elif self.scenario_space == 'repos':
-			self.init_repo_status = sparse.eye(r_max)
-			self.init_dev_status = sparse.csc_matrix((u_max,r_max))
+			self.init_repo_status = sparse.eye(r_max,format='csr')
+			self.init_dev_status = sparse.csr_matrix((u_max,r_max))
 		
 		r_max = self.devs_mat.shape[0]
 
@@ -238,81 +489,97 @@ class SRGetter(Getter):
 		self.set_init_conditions()
 		self.get_init_vaccmat()
 
-		# new_repo_ranks = self.repo_ranks
-		# for i in range(factor-1):
-		# 	new_repo_ranks.update({r_id+i*factor:r_rk+i*factor for r_id,r_rk in self.repo_ranks.items()})
+		n_repos = self.deps_mat.shape[0]
+		nnz = self.deps_mat.nnz + self.devs_mat.nnz + self.init_repo_status.nnz
+		self.logger.info('Parallelizing repo space by a factor {}: {} repositories, about {:.1f} MB of matrices'.format(factor,n_repos*factor,factor*(nnz*16+3*8*n_repos)/2**20))
 
-		new_dl_vec = self.dl_vec
-		for i in range(factor-1):
-			new_dl_vec = np.concatenate([new_dl_vec,self.dl_vec])
-
-		new_devs_mat = self.devs_mat
-		for i in range(factor-1):
-			new_devs_mat = scipy.sparse.vstack([new_devs_mat,self.devs_mat])
-		
-		new_deps_mat = self.deps_mat
-		for i in range(factor-1):
-			new_deps_mat = scipy.sparse.bmat([[self.deps_mat,None],[None,new_deps_mat]])
-			
-		# new_init_dev_status = self.init_dev_status
-		# for i in range(factor-1):
-		# 	new_init_dev_status = 
-
-		new_init_repo_status = self.init_repo_status
-		for i in range(factor-1):
-			new_init_repo_status = scipy.sparse.vstack([new_init_repo_status,self.init_repo_status])
-
-		new_init_vaccmat = self.init_vaccmat
-		new_init_vaccmat = sparse.eye(self.init_vaccmat.shape[0]*factor).tolil()
+		new_devs_mat = repeat_csr(self.devs_mat,factor)
+		new_deps_mat = repeat_csr(self.deps_mat,factor,block_diag=True)
+		new_init_repo_status = repeat_csr(self.init_repo_status,factor)
+		new_init_vaccmat = sparse.eye(n_repos*factor,format='csr')
 
 		# self.repo_ranks = new_repo_ranks
 		self.devs_mat = new_devs_mat
 		self.deps_mat = new_deps_mat
-		self.dl_vec = new_dl_vec
+		if hasattr(self,'dl_vec'):
+			self.dl_vec = np.tile(self.dl_vec,factor)
 		self.init_repo_status = new_init_repo_status
 		# self.init_dev_status = new_init_dev_status
 		self.init_vaccmat = new_init_vaccmat
 
 		if hasattr(self,'dev_contrib'):
 			del self.dev_contrib
+		for attr in ('deps_structure','deps_mat_t','baseline_status'):
+			if hasattr(self,attr):
+				delattr(self,attr)
 
 class SRLeontief(SRGetter):
-	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None):
+	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None,rows=None):
 		'''
 		returns repo_status_new
 		'''
 
-		# dev_contrib = self.devs_mat * dev_status
-		dev_contrib = self.get_dev_contrib(dev_status=dev_status,force=force_dev_mat)
-		deps_contrib = self.deps_mat * repo_status
+		dev_contrib,deps_contrib = self.get_contribs(dev_status=dev_status,repo_status=repo_status,force_dev_mat=force_dev_mat,rows=rows)
 		repo_status_new = (abs(dev_contrib - deps_contrib) + dev_contrib + deps_contrib)/2
-		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info)
+		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info,rows=rows)
 		return repo_status_new
 
 class SRLinear(SRGetter):
-	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None):
+	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None,rows=None):
 		'''
 		returns repo_status_new
 		'''
 
-		# dev_contrib = self.devs_mat * dev_status
-		dev_contrib = self.get_dev_contrib(dev_status=dev_status,force=force_dev_mat)
-		deps_contrib = self.deps_mat * repo_status
+		dev_contrib,deps_contrib = self.get_contribs(dev_status=dev_status,repo_status=repo_status,force_dev_mat=force_dev_mat,rows=rows)
 		repo_status_new = (dev_contrib + deps_contrib)/2.
-		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info)
+		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info,rows=rows)
 		return repo_status_new
 
+	def solve_direct(self,repo_status=None,rows=None):
+		'''
+		Outside of the repos scenario space (where statuses are capped at 1), the fixed point x = V((D d + M x)/2 + init)
+		is linear: (I - V M/2) x = V (D d/2 + init), solved with a sparse LU factorization whether or not the graph has cycles.
+		With rows (A), statuses of the other repositories (B) are taken from repo_status:
+		(I - V_A M_AA/2) x_A = V_A ((D d)_A/2 + M_AB x_B/2 + init_A)
+		'''
+		if self.scenario_space == 'repos' or self.vaccinated_blocks is not None:
+			# statuses capped, or one linear system per scenario
+			return SRGetter.solve_direct(self,repo_status=repo_status,rows=rows)
+		r_max = self.deps_mat.shape[0]
+		if rows is None:
+			rows = np.arange(r_max)
+		if self.vaccinate_matrix is None:
+			vacc = sparse.eye(rows.size)
+		else:
+			vacc = sparse.diags(self.vaccinate_matrix.diagonal()[rows])
+		dev_contrib = self.get_dev_contrib(dev_status=self.init_dev_status)[rows]
+		deps_mat = self.deps_mat[rows]
+		rhs = dev_contrib/2. + self.init_repo_status[rows]
+		if rows.size < r_max:
+			keep = np.ones(r_max)
+			keep[rows] = 0.
+			rhs = rhs + deps_mat * (sparse.diags(keep) * repo_status)/2.
+		lhs = sparse.csc_matrix(sparse.eye(rows.size) - vacc * deps_mat[:,rows]/2.)
+		rhs = sparse.csc_matrix(vacc * rhs)
+		new_status = sparse_linalg.spsolve(lhs,rhs)
+		if not sparse.issparse(new_status):
+			new_status = new_status.reshape((rows.size,-1))
+		new_status = sparse.csr_matrix(new_status)
+		new_status.eliminate_zeros()
+		self.logger.info('Solved directly with sparse LU')
+		if rows.size < r_max:
+			return self.replace_rows(repo_status=repo_status,rows=rows,new_status=new_status)
+		return new_status
+
 class OldSRCobbDouglas(SRGetter):
-	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None):
+	def propagate(self,dev_status,repo_status,force_dev_mat=False,info=None,rows=None):
 		'''
 		returns repo_status_new
 		'''
 
-		# dev_contrib = self.devs_mat * dev_status
-		dev_contrib = self.get_dev_contrib(dev_status=dev_status,force=force_dev_mat)
-		deps_contrib = self.deps_mat * repo_status
+		dev_contrib,deps_contrib = self.get_contribs(dev_status=dev_status,repo_status=repo_status,force_dev_mat=force_dev_mat,rows=rows)
 		repo_status_new = dev_contrib + deps_contrib - dev_contrib.multiply(deps_contrib) # = 1- (1-dev_c)(1-deps_c); Cobb Douglas with both exponents equal to 1 but adapted to sparse mat
 		# assert (repo_status_new.data <=1).all()
-		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info)
+		repo_status_new = self.postprocess_repostatus(repo_status=repo_status_new,info=info,rows=rows)
 		return repo_status_new
 
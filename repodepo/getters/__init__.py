@@ -7,13 +7,13 @@ pandas_freq = {
 
 import datetime
 from dateutil.relativedelta import relativedelta
-import pandas as pd
 
 from .generic_getters import Getter
 
 
 def round_datetime_upper(dt,time_window,strict=False):
 	if not isinstance(dt,datetime.datetime):
+		import pandas as pd
 		dt = pd.to_datetime(dt).to_pydatetime()
 	if time_window == 'year':
 		if dt == datetime.datetime(dt.year,1,1) and not strict:
@@ -45,6 +45,7 @@ def round_datetime_upper(dt,time_window,strict=False):
 def convert_date(dt):
 
 	if not isinstance(dt,datetime.datetime):
+		import pandas as pd
 		dt = pd.to_datetime(dt).to_pydatetime()
 
 	return dt
@@ -156,27 +156,92 @@ class ContributionsGetter(CombinedGetter):
 	repo_id,repo_name,user_id,nb_commits,timestamp
 
 	removing bots. Not counting
-	'''
-
-	def get_result(self):
-		# date_range = pd.date_range(self.start_date,self.end_date,freq=pandas_freq[self.time_window]).to_pydatetime()
-		date_range = pd.date_range(self.start_date,self.end_date,freq=pandas_freq[self.time_window]).to_pydatetime()
-		ans_df = pd.DataFrame(columns=['timestamp','repo_id','user_id','nb_commits'])
-		ans_df.set_index(['timestamp','repo_id','user_id'],inplace=True)
 
+	Commits are aggregated by (timestamp,repo_id,user_id) in one query over the commits table,
+	the timestamp being the end of the corresponding time window (same convention as project_getters).
+	iter_results() streams the panel in chronological chunks, get_result() assembles it in one go.
+	'''
 
-		for t in date_range:
-			self.logger.info('Getting contribution network on {}'.format(datetime.datetime.strftime(t,'%Y-%m-%d')))
-			res = ({'repo_id':d['repo_id'],
-						'user_id':d['user_id'],
-						'nb_commits':d['abs_value']
-						} for d in edge_getters.DevToRepo(db=self.db,start_time=t-relativedelta(**{self.time_window:1}),end_time=t).get_result(raw_result=True))
-			deps_df = pd.DataFrame(res,columns=['timestamp','repo_id','user_id','nb_commits'])
-			deps_df = deps_df.convert_dtypes()
-			deps_df['timestamp'] = t
-			deps_df.set_index(['timestamp','repo_id','user_id'],inplace=True)
-			deps_df.sort_values(['timestamp','repo_id','user_id'],inplace=True)
-			ans_df = pd.concat([ans_df,deps_df])
+	def query_contributions(self,db,start_date,end_date,cursor):
+		if db.db_type == 'postgres':
+			cursor.execute('''
+				SELECT date_trunc(%(time_window)s, c.created_at) + CONCAT('1 ',%(time_window)s)::interval AS time_stamp,
+					c.repo_id,i.user_id,COUNT(*)
+				FROM commits c
+				INNER JOIN identities i
+				ON %(start_date)s <= c.created_at AND c.created_at < %(end_date)s
+				AND i.id=c.author_id
+				AND NOT i.is_bot
+				AND c.repo_id IS NOT NULL
+				GROUP BY time_stamp,c.repo_id,i.user_id
+				ORDER BY time_stamp,c.repo_id,i.user_id
+				;''',{'time_window':self.time_window,'start_date':start_date,'end_date':end_date})
+		else:
+			cursor.execute('''
+				SELECT date(datetime(c.created_at,:startoftw),:offsettw) AS time_stamp,
+					c.repo_id,i.user_id,COUNT(*)
+				FROM commits c
+				INNER JOIN identities i
+				ON datetime(:start_date) <= c.created_at AND c.created_at < datetime(:end_date)
+				AND i.id=c.author_id
+				AND NOT i.is_bot
+				AND c.repo_id IS NOT NULL
+				GROUP BY time_stamp,c.repo_id,i.user_id
+				ORDER BY time_stamp,c.repo_id,i.user_id
+				;''',{'startoftw':self.start_of_tw(self.time_window),'offsettw':self.offset_tw(self.time_window),'start_date':start_date,'end_date':end_date})
+
+	def make_chunk(self,rows,date_range):
+		chunk_df = pd.DataFrame(rows,columns=['timestamp','repo_id','user_id','nb_commits'])
+		chunk_df['timestamp'] = pd.to_datetime(chunk_df['timestamp'])
+		chunk_df = chunk_df[chunk_df['timestamp'].isin(date_range)]
+		chunk_df = chunk_df.convert_dtypes()
+		chunk_df.set_index(['timestamp','repo_id','user_id'],inplace=True)
+		return chunk_df
+
+	def iter_results(self,batch_size=10**5):
+		'''
+		Generator of dataframes indexed by (timestamp,repo_id,user_id), in chronological order.
+		All rows of a given timestamp are in the same chunk, so that memory is bounded by batch_size plus the size of one time window.
+		'''
+		# normalized to midnight like the timestamps computed in SQL, start_date may have a time component
+		date_range = pd.date_range(pd.Timestamp(self.start_date).normalize(),self.end_date,freq=pandas_freq[self.time_window])
+		if len(date_range) == 0:
+			return
+		start_date = date_range[0].to_pydatetime() - relativedelta(**{'{}s'.format(self.time_window):1})
+		end_date = date_range[-1].to_pydatetime()
+
+		self.logger.info('Getting contribution network from {} to {}'.format(datetime.datetime.strftime(date_range[0],'%Y-%m-%d'),datetime.datetime.strftime(date_range[-1],'%Y-%m-%d')))
+		if self.db.db_type == 'postgres':
+			cursor = self.db.connection.cursor(name='cursor_contributions')
+			cursor.itersize = batch_size
+		else:
+			cursor = self.db.connection.cursor()
+		# closed even when the generator is not exhausted, a named cursor holding a transaction open on PostgreSQL
+		try:
+			self.query_contributions(db=self.db,start_date=start_date,end_date=end_date,cursor=cursor)
+
+			pending = []
+			while True:
+				rows = cursor.fetchmany(batch_size)
+				if not rows:
+					break
+				last_ts = rows[-1][0]
+				pending += [r for r in rows if r[0] != last_ts]
+				if pending:
+					yield self.make_chunk(rows=pending,date_range=date_range)
+				pending = [r for r in rows if r[0] == last_ts]
+			if pending:
+				yield self.make_chunk(rows=pending,date_range=date_range)
+		finally:
+			cursor.close()
+
+	def get_result(self,batch_size=10**5):
+		chunks = list(self.iter_results(batch_size=batch_size))
+		if len(chunks):
+			ans_df = pd.concat(chunks)
+		else:
+			ans_df = pd.DataFrame(columns=['timestamp','repo_id','user_id','nb_commits'])
+			ans_df.set_index(['timestamp','repo_id','user_id'],inplace=True)
 
 		if self.with_reponame:
 			reponames = generic_getters.RepoNames(db=self.db).get_result()
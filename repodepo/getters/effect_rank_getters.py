@@ -1,60 +1,65 @@
 from . import Getter
 from . import rank_getters
 from . import SR_getters
+from . import shared_arrays
+from . import result_store
+from . import scheduler
 
 from scipy import sparse
 import datetime
 import copy
 import numpy as np
-import json
-import sqlite3
 import pandas as pd
 
-import multiprocessing as mp
 import psutil
 
 class VaccinationRankGetter(rank_getters.RepoRankGetter):
+	'''
+	Repositories ranked by the effect of vaccinating them on the SR cascade.
+	With batch_size>1, batch_size vaccination scenarios are propagated at once (see SRGetter.get_batch).
+	Otherwise with incremental=True, each scenario only recomputes the dependents of the modified repository (see SRGetter.get_delta).
+	'''
+	# whether the scenarios only differ by the vaccinated repositories, and can be batched
+	batchable = True
+	# results stored in table <cr_db_table>_results of computation_results_db
+	cr_db_table = 'vacc'
 
-	def __init__(self,sr_getter_class=SR_getters.SRGetter,limit_repos=None,offset_repos=0,srgetter_kwargs={},computation_results_db=None,**kwargs):
+	def __init__(self,sr_getter_class=SR_getters.SRGetter,limit_repos=None,offset_repos=0,srgetter_kwargs={},computation_results_db=None,batch_size=1,incremental=True,**kwargs):
 		rank_getters.RepoRankGetter.__init__(self,**kwargs)
 		self.sr_getter_class = sr_getter_class
 		self.sr_getter = self.sr_getter_class(db=self.db,**srgetter_kwargs)
 		self.limit_repos = limit_repos
 		self.offset_repos = offset_repos
-		if computation_results_db is None:
-			self.computation_results_db = None
-			self.cr_db_connection = None
-			self.cr_db_cursor = None
-		else:
-			self.computation_results_db = computation_results_db
-			self.connect_cr_db()
+		self.batch_size = batch_size
+		self.incremental = incremental
+		self.computation_results_db = computation_results_db
+		self.connect_cr_db()
 
 	def connect_cr_db(self):
-		if self.computation_results_db is not None:
-			self.cr_db_connection = sqlite3.connect(self.computation_results_db)
-			self.cr_db_cursor = self.cr_db_connection.cursor()
-			self.cr_db_cursor.execute('''CREATE TABLE IF NOT EXISTS vacc_values(
-										repo_rank INTEGER PRIMARY KEY,
-										values_dict TEXT,
-										inserted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);''')
-			self.cr_db_connection.commit()
+		if self.computation_results_db is None:
+			self.cr_store = None
+		else:
+			self.cr_store = result_store.ResultStore(self.computation_results_db,table='{}_results'.format(self.cr_db_table),legacy_table='{}_values'.format(self.cr_db_table),legacy_key='repo_rank')
 
 	def update_cr_db_results(self):
-		if self.computation_results_db is None:
+		if self.cr_store is None:
 			self.cr_db_results = {}
 		else:
-			self.cr_db_cursor.execute('SELECT repo_rank,values_dict FROM vacc_values;')
-			self.cr_db_results = {rk:json.loads(val) for rk,val in self.cr_db_cursor.fetchall()}
+			self.cr_db_results = self.cr_store.load()
 
 	def submit_cr_db_result(self,rk,val):
-		if self.computation_results_db is not None:
-			self.cr_db_cursor.execute('INSERT OR IGNORE INTO vacc_values(repo_rank,values_dict) VALUES(:rk,:val);',{'rk':rk,'val':json.dumps(val)})
-			self.cr_db_connection.commit()
+		if self.cr_store is not None:
+			self.cr_store.append(rk,val)
+
+	def flush_cr_db(self):
+		if self.cr_store is not None:
+			self.cr_store.flush()
 
 	def get(self,db,**kwargs):
 		ranks_direct,ranks_indirect,ranks_values = rank_getters.RepoRankGetter.get(self,db=db,**kwargs)
 		# self.results = []
-		self.baseline_results = self.process_results(self.sr_getter.get_result(),baseline=True)
+		# baseline cascade computed once, also the starting point of the incremental scenarios (see repo_iterations)
+		self.baseline_results = self.process_results(self.sr_getter.weight_result(self.sr_getter.get_baseline_status()),baseline=True)
 		self.update_cr_db_results()
 		if self.limit_repos is None:
 			repo_rank_gen = range(self.offset_repos,ranks_direct.size-self.offset_repos)
@@ -68,26 +73,23 @@ class VaccinationRankGetter(rank_getters.RepoRankGetter):
 			else:
 				results.append((v_rk,self.cr_db_results[v_rk]))
 		self.results = results + self.repo_iterations(repo_rank_list=repo_rank_list)
+		self.flush_cr_db()
 		# for v_rk in range(ranks_direct.size):
 		# 	self.logger.info('Vaccination repository {}/{}'.format(v_rk+1,ranks_direct.size))
 		# 	self.sr_getter.set_vaccinated_repos(vaccinated_repo_ranks=[v_rk])
 		# 	sr_res = self.sr_getter.get_result()
 		# 	self.results.append((v_rk,self.process_results(sr_res)))
-		sorted_vrk = sorted(self.results,key=lambda vr: (self.results_sort_function(vr[1]),vr[0]))
-		ans_direct = np.zeros(ranks_direct.shape)
-		ans_values = np.zeros(ranks_direct.shape)
-		ans_indirect = {}
-		for i,sv in enumerate(sorted_vrk):
-			v_id = ranks_direct[sv[0]]
-			ans_direct[i] = v_id
-			ans_indirect[v_id] = i
-			ans_values[i] = self.results_sort_function(sv[1])
-		return ans_direct,ans_indirect,ans_values
+		return self.rank_from_results(ranks_direct=ranks_direct,results=self.results,sort_function=self.results_sort_function)
 
 	def repo_iterations(self,repo_rank_list,prefix='',sr_getter=None):
 		if sr_getter is None:
 			sr_getter = self.sr_getter
+		if self.batchable and self.batch_size > 1:
+			return self.batch_repo_iterations(repo_rank_list=repo_rank_list,prefix=prefix,sr_getter=sr_getter)
 		results = []
+		if self.incremental:
+			# before any modification of the SR getter
+			sr_getter.get_baseline_status()
 
 		for i,v_rk in enumerate(repo_rank_list):
 			if v_rk in self.cr_db_results.keys():
@@ -95,12 +97,31 @@ class VaccinationRankGetter(rank_getters.RepoRankGetter):
 			else:
 				self.logger.info('{}{} repository {}/{} {}'.format(prefix,self.__class__.__name__.split('.')[-1],i+1,len(repo_rank_list),v_rk+1,))
 				self.modify_srgetter(sr_getter=sr_getter,v_rk=v_rk)
-				sr_res = sr_getter.get_result()
+				if self.incremental:
+					sr_res = sr_getter.get_delta(rows=[v_rk])
+				else:
+					# not get_result: SR getters detached for worker processes have no database
+					sr_res = sr_getter.get(db=sr_getter.db)
 				val = self.process_results(sr_res)
 				self.submit_cr_db_result(rk=v_rk,val=val)
 			results.append((v_rk,val))
 		return results
 
+	def batch_repo_iterations(self,repo_rank_list,prefix='',sr_getter=None):
+		if sr_getter is None:
+			sr_getter = self.sr_getter
+		to_compute = [v_rk for v_rk in repo_rank_list if v_rk not in self.cr_db_results.keys()]
+		computed = {}
+		for b0 in range(0,len(to_compute),self.batch_size):
+			batch = to_compute[b0:b0+self.batch_size]
+			self.logger.info('{}{} repositories {}-{}/{}'.format(prefix,self.__class__.__name__.split('.')[-1],b0+1,b0+len(batch),len(to_compute)))
+			sr_res_list = sr_getter.get_batch([[v_rk] for v_rk in batch])
+			for v_rk,sr_res in zip(batch,sr_res_list):
+				val = self.process_results(sr_res)
+				self.submit_cr_db_result(rk=v_rk,val=val)
+				computed[v_rk] = val
+		return [(v_rk,self.cr_db_results[v_rk] if v_rk in self.cr_db_results.keys() else computed[v_rk]) for v_rk in repo_rank_list]
+
 	def modify_srgetter(self,sr_getter,v_rk):
 		sr_getter.set_vaccinated_repos(vaccinated_repo_ranks=[v_rk])
 
@@ -138,117 +159,97 @@ class VaccinationRankGetter(rank_getters.RepoRankGetter):
 
 class ParallelVaccRankGetter(VaccinationRankGetter):
 	'''
-	Instead of for loop on each repo, parallelizing in nb_workers processes, each with the same amount of repos
+	Instead of for loop on each repo, parallelizing in nb_workers processes, pulling chunks of chunk_size repos
+	(by default about 4 chunks per worker) as soon as they are free. Results are stored as each chunk finishes.
 	'''
-	def __init__(self,workers=None,**kwargs):
+	def __init__(self,workers=None,chunk_size=None,**kwargs):
 		VaccinationRankGetter.__init__(self,**kwargs)
 		if workers is None:
 			self.workers = len(psutil.Process().cpu_affinity())
 		else:
 			self.workers = workers
+		self.chunk_size = chunk_size
 
 	def split_rk_list(self,repo_rank_list):
-		if self.workers >= len(repo_rank_list):
-			return [[r] for r in repo_rank_list ]
-		else:
-			ans = []
-			base_nb = int(len(repo_rank_list)/self.workers)
-			remaining = len(repo_rank_list) - self.workers * base_nb
-			current_idx = 0
-			for i in range(self.workers):
-				if i<remaining:
-					ans.append(repo_rank_list[current_idx:current_idx + base_nb + 1])
-					current_idx = current_idx + base_nb + 1
-				else:
-					ans.append(repo_rank_list[current_idx:current_idx + base_nb])
-					current_idx = current_idx + base_nb
-			return ans
+		return scheduler.split_chunks(repo_rank_list,workers=self.workers,chunk_size=self.chunk_size)
+
+	def detached_copy(self,sr_getter=None):
+		'''
+		Light copy sent to the worker processes: no database connections, and an SR getter without its matrices,
+		which are attached from shared memory (see init_worker). Results are stored by the parent process.
+		'''
+		if sr_getter is None:
+			sr_getter = self.sr_getter
+		ans = copy.copy(self)
+		ans.db = None
+		ans.sr_getter = sr_getter.detached_copy()
+		ans.computation_results_db = None
+		ans.cr_store = None
+		return ans
 
 	def repo_iterations(self,repo_rank_list,prefix='',sr_getter=None):
 		if sr_getter is None:
 			sr_getter = self.sr_getter
 		results = []
-		manager = mp.Manager()
-		ans_dict = manager.dict()
+		if not len(repo_rank_list):
+			return results
 		rk_list = self.split_rk_list(repo_rank_list)
-		# copy sr_getter
-		# sr_getter_l = [self.sr_getter.copy() for _ in range(len(rk_list))]
-		self.logger.info('Copying SR getters')
-		self.sr_getter.get_all()
-		sr_getter_l = [copy.deepcopy(self.sr_getter) for _ in range(len(rk_list))]
-		self.logger.info('Copied SR getters')
-		# define launch processes on repo_iter func
-		def f(i,ans_d):
-			ans_d[i] = VaccinationRankGetter.repo_iterations(self,repo_rank_list=rk_list[i],prefix='Process {}{}/{}:'.format(' '*( len(str(len(rk_list)))-len(str(i+1)) ),i+1,len(rk_list)),sr_getter=sr_getter_l[i])
-		# make processes
-		process_pool = [mp.Process(target=f,args=(i,ans_dict)) for i in range(len(rk_list))]
-		for p in process_pool:
-			p.start()
-		for p in process_pool:
-			p.join()
-		# collect and combine results
-		for i in range(len(rk_list)):
-			results += ans_dict[i]
+		sr_getter.get_all()
+		if self.incremental and not (self.batchable and self.batch_size > 1):
+			sr_getter.get_baseline_status()
+		self.logger.info('Placing SR getter matrices in shared memory')
+		with shared_arrays.SharedArrays() as shared:
+			for attr in sr_getter.shared_attributes:
+				if hasattr(sr_getter,attr):
+					shared.put(attr,getattr(sr_getter,attr))
+			tasks = [(i,rk,'Chunk {}{}/{}:'.format(' '*( len(str(len(rk_list)))-len(str(i+1)) ),i+1,len(rk_list))) for i,rk in enumerate(rk_list)]
+			ans_list = scheduler.run_chunks(tasks,worker_repo_iterations,workers=self.workers,
+						initializer=init_worker,initargs=(self.detached_copy(sr_getter=sr_getter),shared.spec()),
+						on_result=self.checkpoint_chunk)
+		# combine results in the order of the split
+		for i,res in ans_list:
+			results += res
 
 		return results
 
+	def checkpoint_chunk(self,i,chunk_result):
+		for v_rk,val in chunk_result[1]:
+			self.submit_cr_db_result(rk=v_rk,val=val)
+		self.flush_cr_db()
+
+
+# state of the worker processes of ParallelVaccRankGetter
+worker_state = {}
+
+def init_worker(getter,spec):
+	'''
+	Attaches the shared matrices to the SR getter of the (detached) vaccination getter, kept for the lifetime of the worker
+	'''
+	attached,handles = shared_arrays.attach(spec)
+	for attr,val in attached.items():
+		setattr(getter.sr_getter,attr,val)
+	worker_state['getter'] = getter
+	worker_state['handles'] = handles
+
+def worker_repo_iterations(task):
+	i,repo_rank_list,prefix = task
+	getter = worker_state['getter']
+	return i,VaccinationRankGetter.repo_iterations(getter,repo_rank_list=repo_rank_list,prefix=prefix,sr_getter=getter.sr_getter)
+
 class EfficientVaccRankGetter(VaccinationRankGetter):
 	'''
-	Instead of for loop on each repo, combining all cascades in one
+	Instead of for loop on each repo, propagating the cascades of grouping_size repos at once
 	'''
 	def __init__(self,grouping_size=100,**kwargs):
-		VaccinationRankGetter.__init__(self,**kwargs)
+		VaccinationRankGetter.__init__(self,batch_size=grouping_size,**kwargs)
 		self.grouping_size = grouping_size
-		if self.computation_results_db is not None:
-			raise NotImplementedError('Saving results to SQLite for EfficientVaccRankGetter is not implemented yet')
-
-	def get(self,db,**kwargs):
-		
-
-		ranks_direct,ranks_indirect,ranks_values = rank_getters.RepoRankGetter.get(self,db=db,**kwargs)
-		self.results = []
-		self.baseline_matrix = self.sr_getter.get_result()
-		self.baseline_results = self.process_results(self.baseline_matrix,baseline=True)
-		
-		group_boundaries = []
-		current_rk = 0
-		while current_rk<=ranks_direct.size-1:
-			new_upper = min(current_rk+self.grouping_size-1,ranks_direct.size-1)
-			group_boundaries.append((current_rk,new_upper))
-			current_rk = new_upper+1
-
-		self.sr_getter.parallelize_repo_space(factor=self.grouping_size)
-
-		for v_rk_min,v_rk_max in group_boundaries:
-			# print(v_rk_min,v_rk_max)
-			# if v_rk_max>200:
-			# 	raise ValueError()
-			self.sr_getter.set_vaccinated_repos(vaccinated_repo_ranks=[v_rk+i*ranks_direct.size for i,v_rk in enumerate(range(v_rk_min,v_rk_max+1))])
-			sr_res = self.sr_getter.get_result().tocsc()
-			for i,v_rk in enumerate(range(v_rk_min,v_rk_max+1)):
-				sr_res_extract = self.extract_sub_sr_res(sr_res=sr_res,i=i,n=ranks_direct.size)
-				self.results.append((v_rk,self.process_results(sr_res_extract)))
-
-		
-		sorted_vrk = sorted(self.results,key=lambda vr: (self.results_sort_function(vr[1]),vr[0]))
-		ans_direct = np.zeros(ranks_direct.shape)
-		ans_values = np.zeros(ranks_direct.shape)
-		ans_indirect = {}
-		for i,sv in enumerate(sorted_vrk):
-			v_id = ranks_direct[sv[0]]
-			ans_direct[i] = v_id
-			ans_values[i] = self.results_sort_function(sv[1])
-			ans_indirect[v_id] = i
-		return ans_direct,ans_indirect,ans_values
-
-	def extract_sub_sr_res(self,sr_res,i,n):
-		'''
-		extract i-th slice of sr_res when parallelized
-		'''
-		return sr_res[:,n*i:n*(i+1)]
 
 
 class SemiGreedyEffectRank(ParallelVaccRankGetter):
+	# scenarios modify devs_mat
+	batchable = False
+	cr_db_table = 'semigreedy'
+
 	def __init__(self,daily_commits=5./7.,**kwargs):
 		self.daily_commits = daily_commits
 		ParallelVaccRankGetter.__init__(self,**kwargs)
@@ -263,27 +264,5 @@ class SemiGreedyEffectRank(ParallelVaccRankGetter):
 		for i in nz[1][nz[0]==v_rk]:
 			sr_getter.devs_mat[v_rk,i] = max(sr_getter.devs_mat[v_rk,i] - val,0.)
 		sr_getter.devs_mat.eliminate_zeros()
-		del sr_getter.dev_contrib
-
-
-	def connect_cr_db(self):
-		if self.computation_results_db is not None:
-			self.cr_db_connection = sqlite3.connect(self.computation_results_db)
-			self.cr_db_cursor = self.cr_db_connection.cursor()
-			self.cr_db_cursor.execute('''CREATE TABLE IF NOT EXISTS semigreedy_values(
-										repo_rank INTEGER PRIMARY KEY,
-										values_dict TEXT,
-										inserted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);''')
-			self.cr_db_connection.commit()
-
-	def update_cr_db_results(self):
-		if self.computation_results_db is None:
-			self.cr_db_results = {}
-		else:
-			self.cr_db_cursor.execute('SELECT repo_rank,values_dict FROM semigreedy_values;')
-			self.cr_db_results = {rk:json.loads(val) for rk,val in self.cr_db_cursor.fetchall()}
-
-	def submit_cr_db_result(self,rk,val):
-		if self.computation_results_db is not None:
-			self.cr_db_cursor.execute('INSERT OR IGNORE INTO semigreedy_values(repo_rank,values_dict) VALUES(:rk,:val);',{'rk':rk,'val':json.dumps(val)})
-			self.cr_db_connection.commit()
+		if hasattr(sr_getter,'dev_contrib'):
+			del sr_getter.dev_contrib
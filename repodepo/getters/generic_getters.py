@@ -1,13 +1,12 @@
 import os
-import requests
 import zipfile
-import pandas as pd
 import logging
 import csv
-from psycopg2 import extras
 import json
 import subprocess
 
+from .. import metrics
+
 logger = logging.getLogger(__name__)
 ch = logging.StreamHandler()
 ch.setLevel(logging.DEBUG)
@@ -42,7 +41,10 @@ class Getter(object):
 			db = self.db
 		if db is None:
 			raise ValueError('please set a database to query from')
-		return self.get(db=db,**kwargs)
+		with metrics.measure(db=db,kind='getter',name=self.name,phase='get',count_db_rows=False) as m:
+			ans = self.get(db=db,**kwargs)
+			m.nb_rows = metrics.result_size(ans)
+		return ans
 
 	def get(self,db,raw_result=False,**kwargs):
 		db.cursor.execute(self.query(),self.query_attributes())
@@ -50,6 +52,7 @@ class Getter(object):
 		if raw_result:
 			return query_result
 		else:
+			import pandas as pd
 			df = pd.DataFrame(self.parse_results(query_result=query_result))
 			return df
 
@@ -0,0 +1,257 @@
+'''
+In-memory graph algorithms on scipy sparse adjacency matrices, used by the getters working on dependency networks.
+Conventions: adj[i,j] != 0 means that i depends on j (same orientation as RepoToRepoDeps).
+'''
+
+from scipy import sparse
+from scipy.sparse import csgraph
+import numpy as np
+
+
+def condensation(adj):
+	'''
+	Condenses the strongly connected components of the graph.
+	Returns a dict with:
+	 - labels: component of each node
+	 - sizes: number of nodes per component
+	 - cyclic: bool per component, True if the component contains a cycle (size>1 or self loop)
+	 - dag: bool csr matrix of the condensation DAG, same orientation as adj
+	'''
+	# copy: eliminate_zeros works in place, and the index arrays would otherwise be shared with the input
+	adj = sparse.csr_matrix(adj,dtype=np.bool_,copy=True)
+	adj.eliminate_zeros()
+	n_comp,labels = csgraph.connected_components(adj,directed=True,connection='strong')
+	sizes = np.bincount(labels,minlength=n_comp)
+	coo = adj.tocoo()
+	src = labels[coo.row]
+	dst = labels[coo.col]
+	cyclic = sizes > 1
+	cyclic[src[src==dst]] = True
+	mask = (src != dst)
+	dag = sparse.csr_matrix((np.ones(mask.sum(),dtype=np.bool_),(src[mask],dst[mask])),shape=(n_comp,n_comp),dtype=np.bool_)
+	dag.sum_duplicates()
+	return {'labels':labels,'sizes':sizes,'cyclic':cyclic,'dag':dag}
+
+
+def topological_levels(dag):
+	'''
+	Kahn's algorithm, processing a whole level at a time.
+	Level 0 contains the nodes without incoming edges (nothing depends on them when using the adj orientation),
+	and every edge goes from a lower level to a higher one.
+	Returns a list of arrays of node indices. Raises ValueError if the graph is not acyclic.
+	'''
+	dag = sparse.csr_matrix(dag,dtype=np.bool_)
+	n = dag.shape[0]
+	indeg = np.bincount(dag.indices,minlength=n).astype(np.int64)
+	frontier = np.flatnonzero(indeg==0)
+	levels = []
+	seen = 0
+	while frontier.size:
+		levels.append(frontier)
+		seen += frontier.size
+		children = dag[frontier].indices
+		np.subtract.at(indeg,children,1)
+		children = np.unique(children)
+		frontier = children[indeg[children]==0]
+	if seen != n:
+		raise ValueError('Graph is not acyclic, condense it first')
+	return levels
+
+
+def topological_structure(adj):
+	'''
+	Condensation of the graph with components renumbered in topological order, so that each level is a contiguous range.
+	Only depends on the structure of adj: it can be computed once and reused (see transitive_counts, transitive_correction).
+	Returns the output of condensation() (renumbered), plus:
+	 - level_bounds: level k is the range of components level_bounds[k]:level_bounds[k+1]
+	 - level_edges: for each level k>=1, arrays (children,parents) of the DAG edges parent->child with child in level k
+	'''
+	cond = condensation(adj)
+	levels = topological_levels(cond['dag'])
+	n_comp = cond['dag'].shape[0]
+	order = np.concatenate(levels) if len(levels) else np.zeros((0,),dtype=np.int64)
+	position = np.empty(n_comp,dtype=np.int64)
+	position[order] = np.arange(n_comp)
+	dag = cond['dag'][order][:,order].tocsr()
+	level_bounds = np.cumsum([0]+[l.size for l in levels])
+
+	dag_t = dag.transpose().tocsr()
+	level_edges = []
+	for l0,l1 in zip(level_bounds[1:-1],level_bounds[2:]):
+		sub = dag_t[l0:l1]
+		children = np.repeat(np.arange(l0,l1),np.diff(sub.indptr))
+		level_edges.append((children,sub.indices))
+
+	return {'labels':position[cond['labels']],
+			'sizes':cond['sizes'][order],
+			'cyclic':cond['cyclic'][order],
+			'dag':dag,
+			'level_bounds':level_bounds,
+			'level_edges':level_edges,
+			}
+
+
+def edge_values(mat,rows,cols):
+	'''
+	Values of the sparse matrix mat at the positions (rows[k],cols[k]), 0 where mat has no entry
+	'''
+	mat = sparse.csr_matrix(mat)
+	mat.sum_duplicates()
+	ans = np.zeros(np.asarray(rows).size,dtype=mat.dtype)
+	if ans.size:
+		ans[:] = np.asarray(mat[rows,cols]).reshape(-1)
+	return ans
+
+
+def cycle_analytics(adj):
+	'''
+	Cycle statistics in polynomial time, without enumerating cycles. A node or an edge belongs to a cycle
+	iff it is inside a cyclic strongly connected component; cycles of length 2 and 3 are counted exactly
+	from products of the adjacency matrix restricted to the edges inside components.
+	Returns the output of condensation(), plus:
+	 - node_in_cycle: bool per node
+	 - edge_rows,edge_cols: edges (self loops excluded) inside cyclic components, i.e. the edges involved in cycles
+	 - node_2cycles,node_3cycles: number of cycles of length 2 (resp. 3) through each node
+	 - edge_2cycles,edge_3cycles: number of cycles of length 2 (resp. 3) through each edge of edge_rows,edge_cols
+	 - nb_self_loops,nb_2cycles,nb_3cycles: totals
+	'''
+	adj = sparse.csr_matrix(adj,dtype=np.bool_,copy=True)
+	adj.eliminate_zeros()
+	cond = condensation(adj)
+	labels = cond['labels']
+	n = adj.shape[0]
+	coo = adj.tocoo()
+	self_loops = (coo.row == coo.col)
+	inside = (labels[coo.row] == labels[coo.col]) & cond['cyclic'][labels[coo.row]] & ~self_loops
+	edge_rows = coo.row[inside]
+	edge_cols = coo.col[inside]
+	inner = sparse.csr_matrix((np.ones(edge_rows.size,dtype=np.int64),(edge_rows,edge_cols)),shape=(n,n))
+	inner_t = inner.transpose().tocsr()
+	# (inner*inner)[j,i]: paths j->k->i, closing a 3-cycle with the edge i->j
+	paths2_t = (inner * inner).transpose().tocsr()
+	reciprocal = inner.multiply(inner_t).tocsr()
+	closing = inner.multiply(paths2_t).tocsr()
+	edge_2cycles = edge_values(reciprocal,edge_rows,edge_cols)
+	edge_3cycles = edge_values(closing,edge_rows,edge_cols)
+	node_2cycles = np.asarray(reciprocal.sum(axis=1)).flatten()
+	node_3cycles = np.asarray(closing.sum(axis=1)).flatten()
+	ans = dict(cond)
+	ans.update({'node_in_cycle':cond['cyclic'][labels],
+			'edge_rows':edge_rows,
+			'edge_cols':edge_cols,
+			'node_2cycles':node_2cycles,
+			'node_3cycles':node_3cycles,
+			'edge_2cycles':edge_2cycles,
+			'edge_3cycles':edge_3cycles,
+			'nb_self_loops':int(self_loops.sum()),
+			'nb_2cycles':int(node_2cycles.sum()//2),
+			'nb_3cycles':int(node_3cycles.sum()//3),
+			})
+	return ans
+
+
+def dependents(adj_t,nodes):
+	'''
+	Sorted array of the given nodes and of all their direct and indirect dependents (nodes i with a path from i to one of them).
+	adj_t is the transposed adjacency matrix, in csr format.
+	'''
+	seen = np.zeros(adj_t.shape[0],dtype=np.bool_)
+	frontier = np.unique(np.asarray(nodes,dtype=np.int64))
+	seen[frontier] = True
+	while frontier.size:
+		children = np.unique(adj_t[frontier].indices)
+		frontier = children[~seen[children]]
+		seen[frontier] = True
+	return np.flatnonzero(seen)
+
+
+def ancestor_bits(structure,b0,b1):
+	'''
+	Bitsets of the strict ancestors (dependents) of each component, restricted to the components b0:b1.
+	Array of shape (n_comp,ceil((b1-b0)/64)), bit k of the row being component b0+k.
+	'''
+	n_comp = structure['dag'].shape[0]
+	n_words = max(1,int(np.ceil((b1-b0)/64.)))
+	bits = np.zeros((n_comp,n_words),dtype='<u8')
+	offsets = np.arange(b1-b0)
+	self_bits = np.left_shift(np.uint64(1),(offsets%64).astype(np.uint64))
+	bits[b0+offsets,offsets//64] = self_bits
+	for children,parents in structure['level_edges']:
+		if children.size:
+			np.bitwise_or.at(bits,children,bits[parents])
+	bits[b0+offsets,offsets//64] ^= self_bits
+	return bits
+
+
+def weighted_bits_sum(bits,weights,row_chunk=2**16):
+	'''
+	For each row of a bitset array, sum of weights[k] over the bits k set.
+	'''
+	padded_weights = np.zeros(64*bits.shape[1],dtype=np.float64)
+	padded_weights[:weights.size] = weights
+	ans = np.zeros(bits.shape[0],dtype=np.float64)
+	for r0 in range(0,bits.shape[0],row_chunk):
+		unpacked = np.unpackbits(bits[r0:r0+row_chunk].view(np.uint8),axis=1,bitorder='little')
+		ans[r0:r0+row_chunk] = unpacked @ padded_weights
+	return ans
+
+
+def transitive_counts(adj=None,weights=None,structure=None,block_size=2**12):
+	'''
+	For each node j, (weighted) number of distinct nodes i from which j can be reached through a path of length >= 1,
+	i.e. the number of direct and indirect dependents of j. A node belonging to a cycle counts itself.
+
+	Computed on the condensation DAG with bitset propagation in topological order, by blocks of block_size source components
+	so that memory stays at n_components*block_size/8 bytes.
+	'''
+	if structure is None:
+		structure = topological_structure(adj)
+	labels = structure['labels']
+	n_comp = structure['dag'].shape[0]
+	if weights is None:
+		weights = np.ones(labels.size,dtype=np.float64)
+	else:
+		weights = np.asarray(weights,dtype=np.float64)
+	comp_weights = np.bincount(labels,weights=weights,minlength=n_comp)
+
+	ans_comp = np.where(structure['cyclic'],comp_weights,0.)
+	for b0 in range(0,n_comp,block_size):
+		b1 = min(n_comp,b0+block_size)
+		bits = ancestor_bits(structure=structure,b0=b0,b1=b1)
+		ans_comp += weighted_bits_sum(bits=bits,weights=comp_weights[b0:b1])
+	return ans_comp[labels]
+
+
+def transitive_correction(values,adj=None,structure=None,block_size=2**12):
+	'''
+	Removes from each node the (corrected) values of all its direct and indirect dependents:
+	ans[j] = max(0, values[j] - sum of ans[i] over the strict dependents i of j)
+	Dependents belonging to the same strongly connected component as j are not removed, the order between them being undefined.
+
+	Single sweep over the components in topological order (dependents first), by blocks as in transitive_counts.
+	'''
+	if structure is None:
+		structure = topological_structure(adj)
+	labels = structure['labels']
+	level_bounds = structure['level_bounds']
+	n_comp = structure['dag'].shape[0]
+	values = np.asarray(values,dtype=np.float64)
+
+	nodes_order = np.argsort(labels,kind='stable')
+	comp_bounds = np.concatenate([[0],np.cumsum(structure['sizes'])])
+
+	removed = np.zeros(n_comp,dtype=np.float64)
+	ans = np.zeros(values.shape,dtype=np.float64)
+	for b0 in range(0,n_comp,block_size):
+		b1 = min(n_comp,b0+block_size)
+		bits = ancestor_bits(structure=structure,b0=b0,b1=b1)
+		block_ans = np.zeros(b1-b0,dtype=np.float64)
+		# inside the block, levels are processed in order: ancestors of a level are all in previous levels
+		cuts = np.unique(np.clip(level_bounds,b0,b1))
+		for s0,s1 in zip(cuts[:-1],cuts[1:]):
+			seg_removed = removed[s0:s1] + weighted_bits_sum(bits=bits[s0:s1],weights=block_ans)
+			seg_nodes = nodes_order[comp_bounds[s0]:comp_bounds[s1]]
+			ans[seg_nodes] = np.maximum(0.,values[seg_nodes]-seg_removed[labels[seg_nodes]-s0])
+			block_ans[s0-b0:s1-b0] = np.bincount(labels[seg_nodes]-s0,weights=ans[seg_nodes],minlength=s1-s0)
+		removed[b1:] += weighted_bits_sum(bits=bits[b1:],weights=block_ans)
+	return ans
@@ -1,22 +1,22 @@
 from . import Getter
 from . import edge_getters
 from . import SR_getters
+from . import result_store
+from . import scheduler
 
 from scipy import sparse
 import datetime
 import numpy as np
 import pandas as pd
-import sqlite3
-import json
 import copy
+from collections.abc import Mapping
 
-import multiprocessing as mp
 import psutil
 
 class PolicyGetter(Getter):
 	def __init__(self,db,ranks,nb_devs=10,no_checks=False,sr_getter_class=SR_getters.SRGetter,start_time=datetime.datetime(2010,1,1),end_time=datetime.datetime.now(),**kwargs):
 		Getter.__init__(self,db=db,**kwargs)
-		if len(ranks) == 3 and isinstance(ranks[1],dict):
+		if len(ranks) == 3 and isinstance(ranks[1],Mapping):
 			self.ranks = ranks[0]
 		else:
 			self.ranks = ranks
@@ -79,35 +79,28 @@ class BatchPolicyGetter(Getter):
 		self.nb_devs_list = list(nb_devs_list)
 		self.rank_label = rank_label
 
-		if computation_results_db is None:
-			self.computation_results_db = None
-			self.cr_db_connection = None
-			self.cr_db_cursor = None
-		else:
-			self.computation_results_db = computation_results_db
-			self.connect_cr_db()
+		self.computation_results_db = computation_results_db
+		self.connect_cr_db()
 
 	def connect_cr_db(self):
-		if self.computation_results_db is not None:
-			self.cr_db_connection = sqlite3.connect(self.computation_results_db)
-			self.cr_db_cursor = self.cr_db_connection.cursor()
-			self.cr_db_cursor.execute('''CREATE TABLE IF NOT EXISTS policy_values(
-										nb_devs INTEGER PRIMARY KEY,
-										values_dict TEXT,
-										inserted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);''')
-			self.cr_db_connection.commit()
+		if self.computation_results_db is None:
+			self.cr_store = None
+		else:
+			self.cr_store = result_store.ResultStore(self.computation_results_db,table='policy_results',legacy_table='policy_values',legacy_key='nb_devs')
 
 	def update_cr_db_results(self):
-		if self.computation_results_db is None:
+		if self.cr_store is None:
 			self.cr_db_results = {}
 		else:
-			self.cr_db_cursor.execute('SELECT nb_devs,values_dict FROM policy_values;')
-			self.cr_db_results = {ndev:json.loads(val) for ndev,val in self.cr_db_cursor.fetchall()}
+			self.cr_db_results = self.cr_store.load()
 
 	def submit_cr_db_result(self,ndev,val):
-		if self.computation_results_db is not None:
-			self.cr_db_cursor.execute('INSERT OR IGNORE INTO policy_values(nb_devs,values_dict) VALUES(:ndev,:val);',{'ndev':ndev,'val':json.dumps(val)})
-			self.cr_db_connection.commit()
+		if self.cr_store is not None:
+			self.cr_store.append(ndev,val)
+
+	def flush_cr_db(self):
+		if self.cr_store is not None:
+			self.cr_store.flush()
 
 	def process_results(self,sr_res,baseline=False):
 		sum_ax1 = sr_res.sum(axis=1)
@@ -142,39 +135,39 @@ class BatchPolicyGetter(Getter):
 				val = self.process_results(pg.get_result())
 				self.submit_cr_db_result(ndev=nb_devs,val=val)
 				results[nb_devs] = copy.deepcopy(val)
+		self.flush_cr_db()
 
 		return results
 
 
 class ParallelBatchPolicyGetter(BatchPolicyGetter):
-	def __init__(self,workers=None,**kwargs):
+	'''
+	Policies computed in nb_workers processes, each with its own database connection, pulling chunks of chunk_size nb_devs values
+	(by default about 4 chunks per worker) as soon as they are free. Results are stored as each chunk finishes.
+	'''
+	def __init__(self,workers=None,chunk_size=None,**kwargs):
 		if workers is None:
 			self.workers = len(psutil.Process().cpu_affinity())
 		else:
 			self.workers = workers
+		self.chunk_size = chunk_size
 		BatchPolicyGetter.__init__(self,**kwargs)
 
 	def split_ndev_list(self,ndev_list):
-		if self.workers >= len(ndev_list):
-			return [[r] for r in ndev_list ]
-		else:
-			ans = []
-			base_nb = int(len(ndev_list)/self.workers)
-			remaining = len(ndev_list) - self.workers * base_nb
-			current_idx = 0
-			for i in range(self.workers):
-				if i<remaining:
-					ans.append(ndev_list[current_idx:current_idx + base_nb + 1])
-					current_idx = current_idx + base_nb + 1
-				else:
-					ans.append(ndev_list[current_idx:current_idx + base_nb])
-					current_idx = current_idx + base_nb
-			return ans
+		return scheduler.split_chunks(ndev_list,workers=self.workers,chunk_size=self.chunk_size)
+
+	def detached_copy(self):
+		'''
+		Copy sent to the worker processes, without database connections: results are stored by the parent process
+		'''
+		ans = copy.copy(self)
+		ans.db = None
+		ans.computation_results_db = None
+		ans.cr_store = None
+		return ans
 
 	def ndev_iterations(self,db,nb_devs_list=None,prefix=''):
 		results = {}
-		manager = mp.Manager()
-		ans_dict = manager.dict()
 		ndev_list = []
 		for n in self.nb_devs_list:
 			if n in self.cr_db_results.keys():
@@ -182,22 +175,34 @@ class ParallelBatchPolicyGetter(BatchPolicyGetter):
 			else:
 				ndev_list.append(n)
 		batch_list = self.split_ndev_list(ndev_list)
-
-		def f(i,ans_d):
-			# temp_db = self.db # connection duplication on pickling handled in Database class
-			temp_db = self.db.__class__(**self.db.db_conninfo) # connection duplication
-			try:
-				ans_d[i] = BatchPolicyGetter.ndev_iterations(self,nb_devs_list=batch_list[i],prefix='{} Process {}{}/{}:'.format(prefix,' '*( len(str(len(batch_list)))-len(str(i+1)) ),i+1,len(batch_list)),db=temp_db)
-			finally:
-				temp_db.connection.close()
-		# make processes
-		process_pool = [mp.Process(target=f,args=(i,ans_dict)) for i in range(len(batch_list))]
-		for p in process_pool:
-			p.start()
-		for p in process_pool:
-			p.join()
+		if not len(batch_list):
+			return results
+		tasks = [(batch,'{} Chunk {}{}/{}:'.format(prefix,' '*( len(str(len(batch_list)))-len(str(i+1)) ),i+1,len(batch_list))) for i,batch in enumerate(batch_list)]
+		ans_list = scheduler.run_chunks(tasks,worker_ndev_iterations,workers=self.workers,
+					initializer=init_policy_worker,initargs=(self.detached_copy(),db.__class__,db.db_conninfo),
+					on_result=self.checkpoint_chunk)
 		# collect and combine results
-		for i in range(len(batch_list)):
-			results.update(ans_dict[i])
+		for res in ans_list:
+			results.update(res)
 
 		return results
+
+	def checkpoint_chunk(self,i,chunk_result):
+		for ndev,val in chunk_result.items():
+			self.submit_cr_db_result(ndev=ndev,val=val)
+		self.flush_cr_db()
+
+
+# state of the worker processes of ParallelBatchPolicyGetter
+policy_worker_state = {}
+
+def init_policy_worker(getter,db_class,db_conninfo):
+	'''
+	Opens the database connection of the worker, kept for its lifetime
+	'''
+	policy_worker_state['getter'] = getter
+	policy_worker_state['db'] = db_class(**db_conninfo)
+
+def worker_ndev_iterations(task):
+	nb_devs_list,prefix = task
+	return BatchPolicyGetter.ndev_iterations(policy_worker_state['getter'],db=policy_worker_state['db'],nb_devs_list=nb_devs_list,prefix=prefix)
@@ -1,11 +1,69 @@
 from . import Getter
 from .edge_getters import RepoToRepoDeps
+from . import graph_analytics
 
 from scipy import sparse
 import copy
 import datetime
+import hashlib
 import numpy as np
 import pandas as pd
+from collections.abc import Mapping
+
+class RankIndex(Mapping):
+	'''
+	Read-only mapping id -> rank backed by numpy arrays, returned as ans_indirect by the rank getters.
+	Behaves like the dict previously built item by item; lookup() translates whole arrays of ids at once.
+	'''
+	def __init__(self,ids,ranks=None):
+		self.ids = np.asarray(ids,dtype=np.int64)
+		if ranks is None:
+			self.ranks = np.arange(self.ids.size,dtype=np.int64)
+		else:
+			self.ranks = np.asarray(ranks,dtype=np.int64)
+		order = np.argsort(self.ids,kind='stable')
+		self.sorted_ids = self.ids[order]
+		self.sorted_ranks = self.ranks[order]
+
+	def lookup(self,ids):
+		'''
+		Ranks of an array of ids, KeyError if one of them is missing
+		'''
+		ids = np.asarray(ids,dtype=np.int64)
+		if self.sorted_ids.size == 0:
+			if ids.size:
+				raise KeyError(ids.flat[0])
+			return np.zeros(ids.shape,dtype=np.int64)
+		pos = np.minimum(np.searchsorted(self.sorted_ids,ids),self.sorted_ids.size-1)
+		found = (self.sorted_ids[pos] == ids)
+		if not found.all():
+			raise KeyError(ids[~found].flat[0])
+		return self.sorted_ranks[pos]
+
+	def __getitem__(self,key):
+		try:
+			int_key = int(key)
+		except (TypeError,ValueError):
+			raise KeyError(key)
+		if int_key != key:
+			raise KeyError(key)
+		return int(self.lookup(int_key))
+
+	def __contains__(self,key):
+		try:
+			self[key]
+		except KeyError:
+			return False
+		return True
+
+	def __iter__(self):
+		return iter(self.ids.tolist())
+
+	def __len__(self):
+		return self.ids.size
+
+	def __repr__(self):
+		return '{}({} ids)'.format(self.__class__.__name__,len(self))
 
 class RepoRankGetter(Getter):
 	values_dtype = np.float64
@@ -24,7 +82,14 @@ class RepoRankGetter(Getter):
 		}
 
 	def parse_results(self,query_result):
-		return [(r_id,rk-1,val) for (r_id,rk,val) in query_result]
+		'''
+		Columns (ids,ranks starting at 0,values) as numpy arrays
+		'''
+		if len(query_result):
+			r_ids,rks,vals = zip(*query_result)
+		else:
+			r_ids,rks,vals = (),(),()
+		return np.asarray(r_ids,dtype=np.int64),np.asarray(rks,dtype=np.int64)-1,np.asarray(vals,dtype=self.values_dtype)
 
 	def get_size_max(self,db):
 		db.cursor.execute('SELECT COUNT(*) FROM repositories r;')
@@ -34,14 +99,12 @@ class RepoRankGetter(Getter):
 	def get(self,db,orig_id_rank=False,**kwargs):
 		r_max = self.get_size_max(db=db)
 		db.cursor.execute(self.query(),self.query_attributes())
-		parsed_results = self.parse_results(query_result=db.cursor.fetchall())
+		r_ids,rks,vals = self.parse_results(query_result=db.cursor.fetchall())
 		ans_direct = np.zeros(shape=(r_max,),dtype=np.int64)
 		ans_values = np.zeros(shape=(r_max,),dtype=self.values_dtype)
-		ans_indirect = {}
-		for r_id,rk,val in parsed_results:
-			ans_indirect[r_id] = rk
-			ans_direct[rk] = r_id
-			ans_values[rk] = val
+		ans_direct[rks] = r_ids
+		ans_values[rks] = vals
+		ans_indirect = RankIndex(ids=r_ids,ranks=rks)
 		if not orig_id_rank:
 			return ans_direct,ans_indirect,ans_values
 		else:
@@ -49,11 +112,39 @@ class RepoRankGetter(Getter):
 
 	def reorder(self,prev_direct,prev_indirect,prev_values,db,**kwargs):
 		orig_direct,orig_indirect,orig_values = RepoRankGetter(db=db).get(db=db,orig_id_rank=False,**kwargs)
-		reord_values = orig_values.copy()
-		for i,v in enumerate(prev_values):
-			reord_values[orig_indirect[prev_direct[i]]] = v
+		reord_values = orig_values.astype(prev_values.dtype)
+		reord_values[orig_indirect.lookup(prev_direct)] = prev_values
 		return orig_direct,orig_indirect,reord_values
 
+	def get_ids(self,db):
+		db.cursor.execute('SELECT id FROM repositories ORDER BY id;')
+		return np.array([r_id for (r_id,) in db.cursor.fetchall()],dtype=np.int64)
+
+	def rank_from_values(self,ids,values):
+		'''
+		Ranking (ans_d,ans_i,ans_v) from values computed in python, ordered by value DESC and id ASC (as in the SQL queries)
+		'''
+		order = np.lexsort((ids,-values))
+		ans_direct = ids[order]
+		ans_values = values[order].astype(self.values_dtype)
+		ans_indirect = RankIndex(ids=ans_direct)
+		return ans_direct,ans_indirect,ans_values
+
+	def rank_from_results(self,ranks_direct,results,sort_function):
+		'''
+		Ranking (ans_d,ans_i,ans_v) from a list of (rank,result) computed per repository, as in the vaccination getters:
+		ordered by sort_function(result) ASC and rank ASC. Slots without result are left at 0.
+		'''
+		v_rks = np.fromiter((v_rk for v_rk,res in results),dtype=np.int64,count=len(results))
+		sort_values = np.fromiter((sort_function(res) for v_rk,res in results),dtype=np.float64,count=len(results))
+		order = np.lexsort((v_rks,sort_values))
+		ans_direct = np.zeros(ranks_direct.shape,dtype=np.int64)
+		ans_values = np.zeros(ranks_direct.shape,dtype=np.float64)
+		ans_direct[:order.size] = ranks_direct[v_rks[order]]
+		ans_values[:order.size] = sort_values[order]
+		ans_indirect = RankIndex(ids=ans_direct[:order.size])
+		return ans_direct,ans_indirect,ans_values
+
 class RepoRankNameGetter(RepoRankGetter):
 	values_dtype = np.object_
 
@@ -110,9 +201,8 @@ class UserRankGetter(RepoRankGetter):
 
 	def reorder(self,prev_direct,prev_indirect,prev_values,db,**kwargs):
 		orig_direct,orig_indirect,orig_values = UserRankGetter(db=db).get(db=db,orig_id_rank=False,**kwargs)
-		reord_values = orig_values.copy()
-		for i,v in enumerate(prev_values):
-			reord_values[orig_indirect[prev_direct[i]]] = v
+		reord_values = orig_values.astype(prev_values.dtype)
+		reord_values[orig_indirect.lookup(prev_direct)] = prev_values
 		return orig_direct,orig_indirect,reord_values
 
 class RepoStarRank(RepoRankGetter):
@@ -213,6 +303,30 @@ class RepoDepRank(RepoRankGetter):
 
 
 class RepoTransitiveDepRank(RepoDepRank):
+	'''
+	Ranking by number of direct and indirect dependents.
+	By default computed in memory from the repo dependency matrix (see graph_analytics.transitive_counts),
+	in_memory=False uses the recursive SQL query instead.
+	'''
+	def __init__(self,in_memory=True,block_size=2**12,**kwargs):
+		RepoDepRank.__init__(self,**kwargs)
+		self.in_memory = in_memory
+		self.block_size = block_size
+
+	def get(self,db,orig_id_rank=False,deps_mat=None,**kwargs):
+		if not self.in_memory:
+			return RepoDepRank.get(self,db=db,orig_id_rank=orig_id_rank,**kwargs)
+		if deps_mat is None:
+			deps_mat = RepoToRepoDeps(db=db,ref_time=self.ref_time,filter_deps=False).get_result()
+		ids = self.get_ids(db=db)
+		values = graph_analytics.transitive_counts(deps_mat,block_size=self.block_size)
+		# the SQL version counts one row for repos without dependents (LEFT OUTER JOIN)
+		values[values==0] = 1
+		ans_direct,ans_indirect,ans_values = self.rank_from_values(ids=ids,values=values)
+		if not orig_id_rank:
+			return ans_direct,ans_indirect,ans_values
+		else:
+			return self.reorder(prev_direct=ans_direct,prev_indirect=ans_indirect,prev_values=ans_values,db=db,**kwargs)
 
 	def query(self):
 		if self.db.db_type == 'postgres':
@@ -661,27 +775,23 @@ class RepoTransDepDLRank(RepoDLRank):
 
 class RepoDLCorrectionRank(RepoDLRank):
 	'''
-	Ranking (ans_d,ans_i,ans_v) with DL correction. Ranking is corrected in python
+	Ranking (ans_d,ans_i,ans_v) with DL correction. Ranking is corrected in python:
+	the downloads of all direct and indirect dependents of a repo are removed from its own downloads,
+	sweeping once through the dependency DAG (strongly connected components condensed) in topological order.
+
+	The topological structure only depends on the dependency matrix, it is cached at class level
+	and reused by instances with different start_time/end_time.
 	'''
+	deps_structures = {}
+	deps_structures_max = 4
 
 	def get(self,db,dl_correction=True,deps_mat=None,orig_id_rank=False,**kwargs):
-		orig_direct,orig_indirect,dl_vec = RepoDLRank.get(self,db=db,**kwargs)
-
-		ans_indirect = {}
-		ans_direct = np.zeros(dl_vec.shape)
-		ans_values = np.zeros(dl_vec.shape)
+		ids,ids_indirect,dl_vec = RepoDLRank.get(self,db=db,orig_id_rank=True,**kwargs)
 
 		if dl_correction:
-			deps_mat = self.get_deps_mat(deps_mat=deps_mat)
 			dl_vec = self.correct_dls(prevec=dl_vec,deps_mat=deps_mat)
 
-		rk_val_list = sorted(list(zip(orig_direct,dl_vec)),key=lambda x: -x[1])
-
-		for i,rdata in enumerate(rk_val_list):
-			rk,val = rdata
-			ans_direct[i] = rk
-			ans_values[i] = val
-			ans_indirect[rk] = i
+		ans_direct,ans_indirect,ans_values = self.rank_from_values(ids=ids,values=dl_vec)
 
 		if not orig_id_rank:
 			return ans_direct,ans_indirect,ans_values
@@ -691,61 +801,28 @@ class RepoDLCorrectionRank(RepoDLRank):
 	def get_deps_mat(self,deps_mat):
 		if deps_mat is None:
 			deps_mat = RepoToRepoDeps(db=self.db,ref_time=self.ref_time).get_result()
-		deps_mat = deps_mat.astype(np.bool_)
+		deps_mat = sparse.csr_matrix(deps_mat.astype(np.bool_))
+		deps_mat.sort_indices()
 		return deps_mat
 
-	def correct_dls(self,prevec,deps_mat=None):
-		deps_mat = self.get_deps_mat(deps_mat=deps_mat)
-		remaining_dls = prevec
-		for seed_vec in self.get_list_seedvecs(deps_mat=deps_mat):
-			concerned_packages = self.get_concerned_packages(deps_mat=deps_mat,init_vec=seed_vec)
-			# check one seedvec element
-			# check concerned packages for the given package
-			#
-			# print(
-			# 	(concerned_packages.multiply(np.ones((seed_vec.size,)))*seed_vec>0).sum(),
-			# 	(concerned_packages.multiply(seed_vec)*np.ones((seed_vec.size,))>0).sum(),
-			# 	(seed_vec>0).sum())
-			# remaining_dls = remaining_dls - concerned_packages.multiply(seed_vec) * remaining_dls ####
-			remaining_dls = remaining_dls - concerned_packages.multiply(seed_vec) * remaining_dls ####
-			remaining_dls[remaining_dls<0] = 0
-		return remaining_dls
-
-	def get_list_seedvecs(self,deps_mat):
+	def get_deps_structure(self,deps_mat):
 		'''
-		gets a list of binary vectors corresponding to branching order:
-		first vector is roots of the deps network
-		second vector is roots of the deps network when removing first vec
-		n th vector is roots of deps net when removing all vectors up to (n-1)th
-		stopping iterator when all net covered (last item still has non zero values)
+		topological structure of the dependency network, cached by fingerprint of the sparsity pattern
 		'''
-		ndeps_mat = deps_mat.astype(np.bool_).transpose()
-		cols = np.asarray(ndeps_mat.sum(axis=0)).flatten()
-		seed_vec = (cols==0)
-		cumul_seed_vec = seed_vec
-		while seed_vec.any():
-			yield seed_vec
-			cols = ndeps_mat*(1-cumul_seed_vec) #####
-			new_cumul_seed_vec = (cols==0)
-			seed_vec = np.logical_and(new_cumul_seed_vec,1-cumul_seed_vec)
-			cumul_seed_vec = new_cumul_seed_vec
-
-
-	def get_concerned_packages(self,init_vec,deps_mat):
+		key = (deps_mat.shape,hashlib.sha1(deps_mat.indptr.tobytes()+deps_mat.indices.tobytes()).hexdigest())
+		if key not in self.deps_structures:
+			if len(self.deps_structures) >= self.deps_structures_max:
+				del self.deps_structures[next(iter(self.deps_structures))]
+			self.deps_structures[key] = graph_analytics.topological_structure(deps_mat)
+		return self.deps_structures[key]
+
+	def correct_dls(self,prevec,deps_mat=None):
 		'''
-		returns a bool matrix source_packages,concerned_packages.
-		concerned packages are all upstream dependencies of a given package.
+		prevec and deps_mat both indexed by repo rank in id order
 		'''
-		ans = np.zeros((init_vec.size,deps_mat.shape[0],),dtype=np.bool_)
-		p = sparse.diags(init_vec.astype(np.int64)).tocsr().astype(np.bool_)
-		ndeps_mat = deps_mat.astype(np.bool_).transpose()
-		old_size = p.data.size
-		init = True
-		while init or p.data.size != old_size:
-			init = False
-			old_size = p.data.size
-			p = ndeps_mat*p + p
-		return p
+		deps_mat = self.get_deps_mat(deps_mat=deps_mat)
+		structure = self.get_deps_structure(deps_mat=deps_mat)
+		return graph_analytics.transitive_correction(values=prevec,structure=structure)
 
 
 class RepoRandomRank(RepoRankGetter):
@@ -0,0 +1,126 @@
+'''
+Append-only store for the numeric results of vaccination rankings and batch policies, in a side SQLite file.
+Each result (a dict of numbers) is kept as one row: an integer key and a float64 BLOB with one value per column,
+column names being stored once per table. Writes are buffered and committed by batches,
+and a whole table is loaded back at once into numpy arrays.
+
+Several processes can append to the same file (WAL journal, busy timeout), each with its own connection,
+which is reopened when the store is used from a forked or unpickled copy.
+'''
+
+import os
+import json
+import sqlite3
+import numpy as np
+
+
+class ResultStore(object):
+	'''
+	table: name of the table of results; results stored as JSON by previous versions in legacy_table
+	(columns legacy_key,values_dict) are also loaded, without being rewritten.
+	'''
+	def __init__(self,db_file,table,legacy_table=None,legacy_key=None,flush_size=100,timeout=60):
+		self.db_file = db_file
+		self.table = table
+		self.legacy_table = legacy_table
+		self.legacy_key = legacy_key
+		self.flush_size = flush_size
+		self.timeout = timeout
+		self.columns = None
+		self.buffer = []
+		self.connection = None
+		self.pid = None
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['connection'] = None
+		state['buffer'] = []
+		return state
+
+	def connect(self):
+		if self.connection is None or self.pid != os.getpid():
+			if self.pid is not None and self.pid != os.getpid():
+				# connection and buffer inherited from the parent process are left to it
+				self.buffer = []
+			self.connection = sqlite3.connect(self.db_file,timeout=self.timeout)
+			self.pid = os.getpid()
+			self.connection.execute('PRAGMA journal_mode=WAL;')
+			self.connection.execute('''CREATE TABLE IF NOT EXISTS _result_columns(
+										table_name TEXT PRIMARY KEY,
+										columns TEXT NOT NULL);''')
+			self.connection.execute('''CREATE TABLE IF NOT EXISTS {}(
+										key INTEGER PRIMARY KEY,
+										vals BLOB NOT NULL);'''.format(self.table))
+			self.connection.commit()
+		return self.connection
+
+	def get_columns(self):
+		if self.columns is None:
+			ans = self.connect().execute('SELECT columns FROM _result_columns WHERE table_name=?;',(self.table,)).fetchone()
+			if ans is not None:
+				self.columns = json.loads(ans[0])
+		return self.columns
+
+	def set_columns(self,columns):
+		connection = self.connect()
+		connection.execute('INSERT OR IGNORE INTO _result_columns(table_name,columns) VALUES(?,?);',(self.table,json.dumps(columns)))
+		connection.commit()
+		self.columns = None
+		if self.get_columns() != columns:
+			raise ValueError('Columns {} do not match the ones of table {}: {}'.format(columns,self.table,self.get_columns()))
+
+	def append(self,key,val):
+		'''
+		Buffers the result val (dict column:number) for key, written when flush_size results are buffered or on flush()
+		'''
+		self.connect()
+		if self.get_columns() is None:
+			self.set_columns(sorted(val.keys()))
+		elif sorted(val.keys()) != self.columns:
+			raise ValueError('Columns {} do not match the ones of table {}: {}'.format(sorted(val.keys()),self.table,self.columns))
+		self.buffer.append((int(key),np.asarray([val[c] for c in self.columns],dtype='<f8').tobytes()))
+		if len(self.buffer) >= self.flush_size:
+			self.flush()
+
+	def flush(self):
+		if len(self.buffer):
+			connection = self.connect()
+			connection.executemany('INSERT OR IGNORE INTO {}(key,vals) VALUES(?,?);'.format(self.table),self.buffer)
+			connection.commit()
+			self.buffer = []
+
+	def load_arrays(self):
+		'''
+		Returns keys (int64 array), values (float64 array, one row per key) and the list of columns
+		'''
+		self.flush()
+		rows = self.connect().execute('SELECT key,vals FROM {} ORDER BY key;'.format(self.table)).fetchall()
+		columns = self.get_columns()
+		if not len(rows):
+			return np.zeros((0,),dtype=np.int64),np.zeros((0,0 if columns is None else len(columns)),dtype=np.float64),columns
+		keys = np.fromiter((k for k,v in rows),dtype=np.int64,count=len(rows))
+		values = np.frombuffer(b''.join([v for k,v in rows]),dtype='<f8').reshape((len(rows),len(columns)))
+		return keys,values,columns
+
+	def load_legacy(self):
+		if self.legacy_table is None:
+			return {}
+		connection = self.connect()
+		if connection.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;",(self.legacy_table,)).fetchone() is None:
+			return {}
+		return {k:json.loads(v) for k,v in connection.execute('SELECT {},values_dict FROM {};'.format(self.legacy_key,self.legacy_table)).fetchall()}
+
+	def load(self):
+		'''
+		All stored results, as a dict key:result_dict
+		'''
+		ans = self.load_legacy()
+		keys,values,columns = self.load_arrays()
+		ans.update({k:dict(zip(columns,v)) for k,v in zip(keys.tolist(),values.tolist())})
+		return ans
+
+	def close(self):
+		self.flush()
+		if self.connection is not None and self.pid == os.getpid():
+			self.connection.close()
+		self.connection = None
@@ -0,0 +1,64 @@
+'''
+Dynamic scheduling of independent chunks of work on worker processes: chunks are small and queued,
+and each worker takes the next one as soon as it is done with the previous one,
+so that scenarios with expensive cascades do not leave the other workers idle.
+'''
+
+from concurrent.futures import ProcessPoolExecutor,wait,FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing as mp
+import logging
+import math
+
+
+logger = logging.getLogger(__name__)
+
+
+def split_chunks(items,workers,chunk_size=None,chunks_per_worker=4):
+	'''
+	Consecutive chunks of items; by default of a size giving about chunks_per_worker chunks per worker
+	'''
+	items = list(items)
+	if chunk_size is None:
+		chunk_size = max(1,int(math.ceil(len(items)/(workers*chunks_per_worker))))
+	return [items[i:i+chunk_size] for i in range(0,len(items),chunk_size)]
+
+
+def run_chunks(chunks,worker_function,workers,initializer=None,initargs=(),on_result=None,max_restarts=3):
+	'''
+	Calls worker_function(chunk) in worker processes for each of the (picklable) chunks, and returns the results in the order of chunks.
+	initializer(*initargs) is called once in each worker process.
+	on_result(i,result) is called in the parent process as soon as chunk i is done, eg to checkpoint the results.
+
+	When a worker process dies, the results already finished are kept and the remaining chunks are queued again in new worker processes,
+	at most max_restarts times. If the parent is interrupted, the chunks not started yet are cancelled.
+	'''
+	results = {}
+	pending = set(range(len(chunks)))
+	restarts = 0
+	while pending:
+		with ProcessPoolExecutor(max_workers=min(workers,len(pending)),mp_context=mp.get_context(),initializer=initializer,initargs=initargs) as executor:
+			futures = {executor.submit(worker_function,chunks[i]):i for i in sorted(pending)}
+			not_done = set(futures.keys())
+			try:
+				while not_done:
+					done,not_done = wait(not_done,return_when=FIRST_COMPLETED)
+					for future in done:
+						i = futures[future]
+						try:
+							res = future.result()
+						except BrokenProcessPool:
+							continue
+						results[i] = res
+						pending.discard(i)
+						if on_result is not None:
+							on_result(i,res)
+			except BaseException:
+				executor.shutdown(wait=False,cancel_futures=True)
+				raise
+		if pending:
+			restarts += 1
+			if restarts > max_restarts:
+				raise RuntimeError('Worker processes stopped {} times, {} chunks not computed'.format(restarts,len(pending)))
+			logger.warning('A worker process stopped, queuing again {} chunks'.format(len(pending)))
+	return [results[i] for i in range(len(chunks))]
@@ -0,0 +1,82 @@
+'''
+Numpy arrays and scipy sparse matrices placed once in shared memory, and attached read-only by worker processes
+instead of being pickled or deep copied for each of them.
+'''
+
+from multiprocessing import shared_memory
+from scipy import sparse
+import numpy as np
+
+
+class SharedArrays(object):
+	'''
+	Owner side: put() copies arrays and sparse matrices (stored as csr) into shared memory blocks,
+	spec() is a small picklable description to send to the workers, which use attach(spec).
+	close() releases the blocks, once the workers are done with them.
+	'''
+	def __init__(self):
+		self.blocks = []
+		self.specs = {}
+
+	def put_array(self,arr):
+		arr = np.ascontiguousarray(arr)
+		if arr.dtype.hasobject:
+			raise ValueError('Arrays of python objects cannot be shared')
+		shm = shared_memory.SharedMemory(create=True,size=max(1,arr.nbytes))
+		self.blocks.append(shm)
+		np.ndarray(arr.shape,dtype=arr.dtype,buffer=shm.buf)[...] = arr
+		return {'shm_name':shm.name,'dtype':arr.dtype.str,'shape':arr.shape}
+
+	def put(self,name,obj):
+		if sparse.issparse(obj):
+			mat = sparse.csr_matrix(obj,copy=True)
+			# attached matrices are read-only, they have to be canonical beforehand
+			mat.sum_duplicates()
+			self.specs[name] = {'kind':'csr',
+								'shape':mat.shape,
+								'data':self.put_array(mat.data),
+								'indices':self.put_array(mat.indices),
+								'indptr':self.put_array(mat.indptr),
+								}
+		else:
+			self.specs[name] = {'kind':'array','array':self.put_array(np.asarray(obj))}
+
+	def spec(self):
+		return dict(self.specs)
+
+	def close(self):
+		for shm in self.blocks:
+			shm.close()
+			shm.unlink()
+		self.blocks = []
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+
+def attach_array(array_spec,handles):
+	shm = shared_memory.SharedMemory(name=array_spec['shm_name'])
+	handles.append(shm)
+	arr = np.ndarray(array_spec['shape'],dtype=np.dtype(array_spec['dtype']),buffer=shm.buf)
+	arr.setflags(write=False)
+	return arr
+
+
+def attach(spec):
+	'''
+	Worker side: returns a dict name -> read-only array or csr matrix, and the list of shared memory handles,
+	which have to be kept alive as long as the arrays are used.
+	'''
+	handles = []
+	ans = {}
+	for name,s in spec.items():
+		if s['kind'] == 'csr':
+			mat = sparse.csr_matrix((attach_array(s['data'],handles),attach_array(s['indices'],handles),attach_array(s['indptr'],handles)),shape=s['shape'],copy=False)
+			mat.has_canonical_format = True
+			ans[name] = mat
+		else:
+			ans[name] = attach_array(s['array'],handles)
+	return ans,handles
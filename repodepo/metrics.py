@@ -0,0 +1,272 @@
+'''
+Performance metrics of fillers and getters, stored in a side SQLite file (see Database metrics_db_name):
+one row per phase of a filler (prepare, check_requirements, apply) or per getter call, with its duration, CPU time,
+rows written and SQL queries executed (SQLite DBs only), API queries and cost (GraphQL fillers) and peak memory of the process.
+Rows are grouped by run_id, one per fill_db call.
+'''
+
+import os
+import sys
+import time
+import json
+import sqlite3
+import datetime
+import threading
+import contextlib
+
+try:
+	import resource
+except ImportError: # not available on Windows
+	resource = None
+
+
+def peak_rss():
+	'''
+	Peak resident memory of the process in bytes, None if not available
+	'''
+	if resource is None:
+		return None
+	ans = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		return ans
+	else:
+		return ans*1024
+
+
+class QueryCounter(object):
+	'''
+	Number of statements executed on the SQLite connection of a DB inside a with block, through its trace callback.
+	The trace callback of the DB (see Database.set_trace_callback) is still called inside the block, and set back on exit.
+	'''
+	def __init__(self,db):
+		self.db = db
+		self.count = 0
+
+	def __enter__(self):
+		self.connection = self.db.connection
+		self.previous = getattr(self.db,'trace_callback',None)
+		self.db.trace_callback = self.trace
+		self.connection.set_trace_callback(self.trace)
+		return self
+
+	def __exit__(self,*exc):
+		self.db.trace_callback = self.previous
+		try:
+			self.connection.set_trace_callback(self.previous)
+		except sqlite3.ProgrammingError: # connection closed inside the block
+			pass
+		return False
+
+	def trace(self,statement):
+		self.count += 1
+		if self.previous is not None:
+			self.previous(statement)
+
+
+class MetricsStore(object):
+	'''
+	Appends metrics rows to a SQLite file. Usable from several threads (one connection, with a lock)
+	and several processes (WAL journal, busy timeout, connection reopened in forked processes).
+	'''
+	def __init__(self,db_file,timeout=60):
+		self.db_file = db_file
+		self.timeout = timeout
+		self.connection = None
+		self.pid = None
+		self.lock = threading.Lock()
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['connection'] = None
+		state['lock'] = None
+		return state
+
+	def __setstate__(self,state):
+		self.__dict__ = state
+		self.lock = threading.Lock()
+
+	def connect(self):
+		if self.connection is None or self.pid != os.getpid():
+			self.connection = sqlite3.connect(self.db_file,timeout=self.timeout,check_same_thread=False)
+			self.pid = os.getpid()
+			self.connection.execute('PRAGMA journal_mode=WAL;')
+			self.connection.execute('''CREATE TABLE IF NOT EXISTS metrics(
+										id INTEGER PRIMARY KEY,
+										run_id TEXT,
+										kind TEXT NOT NULL,
+										name TEXT NOT NULL,
+										phase TEXT NOT NULL,
+										started_at TIMESTAMP NOT NULL,
+										duration REAL,
+										cpu_time REAL,
+										nb_rows INTEGER,
+										nb_queries INTEGER,
+										api_queries INTEGER,
+										api_cost INTEGER,
+										peak_rss INTEGER,
+										success BOOLEAN,
+										info TEXT);''')
+			self.connection.execute('CREATE INDEX IF NOT EXISTS metrics_idx ON metrics(run_id,kind,name);')
+			self.connection.commit()
+		return self.connection
+
+	def append(self,record):
+		columns = sorted(record.keys())
+		with self.lock:
+			connection = self.connect()
+			connection.execute('INSERT INTO metrics({}) VALUES({});'.format(','.join(columns),','.join('?' for c in columns)),[record[c] for c in columns])
+			connection.commit()
+
+	def get_rows(self,run_id=None,kind=None):
+		'''
+		Metrics rows as dicts, for a run_id and/or a kind ('filler' or 'getter')
+		'''
+		conditions = []
+		params = []
+		if run_id is not None:
+			conditions.append('run_id=?')
+			params.append(run_id)
+		if kind is not None:
+			conditions.append('kind=?')
+			params.append(kind)
+		query = 'SELECT * FROM metrics {} ORDER BY id;'.format('WHERE '+' AND '.join(conditions) if conditions else '')
+		with self.lock:
+			cursor = self.connect().execute(query,params)
+			columns = [c[0] for c in cursor.description]
+			return [dict(zip(columns,r)) for r in cursor.fetchall()]
+
+	def close(self):
+		if self.connection is not None and self.pid == os.getpid():
+			self.connection.close()
+		self.connection = None
+
+
+class Measure(object):
+	'''
+	Measures of one phase, filled when exiting measure().
+	nb_rows can be set inside the block (e.g. size of a getter result) to replace the number of rows changed in the DB.
+	'''
+	def __init__(self):
+		self.nb_rows = None
+		self.info = None
+
+
+def result_size(result):
+	'''
+	Number of elements of a getter result: stored entries of a sparse matrix, rows of a DataFrame, array or list; None otherwise
+	'''
+	if hasattr(result,'nnz'):
+		return result.nnz
+	elif hasattr(result,'shape') and len(result.shape):
+		return result.shape[0]
+	try:
+		return len(result)
+	except TypeError:
+		return None
+
+
+def api_usage(obj):
+	if obj is None or not hasattr(obj,'get_api_usage'):
+		return None
+	return obj.get_api_usage()
+
+@contextlib.contextmanager
+def measure(db,kind,name,phase,api_source=None,count_db_rows=True):
+	'''
+	Context manager recording the metrics of the block in the metrics store of the DB (nothing if the DB has none).
+	api_source: object with a get_api_usage() method returning a dict with api_queries and api_cost (e.g. a GraphQL filler).
+	count_db_rows: whether the rows changed (default of nb_rows when not set inside the block) and the queries executed in the DB are counted (SQLite only),
+	through a trace callback on the connection during the block (see QueryCounter).
+	'''
+	store = getattr(db,'metrics_store',None)
+	if store is None:
+		yield Measure()
+		return
+	m = Measure()
+	connection = db.connection
+	if count_db_rows and db.db_type == 'sqlite' and connection is not None:
+		counter = QueryCounter(db)
+		rows_start = connection.total_changes
+	else:
+		counter = None
+	api_start = api_usage(api_source)
+	started_at = datetime.datetime.now()
+	start = time.perf_counter()
+	cpu_start = time.thread_time()
+	success = False
+	try:
+		with (contextlib.nullcontext() if counter is None else counter):
+			yield m
+		success = True
+	finally:
+		duration = time.perf_counter()-start
+		cpu_time = time.thread_time()-cpu_start
+		if counter is not None and db.connection is connection:
+			nb_rows,nb_queries = connection.total_changes-rows_start,counter.count
+		else:
+			nb_rows,nb_queries = None,None
+		record = {'run_id':getattr(db,'metrics_run_id',None),
+				'kind':kind,
+				'name':name,
+				'phase':phase,
+				'started_at':started_at,
+				'duration':duration,
+				'cpu_time':cpu_time,
+				'nb_rows':m.nb_rows if m.nb_rows is not None else nb_rows,
+				'nb_queries':nb_queries,
+				'peak_rss':peak_rss(),
+				'success':success,
+				'info':None if m.info is None else json.dumps(m.info),
+				}
+		api_end = api_usage(api_source)
+		if api_end is not None:
+			for k in ('api_queries','api_cost'):
+				record[k] = api_end[k]-(0 if api_start is None else api_start[k])
+		try:
+			store.append(record)
+		except sqlite3.Error as e:
+			db.logger.warning('Could not record metrics of {} {}: {}'.format(kind,name,e))
+
+
+def report(db,run_id=None,kind='filler'):
+	'''
+	Summary of the metrics of a run (by default the last fill_db run of the DB), one dict per filler or getter name
+	'''
+	store = getattr(db,'metrics_store',None)
+	if store is None:
+		return []
+	if run_id is None and kind == 'filler':
+		run_id = getattr(db,'metrics_run_id',None)
+	ans = {}
+	for r in store.get_rows(run_id=run_id,kind=kind):
+		elt = ans.setdefault(r['name'],{'name':r['name'],'duration':0.,'cpu_time':0.,'nb_rows':None,'nb_queries':None,'api_queries':None,'api_cost':None,'peak_rss':None,'success':True})
+		elt['duration'] += r['duration']
+		elt['cpu_time'] += r['cpu_time']
+		elt['{}_duration'.format(r['phase'])] = elt.get('{}_duration'.format(r['phase']),0.)+r['duration']
+		for k in ('nb_rows','nb_queries','api_queries','api_cost'):
+			if r[k] is not None:
+				elt[k] = (elt[k] or 0)+r[k]
+		if r['peak_rss'] is not None:
+			elt['peak_rss'] = max(elt['peak_rss'] or 0,r['peak_rss'])
+		elt['success'] = elt['success'] and bool(r['success'])
+	for elt in ans.values():
+		elt['rows_per_s'] = None if elt['nb_rows'] is None or elt['duration'] == 0 else elt['nb_rows']/elt['duration']
+	return list(ans.values())
+
+def format_report(rows):
+	'''
+	Text table of the output of report()
+	'''
+	def fmt(v,pattern):
+		return '-' if v is None else pattern.format(v)
+	lines = ['{:<40} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format('name','duration_s','apply_s','rows','rows_per_s','queries','api_cost','peak_MiB')]
+	for r in rows:
+		lines.append('{:<40} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(r['name'][:40],
+						fmt(r['duration'],'{:.2f}'),
+						fmt(r.get('apply_duration'),'{:.2f}'),
+						fmt(r['nb_rows'],'{}'),
+						fmt(r['rows_per_s'],'{:.0f}'),
+						fmt(r['nb_queries'],'{}'),
+						fmt(r['api_cost'],'{}'),
+						fmt(None if r['peak_rss'] is None else r['peak_rss']/2**20,'{:.0f}')))
+	return '\n'.join(lines)
@@ -6,14 +6,18 @@ import glob
 import shutil
 import uuid
 import time
+import tempfile
 
 import csv
 import copy
 import json
+import hashlib
 import numpy as np
 import io
+from concurrent.futures import ThreadPoolExecutor,wait,FIRST_COMPLETED
 
 from .extras import errors
+from . import metrics
 from .extras.home import homepath
 
 logger = logging.getLogger(__name__)
@@ -95,6 +99,7 @@ class Database(object):
 	The object uses a specific data folder and a list of files used for the fillers, with name, keyword, and potential download link. (move to filler class?)
 
 	A 'computation_db' can be associated to it (always SQLite, can be in memory) to store temporary measures on repositories and users.
+	With metrics_db_name, performance metrics of fillers and getters are recorded in a side SQLite file (see metrics.py).
 	'''
 
 	def __init__(self,
@@ -113,6 +118,7 @@ class Database(object):
 					timeout=5,
 					fallback_db='postgres',
 					computation_db_name='repo_db_computation.db',
+					metrics_db_name=None,
 					reconnect_on_pickling=False):
 		self.reconnect_on_pickling = reconnect_on_pickling
 		self.db_type = db_type
@@ -183,6 +189,7 @@ class Database(object):
 		if do_init:
 			self.init_db()
 		self.fillers = []
+		self.defer_repo_merges = False
 		self.data_folder = data_folder
 		try:
 			os.makedirs(self.data_folder)
@@ -193,6 +200,17 @@ class Database(object):
 			self.computation_db_name = computation_db_name
 		else:
 			self.computation_db_name = os.path.join(self.data_folder,computation_db_name)
+		if metrics_db_name is None:
+			self.metrics_db_name = None
+			self.metrics_store = None
+		else:
+			if metrics_db_name.startswith(':') or os.path.isabs(metrics_db_name):
+				self.metrics_db_name = metrics_db_name
+			else:
+				self.metrics_db_name = os.path.join(self.data_folder,metrics_db_name)
+			self.metrics_store = metrics.MetricsStore(self.metrics_db_name)
+		self.metrics_run_id = None
+		self.trace_callback = None
 		#storing info to be able to copy the db and have independent cursor/connection
 		self.db_conninfo = {
 				'db_type':db_type,
@@ -245,11 +263,24 @@ class Database(object):
 		return self.computation_db
 
 
+	def set_trace_callback(self,callback):
+		'''
+		Trace callback of the SQLite connection, kept while metrics count the queries (see metrics.QueryCounter)
+		'''
+		self.trace_callback = callback
+		if self.db_type == 'sqlite':
+			self.connection.set_trace_callback(callback)
+
 	def copy(self,timeout=30):
 		'''
-		Returns a copy, without init, with independent connection and cursor
+		Returns a copy, without init, with independent connection and cursor.
+		The metrics store and run id are shared with the copy.
 		'''
-		return self.__class__(do_init=False,timeout=timeout,**self.db_conninfo)
+		db = self.__class__(do_init=False,timeout=timeout,data_folder=self.data_folder,metrics_db_name=None,**self.db_conninfo)
+		db.metrics_db_name = self.metrics_db_name
+		db.metrics_store = self.metrics_store
+		db.metrics_run_id = self.metrics_run_id
+		return db
 
 	def init_db(self):
 		'''
@@ -368,43 +399,121 @@ class Database(object):
 			self.connection = psycopg2.connect(**self.db_conninfo)
 		self.cursor = self.connection.cursor() 
 
-	def fill_db(self):
+	def fill_db(self,workers=1,resource_limits=None,timeout=600):
+		'''
+		Runs the queued fillers, including the ones they add to the queue.
+
+		With workers>1, up to workers fillers run at once in threads, each with its own copy of the DB (see copy()).
+		A filler starts when all the fillers queued before it and conflicting with it are done (see Filler.conflicts_with),
+		so that fillers not declaring the tables they use keep running one after the other.
+		resource_limits: dict resource:maximum number of fillers of this resource running at once, e.g. {'network':2,'disk':1}
+		timeout: busy timeout of the SQLite connections of the threads
+		Repository merges planned by fillers are executed once all fillers are done.
+		In-memory SQLite DBs cannot be shared between connections, fillers are then run one after the other.
+		With a metrics store (see metrics_db_name), durations, rows, queries and API cost of each phase of the fillers are recorded under a new metrics_run_id,
+		and summarized in the log at the end (see metrics.report).
+		'''
 		self.connection.commit()
-		for f in self.fillers:
+		self.metrics_run_id = str(uuid.uuid1())
+		if workers > 1 and getattr(self,'in_ram',False):
+			self.logger.info('In-memory SQLite DB, running fillers one after the other')
+			workers = 1
+		if workers == 1:
+			for f in self.fillers:
+				if not f.done:
+					self.run_filler(f)
+				else:
+					self.logger.info('Already filled with filler {}, skipping'.format(f.name))
+		else:
+			self.fill_db_concurrent(workers=workers,resource_limits=resource_limits,timeout=timeout)
+			self.batch_merge_repos()
+		self.connection.commit()
+		if self.metrics_store is not None:
+			self.logger.info('Metrics of fillers (run {}):\n{}'.format(self.metrics_run_id,metrics.format_report(metrics.report(db=self,run_id=self.metrics_run_id))))
+
+	def run_filler(self,f):
+		while not f.done: # condition on f.reexec not needed, present in error handling
+			if f.reexec > 0:
+				self.logger.info('Reexecution of filler {}: {}'.format(f.name,f.reexec))
+			with metrics.measure(db=self,kind='filler',name=f.name,phase='prepare'):
+				f.prepare()
+			self.logger.info('Prepared filler {}'.format(f.name))
 			if not f.done:
-				while not f.done: # condition on f.reexec not needed, present in error handling
-					if f.reexec > 0:
-						self.logger.info('Reexecution of filler {}: {}'.format(f.name,f.reexec))
-					f.prepare()
-					self.logger.info('Prepared filler {}'.format(f.name))
-					if not f.done:
-						try:
-							req = f.check_requirements()
-						except psycopg2.errors.AdminShutdown:
-							# Unexpected behavior blocking these specific queries (no lock, session marked as active, may be specific to the server used)
-							# They have to be shut down manually, but then the whole pipeline has to be restarted.
-							# Quick fix: allow one shutdown
-							self.logger.info('AdminShutdown detected for query, redoing query')
-							self.reconnect()
-							req = f.check_requirements()
-						if not req:
-							raise Exception(f'Requirements not fulfilled for filler: {f.name}')
+				try:
+					with metrics.measure(db=self,kind='filler',name=f.name,phase='check_requirements'):
+						req = f.check_requirements()
+				except psycopg2.errors.AdminShutdown:
+					# Unexpected behavior blocking these specific queries (no lock, session marked as active, may be specific to the server used)
+					# They have to be shut down manually, but then the whole pipeline has to be restarted.
+					# Quick fix: allow one shutdown
+					self.logger.info('AdminShutdown detected for query, redoing query')
+					self.reconnect()
+					req = f.check_requirements()
+				if not req:
+					raise Exception(f'Requirements not fulfilled for filler: {f.name}')
+				else:
+					try:
+						with metrics.measure(db=self,kind='filler',name=f.name,phase='apply',api_source=f):
+							f.apply()
+						f.done = True
+						self.logger.info('Filled with filler {}'.format(f.name))
+					except KeyboardInterrupt:
+						raise
+					except Exception as e:
+						if f.reexec >= f.max_reexec:
+							raise
 						else:
-							try:
-								f.apply()
-								f.done = True
-								self.logger.info('Filled with filler {}'.format(f.name))
-							except KeyboardInterrupt:
-								raise
-							except Exception as e:
-								if f.reexec >= f.max_reexec:
-									raise
-								else:
-									self.logger.info(f'Error during execution of filler {f.name}, triggering reexecution. {e.__class__}: {e}')
-									f.reexec += 1
-			else:
-				self.logger.info('Already filled with filler {}, skipping'.format(f.name))
-		self.connection.commit()
+							self.logger.info(f'Error during execution of filler {f.name}, triggering reexecution. {e.__class__}: {e}')
+							f.reexec += 1
+
+	def run_filler_thread(self,f,timeout=600):
+		'''
+		Runs a filler with its own copy of the DB, sharing the queue of fillers.
+		Repository merges are left to the end of fill_db, not to be executed by several threads at once.
+		'''
+		db = self.copy(timeout=timeout)
+		db.fillers = self.fillers
+		db.defer_repo_merges = True
+		f.db = db
+		try:
+			db.run_filler(f)
+			db.connection.commit()
+		finally:
+			f.db = self
+			db.connection.close()
+
+	def fill_db_concurrent(self,workers,resource_limits=None,timeout=600):
+		if resource_limits is None:
+			resource_limits = {}
+		started = set()
+		finished = set()
+		running = {}
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			while True:
+				# the queue can grow while fillers run, fillers being added at the end
+				for i,f in enumerate(self.fillers):
+					if len(running) >= workers:
+						break
+					if i in started:
+						continue
+					if f.done:
+						self.logger.info('Already filled with filler {}, skipping'.format(f.name))
+						started.add(i)
+						finished.add(i)
+						continue
+					if any(j not in finished and f.conflicts_with(self.fillers[j]) for j in range(i)):
+						continue
+					if f.resource is not None and len([j for j in running.values() if self.fillers[j].resource == f.resource]) >= max(1,resource_limits.get(f.resource,workers)):
+						continue
+					started.add(i)
+					running[executor.submit(self.run_filler_thread,f,timeout)] = i
+				if not running:
+					break
+				done,_ = wait(running.keys(),return_when=FIRST_COMPLETED)
+				for future in done:
+					i = running.pop(future)
+					future.result()
+					finished.add(i)
 
 	def add_filler(self,f):
 		if f.name in [ff.name for ff in self.fillers if ff.unique_name]:
@@ -1807,6 +1916,8 @@ class Database(object):
 		Checks for repo merging processes planned but not done yet (=merged_at is NULL in merged_repositories table)
 		and executes the merges
 		'''
+		if self.defer_repo_merges:
+			return
 		self.cursor.execute('''
 			SELECT id,
 				new_id,
@@ -2276,11 +2387,44 @@ class ComputationDB(object):
 	ADDITIONAL COMPUTATION DB: to store computed results.
 	This is intentionally separated from the main DB, so that computation can be done and stored also when the main DB is not writeable.
 	Also, computation can rely on specific parameters and storing it into the main DB could quickly result in too much data being stored.
+
+	Measures are keyed by name, hash of the params and id of the main DB, and stamped with a version of the source_tables of the main DB
+	(see get_db_version): measures computed on another version are invalidated (their data deleted) when accessed.
+	With max_size (bytes), least recently used measures are evicted after writes, to keep the data under this size (see evict).
+	The SQLite file is in WAL mode, so that several processes can share it.
+
+	Array-valued measures (see write_array, read_array) are stored as .npy files in arrays_folder, indexed in the SQLite file,
+	and read memory-mapped: reading a slice only loads its pages, which are shared between processes reading the same measure.
 	'''
-	def __init__(self,db):
+
+	source_tables = ('repositories','users','identities','merged_identities','merged_repositories','commits','commit_repos',
+					'packages','package_versions','package_dependencies','package_version_downloads','stars','forks','followers',
+					'table_updates','full_updates')
+
+	# seconds between two updates of the last use of a measure (see touch)
+	touch_interval = 60
+	# evictions go down to this fraction of max_size, so that the next writes do not trigger another one
+	evict_target = 0.8
+
+	def __init__(self,db,max_size=None,source_tables=None,timeout=60,arrays_folder=None):
 		self.orig_db = db
-		self.connection = sqlite3.connect(self.orig_db.computation_db_name)
+		self.max_size = max_size
+		if arrays_folder is not None:
+			self.arrays_folder = arrays_folder
+		elif self.orig_db.computation_db_name.startswith(':'):
+			self.arrays_folder = tempfile.mkdtemp(prefix='computation_arrays_')
+		else:
+			self.arrays_folder = self.orig_db.computation_db_name+'_arrays'
+		if source_tables is not None:
+			self.source_tables = tuple(source_tables)
+		self.connection = sqlite3.connect(self.orig_db.computation_db_name,timeout=timeout)
 		self.cursor = self.connection.cursor()
+		# only taken into account when creating the file
+		self.cursor.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+		if not self.orig_db.computation_db_name.startswith(':'):
+			self.cursor.execute('PRAGMA journal_mode=WAL;')
+		# for the ON DELETE CASCADE of the data tables
+		self.cursor.execute('PRAGMA foreign_keys=ON;')
 		self.orig_db.cursor.execute('''SELECT info_content FROM _dbinfo WHERE info_type='uuid';''')
 		self.db_id = self.orig_db.cursor.fetchone()[0]
 		CP_DBINIT = '''
@@ -2314,10 +2458,135 @@ class ComputationDB(object):
 
 				CREATE INDEX IF NOT EXISTS user_idx2 ON data_users(measure,measured_at,obj_id);
 
+				CREATE TABLE IF NOT EXISTS data_arrays(
+				measure INTEGER PRIMARY KEY REFERENCES measures(id) ON DELETE CASCADE,
+				file TEXT NOT NULL,
+				dtype TEXT NOT NULL,
+				shape TEXT NOT NULL,
+				nb_bytes INTEGER NOT NULL
+				);
+
 				'''
 		for q in CP_DBINIT.split(';')[:-1]:
 			self.cursor.execute(q)
+		# columns added to measures tables of previous versions
+		self.cursor.execute('PRAGMA table_info(measures);')
+		existing_columns = [r[1] for r in self.cursor.fetchall()]
+		for col,col_type in (('params_hash','TEXT'),('db_version','TEXT'),('last_used_at','TIMESTAMP'),('nb_rows','INTEGER DEFAULT 0')):
+			if col not in existing_columns:
+				self.cursor.execute('ALTER TABLE measures ADD COLUMN {} {};'.format(col,col_type))
+		self.cursor.execute('CREATE INDEX IF NOT EXISTS measures_hash_idx ON measures(db_id,name,params_hash);')
+		self.connection.commit()
+		self.refresh_db_version()
+
+	def get_db_version(self):
+		'''
+		Stamp of the current content of the source tables of the main DB: hash of their numbers of rows (sqlite: max rowid,
+		postgres: cumulated inserted/updated/deleted rows from the statistics collector) and of the last filler updates.
+		On SQLite, deletions and updates not followed by an insert or a filler update are not detected (COUNT(*) would scan the tables).
+		'''
+		stamp = []
+		if self.orig_db.db_type == 'postgres':
+			self.orig_db.cursor.execute('''SELECT relname,n_tup_ins,n_tup_upd,n_tup_del FROM pg_stat_user_tables
+								WHERE schemaname=(SELECT current_schema()) AND relname IN %(tables)s ORDER BY relname;''',{'tables':tuple(self.source_tables)})
+			stamp += [list(r) for r in self.orig_db.cursor.fetchall()]
+		else:
+			for table in sorted(self.source_tables):
+				self.orig_db.cursor.execute('SELECT MAX(rowid) FROM {};'.format(table))
+				stamp.append([table]+list(self.orig_db.cursor.fetchone()))
+		for table in ('table_updates','full_updates'):
+			self.orig_db.cursor.execute('SELECT MAX(updated_at) FROM {};'.format(table))
+			stamp.append([table,str(self.orig_db.cursor.fetchone()[0])])
+		return hashlib.sha1(json.dumps(stamp,default=str).encode()).hexdigest()
+
+	def refresh_db_version(self):
+		'''
+		To be called when the main DB changed during the session, so that stale measures get invalidated
+		'''
+		self.db_version = self.get_db_version()
+
+	def params_hash(self,params):
+		return hashlib.sha1(self.format_params(params).encode()).hexdigest()
+
+	def invalidate(self,measure_id):
+		'''
+		Deletes the data of a measure, and marks it as not completed for the current DB version
+		'''
+		for table_name in ('repositories','users'):
+			self.cursor.execute('DELETE FROM data_{} WHERE measure=?;'.format(table_name),(measure_id,))
+		self.cursor.execute('SELECT file FROM data_arrays WHERE measure=?;',(measure_id,))
+		ans = self.cursor.fetchone()
+		if ans is not None:
+			self.cursor.execute('DELETE FROM data_arrays WHERE measure=?;',(measure_id,))
+			if os.path.exists(os.path.join(self.arrays_folder,ans[0])):
+				os.remove(os.path.join(self.arrays_folder,ans[0]))
+		self.cursor.execute('UPDATE measures SET completed_at=NULL,nb_rows=0,db_version=? WHERE id=?;',(self.db_version,measure_id))
+
+	def touch(self,measure_id):
+		'''
+		Marks the measure as used, for evict(). Skipped when marked less than touch_interval seconds ago,
+		so that reading a measure usually does not take the write lock of the SQLite file.
+		'''
+		self.cursor.execute('''SELECT 1 FROM measures WHERE id=? AND (last_used_at IS NULL OR last_used_at<datetime('now',?));''',
+							(measure_id,'-{} seconds'.format(self.touch_interval)))
+		if self.cursor.fetchone() is not None:
+			self.cursor.execute('UPDATE measures SET last_used_at=CURRENT_TIMESTAMP WHERE id=?;',(measure_id,))
+
+	def data_size(self):
+		'''
+		Bytes used in the SQLite file (free pages left by deleted data excluded)
+		'''
+		self.cursor.execute('PRAGMA page_size;')
+		page_size = self.cursor.fetchone()[0]
+		self.cursor.execute('PRAGMA page_count;')
+		page_count = self.cursor.fetchone()[0]
+		self.cursor.execute('PRAGMA freelist_count;')
+		return page_size*(page_count - self.cursor.fetchone()[0])
+
+	def evict(self,keep=()):
+		'''
+		When the data is over max_size, deletes least recently used measures (except keep) until it is under evict_target*max_size,
+		estimating the size of a measure from its number of rows, plus the size of its array if any
+		'''
+		if self.max_size is None:
+			return
+		rows_size = self.data_size()
+		self.cursor.execute('SELECT COALESCE(SUM(nb_bytes),0) FROM data_arrays;')
+		size = rows_size + self.cursor.fetchone()[0]
+		if size <= self.max_size:
+			return
+		self.cursor.execute('SELECT COALESCE(SUM(nb_rows),0) FROM measures;')
+		total_rows = self.cursor.fetchone()[0]
+		row_size = rows_size/total_rows if total_rows else 0.
+		self.cursor.execute('''SELECT m.id,m.nb_rows,COALESCE(a.nb_bytes,0) FROM measures m
+							LEFT OUTER JOIN data_arrays a ON a.measure=m.id
+							WHERE m.nb_rows>0 OR a.measure IS NOT NULL
+							ORDER BY COALESCE(m.last_used_at,m.created_at),m.id;''')
+		to_evict = []
+		for measure_id,nb_rows,nb_bytes in self.cursor.fetchall():
+			if size <= self.evict_target*self.max_size:
+				break
+			if measure_id in keep:
+				continue
+			to_evict.append(measure_id)
+			size -= nb_rows*row_size + nb_bytes
+		for measure_id in to_evict:
+			self.invalidate(measure_id)
 		self.connection.commit()
+		if len(to_evict):
+			logger.info('Evicted {} measures from computation DB'.format(len(to_evict)))
+			self.vacuum()
+
+	def vacuum(self):
+		'''
+		Gives the free pages left by deleted data back to the file system, with an incremental vacuum (only moving and truncating free pages).
+		Files created before auto_vacuum=INCREMENTAL was set are left as is, their free pages being reused by the next writes.
+		'''
+		try:
+			# executescript runs the pragma to completion, execute would free only one page
+			self.connection.executescript('PRAGMA incremental_vacuum;')
+		except sqlite3.OperationalError as e:
+			logger.info('Could not vacuum computation DB: {}'.format(e))
 
 
 	def get_measure_id(self,measure=None,params=None,check=False,create_if_absent=True):
@@ -2330,16 +2599,26 @@ class ComputationDB(object):
 			return measure
 		else:
 			params = self.format_params(params)
-			self.cursor.execute('SELECT id FROM measures WHERE name=? AND params=? AND db_id=?;',(measure,params,self.db_id))
+			params_hash = self.params_hash(params)
+			self.cursor.execute('SELECT id,db_version FROM measures WHERE name=? AND params_hash=? AND db_id=?;',(measure,params_hash,self.db_id))
 			ans = self.cursor.fetchone()
+			if ans is None:
+				# measures created by previous versions, without hash
+				self.cursor.execute('SELECT id,db_version FROM measures WHERE name=? AND params=? AND db_id=?;',(measure,params,self.db_id))
+				ans = self.cursor.fetchone()
+				if ans is not None:
+					self.cursor.execute('UPDATE measures SET params_hash=? WHERE id=?;',(params_hash,ans[0]))
 			if ans is None:
 				if not create_if_absent:
 					raise ValueError('(db_id {}) No such measure in computation_db: {}, {}'.format(self.db_id,measure,params))
 				else:
-					self.cursor.execute('INSERT INTO measures(name,params,db_id) VALUES(?,?,?);',(measure,params,self.db_id))
+					self.cursor.execute('INSERT INTO measures(name,params,params_hash,db_id,db_version) VALUES(?,?,?,?,?);',(measure,params,params_hash,self.db_id,self.db_version))
 					row_id = self.cursor.lastrowid
 					return row_id
 			else:
+				if ans[1] != self.db_version:
+					logger.info('Measure {} computed on another version of the DB, invalidating it'.format(measure))
+					self.invalidate(ans[0])
 				return ans[0]
 
 	def format_params(self,params):
@@ -2402,7 +2681,10 @@ class ComputationDB(object):
 					'''.format(table_name)
 					,(measure_id,start_time,end_time,obj_id))
 
-			return self.cursor.fetchall()
+			ans = self.cursor.fetchall()
+			self.touch(measure_id)
+			self.connection.commit()
+			return ans
 
 
 	def batch_write(self,table_name,measure,params=None,data=None,autocommit=True):
@@ -2421,22 +2703,69 @@ class ComputationDB(object):
 				,( (measure_id,oid,measured_at,val) for (oid,measured_at,val) in data))
 			if self.cursor.rowcount > 0:
 				self.cursor.execute('''
-					UPDATE measures SET completed_at=CURRENT_TIMESTAMP
+					UPDATE measures SET completed_at=CURRENT_TIMESTAMP,last_used_at=CURRENT_TIMESTAMP,nb_rows=nb_rows+?
 					WHERE id=?
-					;''',(measure_id,))
+					;''',(self.cursor.rowcount,measure_id,))
 
 			if autocommit:
 				self.connection.commit()
+				self.evict(keep=(measure_id,))
 
 	def is_completed(self,measure=None,params=None):
 		if isinstance(measure,int):
-			self.cursor.execute('SELECT completed_at FROM measures WHERE id=? AND completed_at IS NOT NULL;',(measure,))
+			self.cursor.execute('SELECT completed_at FROM measures WHERE id=? AND completed_at IS NOT NULL AND db_version=?;',(measure,self.db_version))
 		else:
 			params = self.format_params(params)
-			self.cursor.execute('SELECT completed_at FROM measures WHERE name=? AND params=? AND db_id=? AND completed_at IS NOT NULL;',(measure,params,self.db_id))
+			self.cursor.execute('SELECT completed_at FROM measures WHERE name=? AND params_hash=? AND db_id=? AND completed_at IS NOT NULL AND db_version=?;',(measure,self.params_hash(params),self.db_id,self.db_version))
 		ans = self.cursor.fetchone()
 		if ans is None:
 			return False
 		else:
 			return True
 
+	def write_array(self,measure,arr,params=None,autocommit=True):
+		'''
+		Stores a numpy array (numeric dtype) as the value of the measure, replacing any previous one
+		'''
+		measure_id = self.get_measure_id(measure=measure,params=params)
+		arr = np.ascontiguousarray(arr)
+		if arr.dtype.hasobject:
+			raise ValueError('Arrays of python objects cannot be stored: {}'.format(measure))
+		if not os.path.exists(self.arrays_folder):
+			os.makedirs(self.arrays_folder,exist_ok=True)
+		filename = '{}.npy'.format(measure_id)
+		tmp_path = os.path.join(self.arrays_folder,'{}.tmp{}'.format(filename,os.getpid()))
+		with open(tmp_path,'wb') as f:
+			np.save(f,arr)
+		# readers keep the previous file mapped until they close it
+		os.replace(tmp_path,os.path.join(self.arrays_folder,filename))
+		self.cursor.execute('''INSERT OR REPLACE INTO data_arrays(measure,file,dtype,shape,nb_bytes) VALUES(?,?,?,?,?);''',
+							(measure_id,filename,arr.dtype.str,json.dumps(arr.shape),arr.nbytes))
+		self.cursor.execute('''
+			UPDATE measures SET completed_at=CURRENT_TIMESTAMP,last_used_at=CURRENT_TIMESTAMP
+			WHERE id=?
+			;''',(measure_id,))
+		if autocommit:
+			self.connection.commit()
+			self.evict(keep=(measure_id,))
+
+	def read_array(self,measure,params=None,rows=None,cols=None,mmap=True):
+		'''
+		Array stored for the measure (None if absent), read-only and memory-mapped by default.
+		rows and cols (slices or index arrays) select a part of it, only the corresponding pages are read from disk.
+		'''
+		measure_id = self.get_measure_id(measure=measure,params=params)
+		self.cursor.execute('SELECT file FROM data_arrays WHERE measure=?;',(measure_id,))
+		ans = self.cursor.fetchone()
+		if ans is None:
+			self.connection.commit()
+			return None
+		arr = np.load(os.path.join(self.arrays_folder,ans[0]),mmap_mode='r' if mmap else None)
+		if rows is not None:
+			arr = arr[rows]
+		if cols is not None:
+			arr = arr[:,cols]
+		self.touch(measure_id)
+		self.connection.commit()
+		return arr
+
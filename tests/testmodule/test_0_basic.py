@@ -1,4 +1,6 @@
 import os
+import sys
+import subprocess
 import importlib
 
 def test_basic():
@@ -12,3 +14,19 @@ def test_import():
 	libname = file_content.split('setup(')[1].split("name='")[1].split("'")[0]
 	importlib.import_module(libname)
 
+
+def test_import_light():
+	'''
+	Importing the package should not load the dependencies of fillers and getters
+	(psycopg2 and psycopg2.extras are needed by repo_database, for the adapters of PostgreSQL)
+	'''
+	path = os.path.abspath(__file__)
+	dir_name = os.path.dirname(os.path.dirname(os.path.dirname(path)))
+	code = '''
+import sys
+import repodepo
+heavy = sorted(m for m in ('pandas','scipy','networkx','pygit2','git','github','gql','aiohttp','requests','sh','openpyxl') if m in sys.modules)
+assert heavy == [], heavy
+'''
+	ans = subprocess.run([sys.executable,'-c',code],cwd=dir_name,capture_output=True)
+	assert ans.returncode == 0, ans.stderr.decode()
@@ -4,6 +4,7 @@ import pytest
 import datetime
 import time
 import os
+import numpy as np
 
 #### Parameters
 dbtype_list = [
@@ -83,3 +84,138 @@ def test_ram(testdb):
 	testdb.submit_download_attempt(source='GitHub',owner='test',repo='test',success=False)
 	testdb.submit_download_attempt(source='GitHub',owner='test',repo='test',success=True)
 	testdb.move_to_RAM()
+
+def test_computation_db(tmp_path):
+	db = repodepo.repo_database.Database(db_name='test_computation',db_folder=str(tmp_path),data_folder=str(tmp_path))
+	db.init_db()
+	cdb = repodepo.repo_database.ComputationDB(db=db)
+	data = [(1,datetime.date(2020,1,1),1.5),(2,datetime.date(2020,1,1),2.5)]
+	cdb.batch_write(table_name='repositories',measure='m1',params={'a':1},data=data)
+	assert cdb.is_completed(measure='m1',params={'a':1})
+	assert not cdb.is_completed(measure='m1',params={'a':2})
+	assert len(cdb.read(measure='m1',table_name='repositories',params={'a':1})) == 2
+
+	# shared with another instance, until the main DB changes
+	cdb2 = repodepo.repo_database.ComputationDB(db=db)
+	assert len(cdb2.read(measure='m1',table_name='repositories',params={'a':1})) == 2
+	db.cursor.execute('''INSERT INTO sources(name) VALUES('test_source');''')
+	db.cursor.execute('''INSERT INTO repositories(source,owner,name) VALUES(1,'o','n');''')
+	db.connection.commit()
+	cdb2.refresh_db_version()
+	assert not cdb2.is_completed(measure='m1',params={'a':1})
+	assert len(cdb2.read(measure='m1',table_name='repositories',params={'a':1})) == 0
+
+	# eviction of least recently used measures
+	cdb3 = repodepo.repo_database.ComputationDB(db=db,max_size=10**5)
+	for i in range(5):
+		cdb3.batch_write(table_name='users',measure='m{}'.format(i),data=[(k,datetime.date(2020,1,1),k*1.) for k in range(1000)])
+	assert cdb3.is_completed(measure='m4')
+	assert not cdb3.is_completed(measure='m0')
+	assert cdb3.data_size() <= 2*10**5
+	# no free pages left in the file after eviction
+	cdb3.cursor.execute('PRAGMA freelist_count;')
+	assert cdb3.cursor.fetchone()[0] == 0
+	# reading again a recently used measure does not write
+	changes = cdb3.connection.total_changes
+	cdb3.read(measure='m4',table_name='users')
+	assert cdb3.connection.total_changes == changes
+	db.connection.close()
+
+def test_computation_db_arrays(tmp_path):
+	db = repodepo.repo_database.Database(db_name='test_computation',db_folder=str(tmp_path),data_folder=str(tmp_path))
+	db.init_db()
+	cdb = repodepo.repo_database.ComputationDB(db=db,max_size=2*10**5)
+	arr = np.arange(20000,dtype=np.float64).reshape((200,100))
+	assert cdb.read_array(measure='arr',params={'a':1}) is None
+	cdb.write_array(measure='arr',params={'a':1},arr=arr)
+	ans = cdb.read_array(measure='arr',params={'a':1})
+	assert isinstance(ans,np.memmap) and not ans.flags.writeable
+	assert (ans == arr).all()
+	assert (cdb.read_array(measure='arr',params={'a':1},rows=slice(10,12),cols=[3,5]) == arr[10:12][:,[3,5]]).all()
+	cdb.write_array(measure='arr',params={'a':1},arr=2*arr)
+	assert (cdb.read_array(measure='arr',params={'a':1},rows=7,mmap=False) == 2*arr[7]).all()
+	# evicted by a more recent one
+	cdb.write_array(measure='arr2',arr=arr)
+	assert cdb.read_array(measure='arr',params={'a':1}) is None
+	assert len(os.listdir(cdb.arrays_folder)) == 1
+	db.connection.close()
+
+class SleepFiller(repodepo.fillers.Filler):
+	def __init__(self,log,duration=0.3,queued=None,**kwargs):
+		self.log = log
+		self.duration = duration
+		self.queued = queued
+		repodepo.fillers.Filler.__init__(self,**kwargs)
+
+	def prepare(self):
+		if self.queued is not None:
+			self.db.add_filler(self.queued)
+
+	def apply(self):
+		self.log.append(('start',self.name))
+		time.sleep(self.duration)
+		self.log.append(('end',self.name))
+
+def test_fill_db_concurrent(tmp_path):
+	db = repodepo.repo_database.Database(db_name='test_fill_db',db_folder=str(tmp_path),data_folder=str(tmp_path))
+	db.init_db()
+	log = []
+	db.add_filler(SleepFiller(log=log,name='a',reads=(),writes=('stars',)))
+	db.add_filler(SleepFiller(log=log,name='b',reads=(),writes=('followers',),resource='network'))
+	db.add_filler(SleepFiller(log=log,name='c',reads=('stars',),writes=('forks',),resource='network'))
+	db.add_filler(SleepFiller(log=log,name='d',queued=SleepFiller(log=log,name='f',reads=(),writes=('issues',))))
+	db.add_filler(SleepFiller(log=log,name='e',reads=(),writes=('releases',)))
+	db.fill_db(workers=3,resource_limits={'network':1})
+	pos = {(event,name):i for i,(event,name) in enumerate(log)}
+	assert len(pos) == 12
+	# independent fillers overlap, dependent ones and the ones of a limited resource wait
+	assert pos['start','b'] < pos['end','a']
+	assert pos['end','a'] < pos['start','c'] and pos['end','b'] < pos['start','c']
+	# fillers without declared tables run alone
+	assert max(pos['end',n] for n in 'abc') < pos['start','d'] < pos['end','d'] < pos['start','e']
+	assert pos['start','f'] < pos['end','e']
+	assert all(f.done and f.db is db for f in db.fillers)
+	db.connection.close()
+
+
+class RowsFiller(repodepo.fillers.Filler):
+	def __init__(self,nb_rows,**kwargs):
+		self.nb_rows = nb_rows
+		repodepo.fillers.Filler.__init__(self,**kwargs)
+
+	def apply(self):
+		self.db.register_source(source='MetricsSource')
+		for i in range(self.nb_rows):
+			self.db.register_repo(source='MetricsSource',owner='owner',repo='repo{}'.format(i))
+
+def test_fill_db_metrics(tmp_path):
+	db = repodepo.repo_database.Database(db_name='test_metrics',db_folder=str(tmp_path),data_folder=str(tmp_path),metrics_db_name='metrics.db')
+	db.init_db()
+	traced = []
+	db.set_trace_callback(traced.append)
+	db.add_filler(RowsFiller(nb_rows=10,name='rows'))
+	db.fill_db()
+	rows = db.metrics_store.get_rows(run_id=db.metrics_run_id)
+	assert [r['phase'] for r in rows] == ['prepare','check_requirements','apply']
+	apply_row = rows[-1]
+	assert apply_row['kind'] == 'filler' and apply_row['name'] == 'rows' and apply_row['success']
+	assert apply_row['nb_rows'] == 11
+	assert apply_row['nb_queries'] >= 11
+	# trace callback of the DB kept while counting, and set back after
+	assert len(traced) >= apply_row['nb_queries']
+	assert db.trace_callback == traced.append
+	assert apply_row['duration'] >= 0 and apply_row['api_cost'] is None
+	report = repodepo.metrics.report(db=db)
+	assert len(report) == 1 and report[0]['nb_rows'] == 11
+	assert 'rows' in repodepo.metrics.format_report(report)
+
+	repodepo.getters.generic_getters.RepoNames(db=db).get_result()
+	getter_rows = repodepo.metrics.report(db=db,kind='getter')
+	assert getter_rows[0]['name'] == 'RepoNames' and getter_rows[0]['nb_rows'] == 10
+	assert getter_rows[0]['nb_queries'] is None
+	db.connection.close()
+
+	# no metrics by default
+	db = repodepo.repo_database.Database(db_name='test_metrics',db_folder=str(tmp_path),data_folder=str(tmp_path))
+	assert db.metrics_store is None
+	db.connection.close()
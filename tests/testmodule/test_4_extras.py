@@ -1,7 +1,8 @@
 
 import repodepo
 from repodepo.fillers import generic,commit_info,github_gql,meta_fillers,bot_fillers
-from repodepo.extras import anonymize,exports,errors,stats,anonymization
+from repodepo.extras import anonymize,exports,errors,stats,anonymization,columnar,synthetic,benchmark
+from repodepo.getters import edge_getters
 import pytest
 import datetime
 import time
@@ -97,6 +98,96 @@ def test_autoexport(testdb):
 def test_export(testdb,dest_db):
 	exports.export(orig_db=testdb,dest_db=dest_db)
 
+def test_copy_stream():
+	rows = [(1,'a\tb\\c\nd',None,True,datetime.datetime(2020,1,2,3,4,5),b'\x00\xff',{'k':'v'})]*3
+	line = '1\ta\\tb\\\\c\\nd\t\\N\tt\t2020-01-02 03:04:05\t\\\\x00ff\t{"k": "v"}\n'
+	stream = exports.CopyStream(rows)
+	chunks = []
+	while True:
+		chunk = stream.read(10)
+		if not chunk:
+			break
+		assert len(chunk) <= 10
+		chunks.append(chunk)
+	assert ''.join(chunks) == 3*line
+
+def test_export_parquet(testdb,tmp_path):
+	pq = pytest.importorskip('pyarrow.parquet')
+	columnar.export_parquet(db=testdb,output_folder=str(tmp_path),tables=['commits','repositories'],batch_size=5)
+	testdb.cursor.execute('SELECT COUNT(*) FROM commits;')
+	assert pq.read_table(str(tmp_path/'tables'/'commits'),columns=['sha']).num_rows == testdb.cursor.fetchone()[0]
+	assert os.path.exists(str(tmp_path/'getters'/'repo_to_repo_deps'))
+
+def test_table_data_keyset(testdb):
+	columns = exports.get_tables_info(testdb)['commits']
+	full = sorted(exports.get_table_data(table='commits',columns=columns,db=testdb))
+	assert sorted(exports.get_table_data(table='commits',columns=columns,db=testdb,batch_size=3,use_multiqueries=True)) == full
+	key = exports.get_table_key(table='commits',columns=columns,db=testdb)
+	ranges = exports.get_key_ranges(table='commits',db=testdb,key=key,nb_ranges=3)
+	parts = [list(exports.get_table_data(table='commits',columns=columns,db=testdb,batch_size=3,use_multiqueries=True,key=key,key_range=r)) for r in ranges]
+	assert sorted(sum(parts,[])) == full
+
+@pytest.mark.timeout(30)
+def test_export_resume(testdb,dest_db,monkeypatch):
+	# a few commits of our own, so that the interrupted export below always has rows to resume from
+	seeded = ['export_resume_{}'.format(k) for k in range(5)]
+	for sha in seeded:
+		if testdb.db_type == 'postgres':
+			testdb.cursor.execute('INSERT INTO commits(sha) VALUES(%s) ON CONFLICT DO NOTHING;',(sha,))
+		else:
+			testdb.cursor.execute('INSERT OR IGNORE INTO commits(sha) VALUES(?);',(sha,))
+	testdb.connection.commit()
+	try:
+		exports.export(orig_db=testdb,dest_db=dest_db,batch_size=3,workers=2)
+		testdb.cursor.execute('SELECT COUNT(*),MIN(id) FROM commits;')
+		nb_commits,min_id = testdb.cursor.fetchone()
+		assert nb_commits >= len(seeded)
+		dest_db.cursor.execute('SELECT COUNT(*) FROM commits;')
+		assert dest_db.cursor.fetchone()[0] == nb_commits
+		assert exports.get_export_progress(db=dest_db,table='commits') == 'done'
+
+		# interrupted export of the commits table, after the first one
+		dest_db.cursor.execute('DELETE FROM commits WHERE id > {};'.format(min_id))
+		dest_db.cursor.execute("DELETE FROM _dbinfo WHERE info_type='finished_exported_from';")
+		exports.set_export_progress(db=dest_db,table='commits',progress=min_id)
+		dest_db.connection.commit()
+		exports.export(orig_db=testdb,dest_db=dest_db,batch_size=3)
+		dest_db.cursor.execute('SELECT COUNT(*) FROM commits;')
+		assert dest_db.cursor.fetchone()[0] == nb_commits
+
+		# interrupted export of a table without key, exported one table at a time: exported again from the start when resuming
+		dest_db.cursor.execute('DELETE FROM commits;')
+		dest_db.cursor.execute("DELETE FROM _dbinfo WHERE info_type IN ('finished_exported_from','export_progress_commits');")
+		dest_db.connection.commit()
+		get_table_key = exports.get_table_key
+		insert_table_data = exports.insert_table_data
+		def failing_insert(table,**kwargs):
+			insert_table_data(table=table,**kwargs)
+			if table == 'commits':
+				raise RuntimeError('interrupted export')
+		monkeypatch.setattr(exports,'get_table_key',lambda table,**kwargs: [] if table == 'commits' else get_table_key(table=table,**kwargs))
+		monkeypatch.setattr(exports,'insert_table_data',failing_insert)
+		with pytest.raises(RuntimeError):
+			exports.export(orig_db=testdb,dest_db=dest_db,batch_size=3)
+		monkeypatch.setattr(exports,'insert_table_data',insert_table_data)
+		# connection closed by export on errors
+		resumed_db = dest_db.copy()
+		try:
+			assert exports.get_export_progress(db=resumed_db,table='commits') == 'started'
+			assert not exports.is_table_exported(dest_db=resumed_db,table='commits')
+			exports.export(orig_db=testdb,dest_db=resumed_db,batch_size=3)
+			resumed_db.cursor.execute('SELECT COUNT(*) FROM commits;')
+			assert resumed_db.cursor.fetchone()[0] == nb_commits
+		finally:
+			resumed_db.connection.close()
+	finally:
+		for sha in seeded:
+			if testdb.db_type == 'postgres':
+				testdb.cursor.execute('DELETE FROM commits WHERE sha=%s;',(sha,))
+			else:
+				testdb.cursor.execute('DELETE FROM commits WHERE sha=?;',(sha,))
+		testdb.connection.commit()
+
 # @pytest.mark.timeout(30)
 # def test_dump(testdb):
 # 	try:
@@ -142,6 +233,19 @@ def test_export(testdb,dest_db):
 def test_stats(testdb):
 	stats.GlobalStats(db=testdb)
 
+def test_deps_stats(testdb):
+	s = stats.DepsStats(db=testdb,limit=100) # deprecated, ignored
+	s.get_result()
+	for space in ('packagespace','repospace'):
+		for variant in ('','_timestamp'):
+			assert s.results[space+variant+'_filtered']['nb_links'] <= s.results[space+variant]['nb_links']
+			# keys of the previous versions
+			for k in ('nb_cycles','maxlen_cycle','cycle_detection_stopped'):
+				assert k in s.results[space+variant]['cycles']
+	for filter_deps,network in ((False,s.network_r_timestamp),(True,s.network_r_filtered_timestamp)):
+		mat = edge_getters.RepoToRepoDeps(db=testdb,ref_time=s.timestamp,filter_deps=filter_deps).get_result(raw_result=True)
+		assert set(map(tuple,network.tolist())) == set((r['repo_id'],r['dep_id']) for r in mat)
+
 @pytest.mark.timeout(20)
 def test_anonymize_emails(dest_db_exported):
 	anonymization.anonymize_emails(db=dest_db_exported)
@@ -169,9 +273,29 @@ def test_anonymize_emails(dest_db_exported):
 
 	assert ans == []
 
+def test_hash_values():
+	values = ['login{}'.format(i) for i in range(10)]+['name@example.org']
+	expected = [(v,anonymization.modify(old_id=v,salt='salt')) for v in values]
+	assert list(anonymization.hash_values(values=values,salt='salt',chunk_size=3)) == expected
+	assert list(anonymization.hash_values(values=values,salt='salt',chunk_size=3,workers=2)) == expected
+	assert expected[-1][1].endswith('@example.org')
+
+@pytest.mark.parametrize('keep_email_suffixes',[True,False])
+def test_anonymize_workers(tmp_path,keep_email_suffixes):
+	db = repodepo.repo_database.Database(db_name='test_anonymize',db_folder=str(tmp_path),data_folder=str(tmp_path))
+	meta_filler = anonymization.AnonymizationMetaFiller(salt='salt',keep_email_suffixes=keep_email_suffixes,workers=3)
+	db.add_filler(meta_filler)
+	meta_filler.prepare()
+	hashing_fillers = [f for f in db.fillers if isinstance(f,anonymization.AnonymizationFiller) and not isinstance(f,anonymization.NullifyFiller)]
+	assert len(hashing_fillers) == 3 and all(f.workers == 3 for f in hashing_fillers)
+	db.connection.close()
+
 @pytest.mark.timeout(20)
 def test_anonymize(dest_db_exported):
 	anonymize(db=dest_db_exported)
+	for table,field in [('stars','login'),('followers','follower_login'),('pullrequests','author_login')]:
+		dest_db_exported.cursor.execute('SELECT {field} FROM {table} WHERE {field} IS NOT NULL;'.format(field=field,table=table))
+		assert all(re.match(r'^[a-fA-F\d]{32}$',r[0]) is not None for r in dest_db_exported.cursor.fetchall())
 
 @pytest.mark.timeout(20)
 def test_clean_table(dest_db_anon):
@@ -192,3 +316,30 @@ def test_export_filters(dest_db_anon):
 @pytest.mark.timeout(20)
 def test_export_bots(dest_db_anon):
 	exports.export_bots(db=dest_db_anon)
+
+def test_synthetic_db(tmp_path):
+	counts = []
+	for name in ('synth_a','synth_b'):
+		db = repodepo.repo_database.Database(db_name=name,db_folder=str(tmp_path),data_folder=str(tmp_path))
+		db.init_db()
+		counts.append(synthetic.generate_db(db=db,nb_repos=50,seed=1))
+		db.cursor.execute('SELECT COUNT(*) FROM commits;')
+		assert db.cursor.fetchone()[0] == 5000
+		mat = edge_getters.RepoToRepoDeps(db=db).get_result()
+		assert mat.nnz > 0 and mat.diagonal().sum() == 0
+		db.connection.close()
+	assert counts[0] == counts[1]
+
+@pytest.mark.timeout(60)
+def test_benchmark(tmp_path):
+	folder = str(tmp_path)
+	results = benchmark.run_benchmark(folder=folder,nb_repos=30)
+	assert [r['name'] for r in results] == ['generate']+list(benchmark.SCENARIOS.keys())
+	assert all(r['success'] and r['duration'] > 0 for r in results)
+	results = benchmark.run_benchmark(folder=folder,nb_repos=30,scenarios=['merges','repo_to_repo_deps'])
+	assert [r['name'] for r in results] == ['generate','repo_to_repo_deps','merges']
+	runs = benchmark.list_runs(folder=folder)
+	assert len(runs) == 2 and runs[0]['version'] == repodepo._version.__version__
+	comparison = {r['name']:r for r in benchmark.compare_runs(folder=folder)}
+	assert comparison['repo_to_repo_deps']['ratio'] is not None
+	assert comparison['export']['new_duration'] is None
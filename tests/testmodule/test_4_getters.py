@@ -155,6 +155,43 @@ def test_generic_getters(testdb,generic_g):
 def test_combined_getters(testdb,combined_g):
 	combined_g(db=testdb).get_result()
 
+def test_contributions_chunks(testdb,time_window_nonone):
+	getter = combined_getters.ContributionsGetter(db=testdb,time_window=time_window_nonone,with_reponame=False,with_userlogin=False)
+	full = getter.get_result()
+	chunked = getter.get_result(batch_size=3)
+	assert full.equals(chunked)
+	assert full.index.is_unique
+	timestamps = [chunk.index.get_level_values('timestamp') for chunk in getter.iter_results(batch_size=3)]
+	for t1,t2 in zip(timestamps[:-1],timestamps[1:]):
+		assert t1.max() < t2.min()
+
+@pytest.mark.parametrize('start_date',[datetime.datetime(2014,1,1),datetime.datetime(2014,1,15,13,30)])
+def test_contributions_values(tmp_path,start_date):
+	db = repodepo.repo_database.Database(db_name='test_contributions',db_folder=str(tmp_path),data_folder=str(tmp_path))
+	db.init_db()
+	db.cursor.execute("INSERT INTO identity_types(id,name) VALUES(1,'github_login');")
+	for i,is_bot in ((1,False),(2,False),(3,True)):
+		db.cursor.execute('INSERT INTO users(id,creation_identity_type_id,creation_identity,is_bot) VALUES(?,1,?,?);',(i,'user{}'.format(i),is_bot))
+		db.cursor.execute('INSERT INTO identities(id,identity_type_id,user_id,identity,is_bot) VALUES(?,1,?,?,?);',(i,i,'user{}'.format(i),is_bot))
+	for r in (1,2):
+		db.cursor.execute("INSERT INTO repositories(id,owner,name) VALUES(?,'owner',?);",(r,'repo{}'.format(r)))
+	commits = [(1,1,datetime.datetime(2014,1,5)),(1,1,datetime.datetime(2014,1,20)),(1,1,datetime.datetime(2014,2,3)),
+				(1,2,datetime.datetime(2014,1,10)),(2,1,datetime.datetime(2014,3,15)),
+				(1,3,datetime.datetime(2014,1,7))] # last one by a bot, not counted
+	for k,(repo_id,author_id,created_at) in enumerate(commits):
+		db.cursor.execute('INSERT INTO commits(sha,repo_id,author_id,created_at) VALUES(?,?,?,?);',('sha{}'.format(k),repo_id,author_id,created_at))
+	db.connection.commit()
+
+	getter = combined_getters.ContributionsGetter(db=db,start_date=start_date,end_date=datetime.datetime(2014,4,1),time_window='month',with_reponame=False,with_userlogin=False)
+	expected = {(datetime.datetime(2014,2,1),1,1):2,
+				(datetime.datetime(2014,2,1),1,2):1,
+				(datetime.datetime(2014,3,1),1,1):1,
+				(datetime.datetime(2014,4,1),2,1):1}
+	for batch_size in (1,10**5):
+		df = getter.get_result(batch_size=batch_size)
+		assert {(ts.to_pydatetime(),repo_id,user_id):nb for (ts,repo_id,user_id),nb in df['nb_commits'].items()} == expected
+	db.connection.close()
+
 def test_gettersPproj(testdb,time_window,Pgetter,proj_id,cumulative):
 	testdb.init_db()
 	df = Pgetter().get_result(db=testdb,aggregated=True,time_window=time_window,cumulative=cumulative,project_id=proj_id)
@@ -11,7 +11,7 @@ import json
 from scipy import sparse
 
 
-from repodepo.getters import edge_getters,rank_getters
+from repodepo.getters import edge_getters,rank_getters,graph_analytics
 
 
 #### Parameters
@@ -76,3 +76,58 @@ def test_dev_to_repodailycommits(testdb):
 	ranks = rank_getters.RepoRankGetter(db=testdb).get_result()[0]
 	repo_list = tuple(ranks[:10])
 	edge_getters.DevToRepoAddDailyCommits(db=testdb,repo_list=repo_list,daily_commits=5/7).get_result()
+
+def test_transitive_rank_in_memory(testdb):
+	ranks_mem = rank_getters.RepoTransitiveDepRank(db=testdb).get_result()
+	ranks_sql = rank_getters.RepoTransitiveDepRank(db=testdb,in_memory=False).get_result()
+	assert (ranks_mem[0] == ranks_sql[0]).all()
+	assert np.allclose(ranks_mem[2],ranks_sql[2])
+
+def test_transitive_counts():
+	rng = np.random.default_rng(0)
+	n = 50
+	adj = sparse.random(n,n,density=0.05,random_state=1,format='csr')
+	closure = (adj>0).astype(np.int64).toarray()
+	for _ in range(n):
+		closure = ((closure + closure @ (adj>0).astype(np.int64).toarray())>0).astype(np.int64)
+	weights = rng.random(n)
+	assert np.allclose(graph_analytics.transitive_counts(adj,weights=weights,block_size=16),closure.transpose() @ weights)
+
+def test_transitive_correction():
+	# 0 depends on 1 and 2, 1 depends on 2, 3 and 4 depend on each other and on 2
+	adj = sparse.csr_matrix(([1,1,1,1,1,1,1],([0,0,1,3,4,3,4],[1,2,2,4,3,2,2])),shape=(5,5))
+	corrected = graph_analytics.transitive_correction(values=np.array([10.,25.,100.,5.,7.]),adj=adj)
+	assert np.allclose(corrected,[10.,15.,100.-10.-15.-5.-7.,5.,7.])
+
+def test_dependents():
+	adj = sparse.csr_matrix(([1,1,1,1,1,1,1],([0,0,1,3,4,3,4],[1,2,2,4,3,2,2])),shape=(6,6))
+	adj_t = adj.transpose().tocsr()
+	assert graph_analytics.dependents(adj_t=adj_t,nodes=[1]).tolist() == [0,1]
+	assert graph_analytics.dependents(adj_t=adj_t,nodes=[2,5]).tolist() == [0,1,2,3,4,5]
+	assert graph_analytics.dependents(adj_t=adj_t,nodes=[3]).tolist() == [3,4]
+
+def test_cycle_analytics():
+	# 0<->1, 1->2->3->1, 4->4, 5->0
+	adj = sparse.csr_matrix(([1,1,1,1,1,1,1],([0,1,1,2,3,4,5],[1,0,2,3,1,4,0])),shape=(7,7))
+	ca = graph_analytics.cycle_analytics(adj)
+	assert ca['node_in_cycle'].tolist() == [True,True,True,True,True,False,False]
+	assert (ca['nb_self_loops'],ca['nb_2cycles'],ca['nb_3cycles']) == (1,1,1)
+	assert sorted(zip(ca['edge_rows'].tolist(),ca['edge_cols'].tolist())) == [(0,1),(1,0),(1,2),(2,3),(3,1)]
+	assert ca['node_2cycles'].tolist() == [1,1,0,0,0,0,0]
+	assert ca['node_3cycles'].tolist() == [0,1,1,1,0,0,0]
+	edge_3cycles = dict(zip(zip(ca['edge_rows'].tolist(),ca['edge_cols'].tolist()),ca['edge_3cycles'].tolist()))
+	assert edge_3cycles == {(0,1):0,(1,0):0,(1,2):1,(2,3):1,(3,1):1}
+
+def test_rank_index(testdb):
+	ans_direct,ans_indirect,ans_values = rank_getters.RepoStarRank(db=testdb).get_result()
+	assert dict(ans_indirect) == {int(r_id):rk for rk,r_id in enumerate(ans_direct)}
+	assert (ans_indirect.lookup(ans_direct[::-1]) == np.arange(ans_direct.size)[::-1]).all()
+	assert -1 not in ans_indirect
+
+def test_rank_from_results():
+	ranks_direct = np.array([7,3,5,9])
+	results = [(0,{'v':2.}),(1,{'v':1.}),(3,{'v':1.})]
+	ans_direct,ans_indirect,ans_values = rank_getters.RepoRankGetter().rank_from_results(ranks_direct=ranks_direct,results=results,sort_function=lambda res:res['v'])
+	assert ans_direct.tolist() == [3,9,7,0]
+	assert ans_values.tolist() == [1.,1.,2.,0.]
+	assert ans_indirect == {3:0,9:1,7:2}
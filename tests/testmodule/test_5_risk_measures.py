@@ -11,7 +11,8 @@ import json
 from scipy import sparse
 
 from repodepo.getters import SR_getters,policy_getters,effect_rank_getters
-from repodepo.getters import edge_getters,rank_getters
+from repodepo.getters import edge_getters,rank_getters,shared_arrays,result_store,scheduler
+import multiprocessing as mp
 
 
 #### Parameters
@@ -272,6 +273,20 @@ def test_vacc_save(testdb):
 def test_parallel_vacc(testdb):
 	ranks = effect_rank_getters.ParallelVaccRankGetter(db=testdb).get_result()
 
+def test_shared_arrays():
+	mat = sparse.random(20,10,density=0.2,random_state=0,format='csr')
+	vec = np.arange(20.)
+	with shared_arrays.SharedArrays() as shared:
+		shared.put('mat',mat)
+		shared.put('vec',vec)
+		attached,handles = shared_arrays.attach(shared.spec())
+		assert (attached['mat'] != mat).nnz == 0
+		assert (attached['vec'] == vec).all()
+		assert not attached['vec'].flags.writeable
+		del attached
+		for h in handles:
+			h.close()
+
 def test_parallel_vacc_save(testdb):
 	cr_db_path = os.path.join(os.path.dirname(__file__),'cr_db_tests.db')
 	if os.path.exists(cr_db_path):
@@ -323,3 +338,129 @@ def test_sr_propag_dlnorm(testsrgetter):
 	ref_results = checked_results[testsrgetter.testsrgetter_name]/135.
 	# assert (dense_results == ref_results).all() , dense_results
 	assert np.abs(dense_results - ref_results).sum()<10**-5 , sparse.csr_matrix(dense_results - ref_results).__str__()
+
+def test_sr_propag_iterative(testsrgetter):
+	testsrgetter.direct_solve = False
+	results = testsrgetter.get_result()
+	dense_results = results.todense()
+	ref_results = checked_results[testsrgetter.testsrgetter_name]
+	assert np.abs(dense_results - ref_results).sum()<10**-5 , sparse.csr_matrix(dense_results - ref_results).__str__()
+
+def test_sr_linear_direct_cyclic():
+	deps_mat = sparse.csr_matrix(np.asarray([[0,0.5,0.5,0],
+											[0,0,1,0],
+											[1,0,0,0],
+											[0,0,0,0],
+											]))
+	devs_mat = sparse.csr_matrix(np.asarray([[0.2,0.8],[1,0],[0,1],[0,1]]))
+	ans = {}
+	for direct_solve in (True,False):
+		sr_getter = SR_getters.SRLinear(db='dummyDB',direct_solve=direct_solve,dl_weights=False,tol=0)
+		sr_getter.devs_mat = devs_mat
+		sr_getter.deps_mat = deps_mat
+		sr_getter.repo_ranks = {1:0,4:1,6:2,11:3}
+		sr_getter.set_vaccinated_repos(vaccinated_repos=[4])
+		ans[direct_solve] = sr_getter.get_result().todense()
+	assert np.abs(ans[True] - ans[False]).max() < 10**-10
+
+@pytest.mark.parametrize('direct_solve',[True,False])
+@pytest.mark.parametrize('cyclic',[False,True])
+def test_sr_batch(testsrgetter,direct_solve,cyclic):
+	testsrgetter.direct_solve = direct_solve
+	testsrgetter.repo_ranks = {1:0,4:1,6:2,11:3}
+	if cyclic:
+		testsrgetter.deps_mat = sparse.csr_matrix(np.asarray([[0,0,1,0],
+															[1,0,0,0],
+															[0.5,0.5,0,0],
+															[0,0,0,0],
+															]))
+	scenarios = [[0],[1],[],[2,3],[3]]
+	batch_results = testsrgetter.get_batch(scenarios,compact_ratio=0.)
+	assert len(batch_results) == len(scenarios)
+	# computed once on the getter, shared by the batch copies
+	assert hasattr(testsrgetter,'deps_mat_t') and hasattr(testsrgetter,'deps_structure') == direct_solve
+	for v_rks,batch_res in zip(scenarios,batch_results):
+		testsrgetter.set_vaccinated_repos(vaccinated_repo_ranks=v_rks)
+		res = testsrgetter.get(db=testsrgetter.db)
+		assert np.abs(batch_res.todense() - res.todense()).max() < 10**-8, (v_rks,batch_res.todense(),res.todense())
+
+def test_sr_baseline(testsrgetter):
+	# baseline of the vaccination getters
+	baseline = testsrgetter.weight_result(testsrgetter.get_baseline_status())
+	assert np.abs(baseline.todense() - testsrgetter.get(db=testsrgetter.db).todense()).max() < 10**-10
+
+@pytest.mark.parametrize('direct_solve',[True,False])
+@pytest.mark.parametrize('cyclic',[False,True])
+def test_sr_delta(testsrgetter,direct_solve,cyclic):
+	testsrgetter.direct_solve = direct_solve
+	testsrgetter.repo_ranks = {1:0,4:1,6:2,11:3}
+	if cyclic:
+		testsrgetter.deps_mat = sparse.csr_matrix(np.asarray([[0,0,1,0],
+															[1,0,0,0],
+															[0.5,0.5,0,0],
+															[0,0,0,0],
+															]))
+	testsrgetter.get_baseline_status()
+	for v_rk in range(4):
+		testsrgetter.set_vaccinated_repos(vaccinated_repo_ranks=[v_rk])
+		res = testsrgetter.get(db=testsrgetter.db).todense()
+		delta_res = testsrgetter.get_delta(rows=[v_rk]).todense()
+		assert np.abs(delta_res - res).max() < 10**-8, (v_rk,delta_res,res)
+	# change in devs_mat
+	testsrgetter.set_vaccinated_repos(vaccinated_repo_ranks=[])
+	testsrgetter.devs_mat = sparse.csr_matrix(testsrgetter.devs_mat.multiply(np.asarray([[1.],[0.5],[1.],[1.]])))
+	del testsrgetter.dev_contrib
+	res = testsrgetter.get(db=testsrgetter.db).todense()
+	delta_res = testsrgetter.get_delta(rows=[1]).todense()
+	assert np.abs(delta_res - res).max() < 10**-8, (delta_res,res)
+
+def test_repeat_csr():
+	mat = sparse.random(7,5,density=0.3,random_state=2,format='csr')
+	assert (SR_getters.repeat_csr(mat,3) != sparse.vstack([mat]*3)).nnz == 0
+	assert SR_getters.repeat_csr(mat,3,block_diag=True).shape == (21,15)
+	assert (SR_getters.repeat_csr(mat,3,block_diag=True) != sparse.block_diag([mat]*3)).nnz == 0
+	assert SR_getters.repeat_csr(mat,1).shape == mat.shape
+
+def append_results(store,keys):
+	for k in keys:
+		store.append(k,{'b':k*2.,'a':-k})
+	store.flush()
+
+def test_result_store(tmp_path):
+	db_file = str(tmp_path/'results.db')
+	store = result_store.ResultStore(db_file,table='test_results',legacy_table='test_values',legacy_key='rk',flush_size=7)
+	store.connect().execute('CREATE TABLE test_values(rk INTEGER PRIMARY KEY,values_dict TEXT);')
+	store.connect().execute('''INSERT INTO test_values VALUES(1000,'{"a":1.5,"b":0}');''')
+	store.connect().commit()
+	append_results(store,range(10))
+	processes = [mp.Process(target=append_results,args=(store,range(i*100,i*100+50))) for i in range(1,4)]
+	for p in processes:
+		p.start()
+	for p in processes:
+		p.join()
+	store.append(5,{'a':0,'b':0})
+	keys,values,columns = store.load_arrays()
+	assert columns == ['a','b']
+	assert keys.tolist() == list(range(10)) + [k for i in range(1,4) for k in range(i*100,i*100+50)]
+	assert (values[:,0] == -keys).all() and (values[:,1] == 2*keys).all()
+	results = result_store.ResultStore(db_file,table='test_results',legacy_table='test_values',legacy_key='rk').load()
+	assert results[1000] == {'a':1.5,'b':0} and results[3] == {'a':-3.,'b':6.}
+	with pytest.raises(ValueError):
+		store.append(1,{'a':0})
+
+def square_or_crash(task):
+	value,crash_file = task
+	if value == 3 and not os.path.exists(crash_file):
+		open(crash_file,'w').close()
+		os._exit(1)
+	return value**2
+
+def test_scheduler(tmp_path):
+	crash_file = str(tmp_path/'crashed')
+	chunks = scheduler.split_chunks(range(10),workers=2)
+	assert chunks == [[0,1],[2,3],[4,5],[6,7],[8,9]]
+	done = []
+	ans = scheduler.run_chunks([(v,crash_file) for v in range(8)],square_or_crash,workers=3,on_result=lambda i,res:done.append(i))
+	assert ans == [v**2 for v in range(8)]
+	assert sorted(done) == list(range(8))
+	assert os.path.exists(crash_file)